@@ -0,0 +1,373 @@
+"""Measure the per-call overhead of the Logger Helper wrappers.
+
+Each case times calls to a wrapped callable and to the same callable
+unwrapped, the difference being the overhead of the wrapper. On Python 3.12
+and later, the `monitor` cases time callables logged by the `sys.monitoring`
+engine instead of being wrapped. The results are written as JSON so that runs
+can be compared.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import timeit
+import types
+
+from logger_helper import LoggerHelper
+from logger_helper.monitoring import MonitoringEngine
+from logger_helper.registry import Registry
+
+
+ARGUMENT_COUNTS = (0, 1, 5, 10, 20)
+HIERARCHY_DEPTHS = (1, 5, 20)
+METHODS_PER_CLASS = 10
+
+SMALL_VALUE = 1
+LARGE_VALUE = list(range(1000))
+
+
+def make_function(argument_count, raises=False, method=False):
+    """Create a function that takes a number of arguments.
+
+    Parameters:
+        argument_count (int): The number of arguments the function takes.
+        raises (bool): Whether the function raises a `ValueError`.
+        method (bool): Whether the function should also take `self` as its
+            first argument.
+
+    Returns:
+        function: The new function.
+    """
+    parameters = ['a{}'.format(i) for i in range(argument_count)]
+    if method:
+        parameters.insert(0, 'self')
+
+    body = "raise ValueError('Benchmark')" if raises else 'return None'
+
+    namespace = {}
+    exec(  # pylint: disable=exec-used
+        'def function({}):\n    {}\n'.format(', '.join(parameters), body),
+        namespace)
+
+    function = namespace['function']
+    function.__module__ = 'benchmark_module'
+
+    return function
+
+
+def make_class(argument_count):
+    """Create a class with a method that takes a number of arguments.
+
+    Parameters:
+        argument_count (int): The number of arguments the method takes (not
+            including `self`).
+
+    Returns:
+        type: The new class.
+    """
+    function = make_function(argument_count, method=True)
+
+    return type('Class{}'.format(argument_count), (), {
+        '__module__': 'benchmark_module',
+        'method': function
+    })
+
+
+def make_hierarchy(depth, method_count=METHODS_PER_CLASS):
+    """Create a chain of classes, each inheriting from the one before.
+
+    Parameters:
+        depth (int): The number of classes in the chain.
+        method_count (int): The number of methods each class defines.
+
+    Returns:
+        list: The classes, from the base class to the most derived.
+    """
+    classes = []
+    base = object
+    for level in range(depth):
+        namespace = {'__module__': 'benchmark_module'}
+        for index in range(method_count):
+            method = make_function(1, method=True)
+            method.__qualname__ = 'Class{0}.method_{0}_{1}'.format(
+                level, index)
+            namespace['method_{}_{}'.format(level, index)] = method
+
+        base = type('Class{}'.format(level), (base,), namespace)
+        classes.append(base)
+
+    return classes
+
+
+def time_calls(call, min_time=0.2, repeat=5):
+    """Time calls to a callable that takes no arguments.
+
+    Parameters:
+        call: The callable to time.
+        min_time (float): The least time, in seconds, that each repeat should
+            take.
+        repeat (int): The number of times to repeat the timing, the fastest is
+            used.
+
+    Returns:
+        float: The time a call takes, in nanoseconds.
+    """
+    timer = timeit.Timer(call)
+
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def make_call(clbl, args, raises):
+    """Create a callable that calls another with arguments.
+
+    Parameters:
+        clbl: The callable to call.
+        args (tuple): The arguments to call it with.
+        raises (bool): Whether the callable raises a `ValueError`, which
+            should be caught.
+
+    Returns:
+        A callable that takes no arguments.
+    """
+    if not raises:
+        return lambda: clbl(*args)
+
+    def call():
+        """Call the callable and catch the exception it raises."""
+        try:
+            clbl(*args)
+        except ValueError:
+            pass
+
+    return call
+
+
+def wrap(log, kind, argument_count, raises, engine=None):
+    """Create an unwrapped and a wrapped callable for a benchmark case.
+
+    Parameters:
+        log (LoggerHelper): The helper to wrap the callable with.
+        kind (str): How the callable is wrapped, one of `func`, `meth`,
+            `cls`, `mod` or `monitor`.
+        argument_count (int): The number of arguments the callable takes.
+        raises (bool): Whether the callable raises a `ValueError`.
+        engine (MonitoringEngine): The engine to log the callable with, for
+            the `monitor` kind.
+
+    Returns:
+        tuple: The unwrapped and the wrapped callable.
+    """
+    if kind == 'func':
+        function = make_function(argument_count, raises)
+        return function, log.func(function)
+    elif kind == 'meth':
+        cls = make_class(argument_count)
+        cls.wrapped_method = log.meth(cls.method)
+        instance = cls()
+        return instance.method, instance.wrapped_method
+    elif kind == 'cls':
+        cls = make_class(argument_count)
+        return cls().method, log.cls(cls)().method
+    elif kind == 'mod':
+        function = make_function(argument_count, raises)
+        module = types.ModuleType('benchmark_module')
+        module.function = function
+        log.mod(module)
+        return function, vars(module)['function']
+    elif kind == 'monitor':
+        # A separate function, so that its code object isn't monitored.
+        function = make_function(argument_count, raises)
+        return function, engine.func(make_function(argument_count, raises))
+
+    raise ValueError('Unknown kind {!r}.'.format(kind))
+
+
+def cases(quick=False, monitoring=False):
+    """List the benchmark cases.
+
+    Parameters:
+        quick (bool): Whether to only list a smaller set of cases.
+        monitoring (bool): Whether to list the cases for the
+            `sys.monitoring` engine.
+
+    Yields:
+        dict: The parameters of each case.
+    """
+    argument_counts = (0, 5) if quick else ARGUMENT_COUNTS
+
+    for compiled in (False, True):
+        kinds = ['func', 'meth', 'cls', 'mod']
+        if monitoring and not compiled:
+            # The engine doesn't use wrappers, so compiling makes no
+            # difference to it.
+            kinds.append('monitor')
+
+        for kind in kinds:
+            for enabled in (False, True):
+                for argument_count in argument_counts:
+                    yield {
+                        'kind': kind, 'compiled': compiled,
+                        'enabled': enabled, 'arguments': argument_count,
+                        'repr': 'small', 'raises': False}
+
+        for enabled in (False, True):
+            yield {
+                'kind': 'func', 'compiled': compiled, 'enabled': enabled,
+                'arguments': 5, 'repr': 'large', 'raises': False}
+            yield {
+                'kind': 'func', 'compiled': compiled, 'enabled': enabled,
+                'arguments': 1, 'repr': 'small', 'raises': True}
+
+            if monitoring and not compiled:
+                yield {
+                    'kind': 'monitor', 'compiled': compiled,
+                    'enabled': enabled, 'arguments': 1, 'repr': 'small',
+                    'raises': True}
+
+
+def run_case(log, logger, case, min_time, engine=None):
+    """Run a single benchmark case.
+
+    Parameters:
+        log (LoggerHelper): The helper to wrap the callable with.
+        logger (logging.Logger): The logger the helper writes to.
+        case (dict): The parameters of the case, from `cases`.
+        min_time (float): The least time, in seconds, to time each callable
+            for.
+        engine (MonitoringEngine): The engine for the `monitor` cases. It's
+            only installed while the logged callable is timed.
+
+    Returns:
+        dict: The case, with the time of a raw call, a wrapped call and the
+        overhead of the wrapper added (all in nanoseconds).
+    """
+    # Each case wraps callables with the same names, so give it a registry of
+    # its own rather than have it look up the switches of the earlier cases.
+    log.registry = Registry()
+    log.compile_wrappers = case['compiled']
+    raw, wrapped = wrap(
+        log, case['kind'], case['arguments'], case['raises'], engine)
+
+    value = LARGE_VALUE if case['repr'] == 'large' else SMALL_VALUE
+    args = (value,) * case['arguments']
+
+    logger.setLevel(logging.DEBUG if case['enabled'] else logging.INFO)
+
+    raw_ns = time_calls(make_call(raw, args, case['raises']), min_time)
+
+    # The engine's `PY_UNWIND` callback runs for every frame an exception
+    # passes through, so it's only installed for its own calls, to keep it
+    # from slowing down the others.
+    monitored = case['kind'] == 'monitor'
+    if monitored:
+        engine.install()
+    try:
+        wrapped_ns = time_calls(
+            make_call(wrapped, args, case['raises']), min_time)
+    finally:
+        if monitored:
+            engine.uninstall()
+
+    result = dict(case)
+    result.update({
+        'raw_ns': raw_ns,
+        'wrapped_ns': wrapped_ns,
+        'overhead_ns': wrapped_ns - raw_ns
+    })
+
+    return result
+
+
+def run_wrap_case(depth, min_time):
+    """Time wrapping every class in a hierarchy with `LoggerHelper.cls`.
+
+    Parameters:
+        depth (int): The number of classes in the hierarchy.
+        min_time (float): The least time, in seconds, to time the wrapping
+            for.
+
+    Returns:
+        dict: The depth of the hierarchy and the time it took to wrap all of
+        its classes, in nanoseconds.
+    """
+    classes = make_hierarchy(depth)
+    logger = logging.getLogger('benchmarks')
+
+    def wrap_all():
+        """Wrap each class with a new helper, so nothing is shared."""
+        log = LoggerHelper(logger, logging.DEBUG)
+        for cls in classes:
+            log.cls(cls)
+
+    return {'depth': depth, 'wrap_ns': time_calls(wrap_all, min_time)}
+
+
+def main():
+    """Run the benchmarks and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--output', '-o', default='-',
+        help='The file to write the JSON results to (default: stdout).')
+    parser.add_argument(
+        '--quick', action='store_true', help='Run fewer cases.')
+    parser.add_argument(
+        '--min-time', type=float, default=0.1,
+        help='The least time, in seconds, to time each callable for.')
+    arguments = parser.parse_args()
+
+    logger = logging.getLogger('benchmarks')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    log = LoggerHelper(logger, logging.DEBUG)
+
+    engine = None
+    if hasattr(sys, 'monitoring'):
+        engine = MonitoringEngine(log)
+
+    results = []
+    for case in cases(arguments.quick, engine is not None):
+        result = run_case(log, logger, case, arguments.min_time, engine)
+        results.append(result)
+
+        sys.stderr.write(
+            '{kind:7} compiled={compiled!s:5} enabled={enabled!s:5} '
+            'args={arguments:<2} repr={repr:5} raises={raises!s:5} '
+            '{overhead_ns:10.1f} ns/call overhead\n'.format(**result))
+
+    wrap_results = []
+    depths = HIERARCHY_DEPTHS[:2] if arguments.quick else HIERARCHY_DEPTHS
+    for depth in depths:
+        result = run_wrap_case(depth, arguments.min_time)
+        wrap_results.append(result)
+
+        sys.stderr.write(
+            'cls     depth={depth:<2} {wrap_ns:36.1f} ns to wrap\n'.format(
+                **result))
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': results,
+        'wrap_results': wrap_results
+    }
+
+    if arguments.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(arguments.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
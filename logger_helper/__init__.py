@@ -1,21 +1,71 @@
 """Logger Helper main classes and utility functions."""
 
+import collections
 import functools
 import inspect
+import time
+import weakref
+
+from logger_helper import context as call_context
+from logger_helper.compiled import compile_wrapper
+from logger_helper.messages import CallMessage
+from logger_helper.messages import ExceptionMessage
+from logger_helper.messages import Message
+from logger_helper.messages import ReturnMessage
+from logger_helper.messages import YieldMessage
+from logger_helper.messages import make_structured_record
+from logger_helper.plans import CallPlan
+from logger_helper.plans import REDACTED  # noqa: F401
+from logger_helper.plans import _get_plan
+from logger_helper.plans import get_callable_name  # noqa: F401
+from logger_helper.registry import Registry
+from logger_helper.wrappers import wrap_async_generator_function
+from logger_helper.wrappers import wrap_coroutine_function
+from logger_helper.wrappers import wrap_generator_function
+
+
+class _CallState:
+    """The state of a call to a wrapped callable that's in progress.
+
+    Attributes:
+        plan (CallPlan): The plan of the callable that was called.
+        logged (bool): Whether the call is being logged (it may not be because
+            of sampling).
+        log_exception (bool): Whether an exception raised by the call should
+            be logged.
+        start (int): The value of the performance counter when the callable
+            was called, in nanoseconds.
+        args (tuple): The positional parameters passed to the callable, kept
+            to log with an exception in `exceptions_only` mode.
+        kwargs (dict): The keyword parameters passed to the callable, kept
+            for the same reason.
+        frame (logger_helper.graph.Frame): The frame of the call in the
+            helper's `call_graph`, if there is one.
+        context (logger_helper.context.CallContext): The context of the
+            call, if the helper's `call_context` is set.
+        overhead (int): How long it took to start the call (mostly logging
+            it), in nanoseconds, if the helper has a `governor`.
+    """
 
+    __slots__ = (
+        'plan', 'logged', 'log_exception', 'start', 'args', 'kwargs', 'frame',
+        'context', 'overhead')
 
-def get_callable_name(clbl):
-    """Get the fully qualified name of a callable.
-
-    Parameters:
-        clbl: The callable to get the name for.
+    def __init__(self, plan):
+        """Create the state for a logged call.
 
-    Returns:
-        str: A string representing the full path to the given callable.
-    """
-    return '{module}.{callable}'.format(
-        module=clbl.__module__,
-        callable=clbl.__qualname__)
+        Parameters:
+            plan (CallPlan): The plan of the callable that was called.
+        """
+        self.plan = plan
+        self.logged = True
+        self.log_exception = True
+        self.start = None
+        self.args = None
+        self.kwargs = None
+        self.frame = None
+        self.context = None
+        self.overhead = None
 
 
 # pylint: disable=too-many-instance-attributes,unused-variable
@@ -44,6 +94,11 @@ class LoggerHelper:
                  - `name` - The name of the argument.
                  - `value` - The value of the argument.
 
+            value_repr: The callable used to turn each argument and return
+                value into a string, `repr` by default. Use a
+                `logger_helper.reprs.ReprEngine` to limit the size of the
+                representations and cache them.
+
             argument_separator (str): The separator to join the arguments
                 together with.
 
@@ -51,8 +106,18 @@ class LoggerHelper:
                 available tokens are:
 
                  - `callable` - The name of the callable.
-                 - `return_value` - The return value (after it's been run
-                   through `repr`).
+                 - `value` - The return value (after it's been run through
+                   `value_repr`).
+                 - `elapsed` - How long the call took, in seconds (a float,
+                   so `{elapsed:.6f}` can be used to format it).
+
+            yield_log_format (str): The format to log values yielded by
+                generators with, when `log_yields` is set. The available
+                tokens are:
+
+                 - `callable` - The name of the callable.
+                 - `value` - The yielded value (after it's been run through
+                   `value_repr`).
 
             exception_log_format (str): The format to log exceptions with. The
                 available tokens are:
@@ -60,6 +125,103 @@ class LoggerHelper:
                  - `callable` - The name of the callable.
                  - `name` - The name of the exception.
                  - `message` - The exception message.
+                 - `elapsed` - How long the call took before the exception
+                   was raised, in seconds.
+                 - `args` - The arguments passed to the callable, formatted
+                   like the `args` of `call_log_format`. These are only
+                   available when `exceptions_only` is set, otherwise
+                   they're empty.
+
+            exceptions_only (bool): Whether to only log calls that raise an
+                exception. The arguments of each call are kept, but nothing
+                is formatted unless the call fails, when they're available as
+                the `args` token of `exception_log_format`. For example::
+
+                    'Exception {name} in {callable}({args}), "{message}"'
+
+            log_yields (bool): Whether to log each value yielded by generators
+                and asynchronous generators as it's yielded.
+
+            compile_wrappers (bool): Whether to generate a wrapper with the
+                same parameters as each function that's wrapped, instead of
+                using a generic `*args, **kwargs` wrapper. Compiled wrappers
+                are cheaper to call, but take longer to create.
+
+            lazy_messages (bool): Whether to pass messages to the logger
+                unformatted. The arguments and return values are only run
+                through `repr` if a handler formats the record, so records
+                that are filtered out cost very little and formatting can
+                happen on another thread (for example, behind a
+                `logging.handlers.QueueHandler`). Arguments are formatted as
+                they are when the record is formatted, so objects that are
+                changed after the call will be logged with their new values.
+
+            structured_extras (bool): Whether to add the fields of each
+                message (see `logger_helper.messages.Message.fields`) to its
+                log record, so handlers can use the callable, arguments,
+                return value, exception and elapsed time without parsing the
+                message. The fields are added when the record is first used,
+                so records that are dropped don't pay for them, and the
+                values are only run through `value_repr` once for both the
+                fields and the message.
+
+            emitter (logger_helper.emitters.Emitter): If this is set, messages
+                are given to the emitter instead of being passed straight to
+                the logger (see `logger_helper.emitters.AsyncEmitter`). An
+                asynchronous emitter keeps slow handlers from blocking the
+                event loop when logging coroutines. A
+                `logger_helper.emitters.FlightRecorder` only logs the latest
+                calls when an exception is raised, and a
+                `logger_helper.emitters.BatchEmitter` logs them in batches
+                to cut contention over the handlers' locks.
+
+            sampler (logger_helper.sampling.Sampler): If this is set, only the
+                calls it samples are logged (see `logger_helper.sampling`).
+                The decision is made before any arguments are formatted.
+
+            samplers (dict): Samplers for individual callables, keyed by the
+                name of the callable (see `get_callable_name`). These take
+                precedence over `sampler`. Give each callable its own sampler
+                instance to sample them independently.
+
+            suppressed_log_format (str): The format to log the number of calls
+                that weren't logged because of sampling with. The available
+                tokens are:
+
+                 - `callable` - The name of the callable.
+                 - `count` - The number of calls that weren't logged.
+
+            suppressed_report_interval (float): How often, in seconds, to log
+                the number of calls that weren't logged because of sampling.
+
+            stats (logger_helper.timing.CallStats): If this is set, the number
+                of calls to each callable and how long they took are recorded
+                in it, including calls that weren't logged because of
+                sampling.
+
+            call_graph (logger_helper.graph.CallGraph): If this is set, the
+                calls between wrapped callables are aggregated in it, for call
+                graphs and flame graphs. Set `exceptions_only` as well to
+                collect the graph without logging every call.
+
+            call_context (bool): Whether to give each call an ID and keep
+                track of the call it was made within (see
+                `logger_helper.context`). The `call_id`, `parent_id`,
+                `depth` and `trace_id` of the call are then available as
+                tokens in all of the formats above, and are added to each log
+                record as attributes, so the calls can be put back into a
+                tree as the logs are read. They're `None` when this isn't
+                set.
+
+            governor (logger_helper.governor.Governor): If this is set, the
+                time spent logging each callable is measured against the time
+                spent in it, and callables that are called often and cost too
+                much to log are sampled or silenced until they don't.
+
+            registry (logger_helper.registry.Registry): The callables wrapped
+                by the helper, which can be used to switch logging of them on
+                and off while the program runs. Callables that are wrapped
+                keep using the registry that was set at the time.
         """
         self._logger = logger
         self._log_level = log_level
@@ -67,23 +229,81 @@ class LoggerHelper:
         self.call_log_format = 'Calling {callable}({args})'
         self.argument_format = '{name} = {value}'
         self.argument_separator = ', '
+        self.value_repr = repr
         self.return_log_format = 'Returned {value} from {callable}'
+        self.yield_log_format = 'Yielded {value} from {callable}'
         self.exception_log_format = (
             'Exception {name} occurred in {callable}, "{message}"')
-
-    def _wrap_callable(self, clbl, class_method=False):
+        self.exceptions_only = False
+        self.log_yields = False
+        self.compile_wrappers = False
+        self.lazy_messages = False
+        self.structured_extras = False
+        self.emitter = None
+        self.sampler = None
+        self.samplers = {}
+        self.suppressed_log_format = 'Suppressed {count} calls to {callable}'
+        self.suppressed_report_interval = 60
+        self.stats = None
+        self.call_graph = None
+        self.call_context = False
+        self.governor = None
+        self.registry = Registry()
+
+        # Weak references to the wrappers made by `cls`, keyed by the
+        # function they wrap, so methods inherited by many classes are only
+        # wrapped once. A wrapper references the function it wraps, so it
+        # would keep its own entry alive if it was held strongly.
+        self._method_wrappers = weakref.WeakKeyDictionary()
+
+        self._suppressed = collections.Counter()
+        self._next_suppressed_report = (
+            time.monotonic() + self.suppressed_report_interval)
+
+    def _wrap_callable(self, clbl, class_method=False, **options):
         """Wrap a callable in the decorator that performs the logging.
 
         Parameters:
             clbl: The callable to wrap.
-            class_method (bool): Whether the callable is a class method. This
-                is used to determine if we should log the first parameter if
-                it's called `self`.
+            class_method (bool): Whether the callable is a method, whose
+                first parameter (the instance or class) isn't logged.
+            options: The `include`, `exclude`, `redact` and `formatters`
+                options of the callable's `CallPlan`.
+
+        Note:
+            If the logger isn't enabled for the log level when the callable
+            is called, the original callable is called directly and none of
+            the arguments or return values are formatted. The same goes for
+            callables that have been disabled in the `registry`.
+
+            Coroutine functions, generator functions and asynchronous
+            generator functions are wrapped in a function of the same kind,
+            so the awaited result (or the generator's return value) is
+            logged, rather than the coroutine or generator object. Their
+            messages are still handled on the thread that made the call, so
+            slow handlers block the event loop unless an `emitter` (such as
+            `logger_helper.emitters.AsyncEmitter`) hands them off to another
+            thread.
 
         Returns:
             A new callable that will perform the logging as well as the
             original action.
         """
+        plan = CallPlan(clbl, class_method, **options)
+        switch = self.registry.register(plan.name)
+
+        if inspect.iscoroutinefunction(clbl):
+            return wrap_coroutine_function(self, plan, switch)
+        elif inspect.isasyncgenfunction(clbl):
+            return wrap_async_generator_function(self, plan, switch)
+        elif inspect.isgeneratorfunction(clbl):
+            return wrap_generator_function(self, plan, switch)
+
+        if self.compile_wrappers:
+            compiled = compile_wrapper(self, plan, switch)
+            if compiled is not None:
+                return compiled
+
         @functools.wraps(clbl)
         def wrapped_callable(*args, **kwargs):
             """Log calls, exceptions and return values.
@@ -97,21 +317,236 @@ class LoggerHelper:
             Returns:
                 Whatever the original callable returns.
             """
-            self._log_call(clbl, args, kwargs, class_method)
+            # `Logger.isEnabledFor` caches its answer per level and the cache
+            # is cleared whenever a level in the hierarchy changes, so this
+            # check costs a dictionary lookup when logging is switched off.
+            if not (switch.enabled and
+                    self._logger.isEnabledFor(self._log_level)):
+                return clbl(*args, **kwargs)
+
+            return self._invoke(plan, args, kwargs)
 
+        return wrapped_callable
+
+    def _invoke(self, plan, args, kwargs):
+        """Call a callable, logging the call and its outcome.
+
+        Parameters:
+            plan (CallPlan): The plan of the callable to call.
+            args (tuple): The positional parameters to pass to the callable.
+            kwargs (dict): The keyword parameters to pass to the callable.
+
+        Returns:
+            Whatever the callable returns.
+        """
+        if (self.exceptions_only and self.stats is None and
+                self.call_graph is None and not self.call_context and
+                self.governor is None):
+            # There's nothing to do unless the call fails.
             try:
-                return_value = clbl(*args, **kwargs)
+                return plan.callable(*args, **kwargs)
             except BaseException as ex:
-                self._log_exception(clbl, ex)
+                self._log_exception(plan, ex, args=args, kwargs=kwargs)
                 raise
 
-            self._log_return(clbl, return_value)
+        call = self._call_started(plan, args, kwargs)
 
-            return return_value
+        try:
+            return_value = plan.callable(*args, **kwargs)
+        except BaseException as ex:
+            self._call_raised(call, ex)
+            raise
 
-        return wrapped_callable
+        self._call_returned(call, return_value)
+
+        return return_value
+
+    def _call_started(self, plan, args, kwargs):
+        """Decide whether to log a call and log it if so.
+
+        Parameters:
+            plan (CallPlan): The plan of the callable being called.
+            args (tuple): The positional parameters passed to the callable.
+            kwargs (dict): The keyword parameters passed to the callable.
+
+        Returns:
+            _CallState: The state of the call, to pass on to
+            `_call_returned`, `_call_raised` and `_call_yielded`.
+        """
+        began = None
+        if self.governor is not None:
+            began = time.perf_counter_ns()
+
+        call = _CallState(plan)
+
+        if self.call_context:
+            call.context = call_context.enter()
+
+        sampler = None
+        if self.exceptions_only:
+            call.logged = False
+            call.args = args
+            call.kwargs = kwargs
+        else:
+            sampler = self.samplers.get(plan.name, self.sampler)
+
+        if sampler is not None and not sampler.sample():
+            call.logged = False
+            call.log_exception = sampler.log_exceptions
+
+            self._suppressed[plan.name] += 1
+            if time.monotonic() >= self._next_suppressed_report:
+                self.report_suppressed()
+        elif call.logged:
+            self._log_call(plan, args, kwargs, context=call.context)
+
+        if self.call_graph is not None:
+            call.frame = self.call_graph.enter(plan.name)
+
+        call.start = time.perf_counter_ns()
+        if began is not None:
+            call.overhead = call.start - began
+
+        return call
+
+    def _call_returned(self, call, return_value):
+        """Log the value returned by a call, if the call is being logged.
+
+        Parameters:
+            call (_CallState): The state returned by `_call_started`.
+            return_value: The value the callable returned.
+
+        Returns:
+            None
+        """
+        end = time.perf_counter_ns()
+        elapsed = end - call.start
+
+        if self.stats is not None:
+            self.stats.record(call.plan.name, elapsed)
+        if call.frame is not None and self.call_graph is not None:
+            self.call_graph.exit(call.frame, elapsed)
+        if call.context is not None:
+            call_context.exit(call.context)
+
+        if call.logged:
+            self._log_return(call.plan, return_value, elapsed, call.context)
+
+        if call.overhead is not None and self.governor is not None:
+            self.governor.record(
+                self, call.plan.name, elapsed,
+                call.overhead + time.perf_counter_ns() - end, call.logged)
+
+    def _call_raised(self, call, exception):
+        """Log an exception raised by a call, if the call is being logged.
+
+        Parameters:
+            call (_CallState): The state returned by `_call_started`.
+            exception (BaseException): The exception that was raised.
+
+        Returns:
+            None
+        """
+        end = time.perf_counter_ns()
+        elapsed = end - call.start
+
+        if self.stats is not None:
+            self.stats.record(call.plan.name, elapsed, failed=True)
+        if call.frame is not None and self.call_graph is not None:
+            self.call_graph.exit(call.frame, elapsed)
+        if call.context is not None:
+            call_context.exit(call.context)
+
+        if call.log_exception:
+            self._log_exception(
+                call.plan, exception, elapsed, call.args, call.kwargs,
+                call.context)
+
+        if call.overhead is not None and self.governor is not None:
+            self.governor.record(
+                self, call.plan.name, elapsed,
+                call.overhead + time.perf_counter_ns() - end, call.logged)
+
+    def _call_suspended(self, call):
+        """Stop a generator's call being current while it's suspended.
+
+        Parameters:
+            call (_CallState): The state returned by `_call_started`.
+
+        Returns:
+            None
+        """
+        if call.frame is not None and self.call_graph is not None:
+            self.call_graph.suspend(call.frame)
+        if call.context is not None:
+            call_context.exit(call.context)
+
+    def _call_resumed(self, call):
+        """Make a generator's call current again before it runs.
+
+        Parameters:
+            call (_CallState): The state returned by `_call_started`.
+
+        Returns:
+            None
+        """
+        if call.context is not None:
+            call_context.resume(call.context)
+        if call.frame is not None and self.call_graph is not None:
+            self.call_graph.resume(call.frame)
 
-    def _log_call(self, clbl, args, kwargs, class_method=False):
+    def _call_yielded(self, call, value):
+        """Log a value yielded by a generator.
+
+        Parameters:
+            call (_CallState): The state returned by `_call_started`.
+            value: The value that was yielded.
+
+        Returns:
+            None
+        """
+        self._emit(YieldMessage(self, call.plan, value, call.context))
+
+    def report_suppressed(self):
+        """Log the number of calls that weren't logged because of sampling.
+
+        Note:
+            This is called automatically every `suppressed_report_interval`
+            seconds, as long as calls are being suppressed. The counts are
+            reset each time they're reported.
+
+        Returns:
+            None
+        """
+        self._next_suppressed_report = (
+            time.monotonic() + self.suppressed_report_interval)
+
+        suppressed, self._suppressed = (
+            self._suppressed, collections.Counter())
+
+        for name, count in sorted(suppressed.items()):
+            self._emit(self.suppressed_log_format.format(
+                callable=name, count=count))
+
+    def log_message(self, message):
+        """Log a message that isn't about a call, the way calls are logged.
+
+        Note:
+            The message goes to the helper's `emitter`, if it has one, and is
+            logged at the helper's level. This is how the reports of the
+            helper and its `governor` are logged.
+
+        Parameters:
+            message (str): The message to log.
+
+        Returns:
+            None
+        """
+        self._emit(message)
+
+    # pylint: disable=too-many-arguments
+    def _log_call(self, clbl, args, kwargs, class_method=False,
+                  context=None):
         """Log the call to the callable.
 
         Note:
@@ -120,43 +555,22 @@ class LoggerHelper:
             the `argument_format` and `argument_separator` variables.
 
         Parameters:
-            clbl: The callable to log the call for.
+            clbl: The callable (or the `CallPlan` for it) to log the call for.
             args (list): Positional parameters passed to the callable.
             kwargs (dict): Keyword parameters passed to the callable.
-            class_method (bool): Whether the callable is a class method. This
-                is used to determine if we should log the first parameter if
-                it's called `self`.
+            class_method (bool): Whether the callable is a method, whose
+                first parameter (the instance or class) isn't logged. It's
+                ignored when given a `CallPlan`.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
 
         Returns:
             None
         """
-        parameters = inspect.signature(clbl).parameters
-
-        arg_list = []
-        for i, parameter in enumerate(parameters):
-            if class_method and parameter == 'self':
-                continue
-
-            try:
-                val = args[i]
-            except IndexError:
-                try:
-                    val = kwargs[parameter]
-                except KeyError:
-                    val = parameters[parameter].default
-
-            arg_list.append(
-                self.argument_format.format(
-                    name=parameter,
-                    value=repr(val)))
+        self._emit(CallMessage(
+            self, _get_plan(clbl, class_method), args, kwargs, context))
 
-        log_message = self.call_log_format.format(
-            callable=get_callable_name(clbl),
-            args=self.argument_separator.join(arg_list))
-
-        self._logger.log(self._log_level, log_message)
-
-    def _log_return(self, clbl, return_value):
+    def _log_return(self, clbl, return_value, elapsed=None, context=None):
         """Log the return value from a callable.
 
         Note:
@@ -164,19 +578,22 @@ class LoggerHelper:
             variable `return_log_format`.
 
         Parameters:
-            clbl: The callable to log the return value for.
+            clbl: The callable (or the `CallPlan` for it) to log the return
+                value for.
             return_value: The return value to log against the call.
+            elapsed (int): How long the call took, in nanoseconds.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
 
         Returns:
             None
         """
-        log_message = self.return_log_format.format(
-            callable=get_callable_name(clbl),
-            value=repr(return_value))
-
-        self._logger.log(self._log_level, log_message)
+        self._emit(ReturnMessage(
+            self, _get_plan(clbl), return_value, elapsed, context))
 
-    def _log_exception(self, clbl, exception):
+    # pylint: disable=too-many-arguments
+    def _log_exception(self, clbl, exception, elapsed=None, args=None,
+                       kwargs=None, context=None):
         """Log the exception that was raised.
 
         Note:
@@ -184,18 +601,66 @@ class LoggerHelper:
             variable `exception_log_format`.
 
         Parameters:
-            clbl: The callable that the exception was raised in.
+            clbl: The callable (or the `CallPlan` for it) that the exception
+                was raised in.
             exception (BaseException): The exception that was raised.
+            elapsed (int): How long the call took before the exception was
+                raised, in nanoseconds.
+            args (tuple): The positional parameters passed to the callable,
+                to log with the exception.
+            kwargs (dict): The keyword parameters passed to the callable, to
+                log with the exception.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
 
         Returns:
             None
         """
-        log_message = self.exception_log_format.format(
-            callable=get_callable_name(clbl),
-            name=exception.__class__.__qualname__,
-            message=str(exception))
+        self._emit(ExceptionMessage(
+            self, _get_plan(clbl), exception, elapsed, args, kwargs,
+            context))
+
+    def _emit(self, message):
+        """Pass a message on to the logger.
+
+        Parameters:
+            message (logger_helper.messages.Message): The message (or
+                string) to log. It's given to the `emitter` if there is one,
+                otherwise it's formatted straight away unless `lazy_messages`
+                is set.
 
-        self._logger.log(self._log_level, log_message)
+        Note:
+            If the message has a call context, its `call_id`, `parent_id`,
+            `depth` and `trace_id` are added to the log record. If
+            `structured_extras` is set, its fields are added instead, but
+            only once the record is used (see
+            `logger_helper.messages.StructuredRecord`).
+
+        Returns:
+            None
+        """
+        if self.emitter is not None:
+            self.emitter.emit(self._logger, self._log_level, message)
+            return
+
+        if self.structured_extras and isinstance(message, Message):
+            logger = self._logger
+            if logger.isEnabledFor(self._log_level):
+                logger.handle(make_structured_record(
+                    logger, self._log_level,
+                    message if self.lazy_messages else str(message),
+                    message))
+            return
+
+        extra = None
+        context = getattr(message, 'context', None)
+        if context is not None:
+            extra = context.extra()
+
+        if not self.lazy_messages:
+            message = str(message)
+
+        self._logger.log(self._log_level, message, extra=extra)
 
     def __call__(self, obj):
         """Wrap the class methods or functions in our decorator.
@@ -238,46 +703,194 @@ class LoggerHelper:
 
             setattr(mod, member_name, wrapped_member)
 
-    def cls(self, cls):
+    def cls(self, cls=None, **options):
         """Wrap a classes methods (that don't start and end with `__`).
 
+        Note:
+            Only the class's own `__dict__` and those of its bases are looked
+            at, attributes aren't resolved. Plain methods, `staticmethod` and
+            `classmethod` objects and the functions of properties are wrapped,
+            anything else is left alone. Inherited methods are wrapped once
+            and the wrapper is shared by every class that inherits them
+            (unless options are given).
+
         Parameters:
             cls: The class to wrap.
+            options: The `include`, `exclude`, `redact` and `formatters`
+                options for the arguments of every method (see `func`).
 
         Returns:
             `cls`: A *copy* of the given class with all of it's methods
-            wrapped.
+            wrapped. If `cls` isn't given, a decorator that wraps a class
+            with the options is returned instead.
         """
-        # Make a copy of the class to ensure we don't alter the original
-        new_cls = type('NewBasicClass', cls.__bases__, dict(cls.__dict__))
-
-        for member_name, member in inspect.getmembers(new_cls):
-            if not callable(member) or (
-                    member_name.startswith('__') and
-                    member_name.endswith('__')):
+        if cls is None:
+            return functools.partial(self.cls, **options)
+
+        # Make a copy of the class to ensure we don't alter the original.
+        # `__dict__`, `__weakref__` and the descriptors for `__slots__` are
+        # made again when the copy is created.
+        slots = cls.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        namespace = {
+            name: member for name, member in cls.__dict__.items()
+            if name not in ('__dict__', '__weakref__') and name not in slots}
+        namespace['__qualname__'] = cls.__qualname__
+
+        seen = set()
+        for owner in cls.__mro__:
+            if owner is object:
                 continue
 
-            wrapped_method = self._wrap_callable(member, True)
+            for member_name, member in owner.__dict__.items():
+                if member_name in seen or (
+                        member_name.startswith('__') and
+                        member_name.endswith('__')):
+                    continue
+                seen.add(member_name)
+
+                wrapped_member = self._wrap_member(member, options)
+                if wrapped_member is not None:
+                    namespace[member_name] = wrapped_member
+
+        return type(cls)(cls.__name__, cls.__bases__, namespace)
 
-            setattr(new_cls, member_name, wrapped_method)
+    def _wrap_member(self, member, options):
+        """Wrap a member of a class's `__dict__`, if it's a method.
 
-        return new_cls
+        Parameters:
+            member: The member to wrap.
+            options (dict): The options for the arguments of the method.
+
+        Returns:
+            The wrapped member, or `None` if it isn't a method or it's
+            already been wrapped.
+        """
+        if isinstance(member, staticmethod):
+            wrapped = self._wrap_method(member.__func__, False, options)
+            return None if wrapped is None else staticmethod(wrapped)
+        elif isinstance(member, classmethod):
+            wrapped = self._wrap_method(member.__func__, True, options)
+            return None if wrapped is None else classmethod(wrapped)
+        elif isinstance(member, property):
+            accessors = [
+                None if accessor is None else self._wrap_method(
+                    accessor, True, options)
+                for accessor in (member.fget, member.fset, member.fdel)]
+            if not any(accessors):
+                return None
+
+            return property(*[
+                original if wrapped is None else wrapped
+                for original, wrapped in zip(
+                    (member.fget, member.fset, member.fdel), accessors)],
+                doc=member.__doc__)
+        elif inspect.isfunction(member):
+            return self._wrap_method(member, True, options)
+
+        return None
+
+    def _wrap_method(self, function, class_method, options):
+        """Wrap a function found in a class, sharing the wrapper if possible.
+
+        Parameters:
+            function: The function to wrap.
+            class_method (bool): Whether the function takes the instance or
+                class as its first parameter.
+            options (dict): The options for the arguments of the function.
+                Wrappers made with options aren't shared.
+
+        Returns:
+            The wrapper for the function, or `None` if the function is
+            already one of this helper's wrappers.
+        """
+        wrapped = getattr(function, '__wrapped__', None)
+        if wrapped is not None and self._method_wrapper(wrapped) is function:
+            return None
 
-    def func(self, function):
+        if options:
+            return self._wrap_callable(function, class_method, **options)
+
+        wrapper = self._method_wrapper(function)
+        if wrapper is not None:
+            return wrapper
+
+        wrapper = self._wrap_callable(function, class_method)
+        try:
+            self._method_wrappers[function] = weakref.ref(wrapper)
+        except TypeError:
+            # Not everything can be weakly referenced.
+            pass
+
+        return wrapper
+
+    def _method_wrapper(self, function):
+        """Get the shared wrapper made by `cls` for a function, if it exists.
+
+        Parameters:
+            function: The function that was wrapped.
+
+        Returns:
+            The wrapper, or `None` if there isn't one (any more).
+        """
+        try:
+            reference = self._method_wrappers.get(function)
+        except TypeError:
+            # Not everything can be weakly referenced.
+            return None
+
+        return None if reference is None else reference()
+
+    def func(self, function=None, **options):
         """Wrap a function.
 
+        Note:
+            The options are resolved into the function's `CallPlan` when
+            it's wrapped. Parameters that aren't logged are never passed to
+            `value_repr`, so leaving out large arguments makes logging the
+            calls cheaper as well as hiding secrets. For example::
+
+                @helper.func(exclude=['payload'], redact=['password'])
+                def upload(user, password, payload):
+                    ...
+
         Parameters:
             function: The function to wrap.
+            options: Options for the arguments of the function:
+
+                 - `include` - The names of the only parameters to log.
+                 - `exclude` - The names of parameters (or keys of
+                   `**kwargs`) not to log.
+                 - `redact` - The names of parameters (or keys of `**kwargs`)
+                   to log as `<redacted>`.
+                 - `formatters` - A dictionary of callables to format the
+                   values of particular parameters with instead of
+                   `value_repr`, keyed by the name of the parameter.
 
         Returns:
-            `function`: A wrapped *copy* of the given function.
+            `function`: A wrapped *copy* of the given function. If `function`
+            isn't given, a decorator that wraps a function with the options is
+            returned instead.
         """
-        return self._wrap_callable(function)
+        if function is None:
+            return functools.partial(self.func, **options)
 
-    def meth(self, method):
+        return self._wrap_callable(function, **options)
+
+    def meth(self, method=None, **options):
         """Wrap a method belonging to a class.
 
+        Parameters:
+            method: The method to wrap.
+            options: Options for the arguments of the method (see `func`).
+
         Returns:
-            `method`: A wrapped *copy* of the fiven method.
+            `method`: A wrapped *copy* of the fiven method. If `method` isn't
+            given, a decorator that wraps a method with the options is
+            returned instead.
         """
-        return self._wrap_callable(method, True)
+        if method is None:
+            return functools.partial(self.meth, **options)
+
+        return self._wrap_callable(method, True, **options)
@@ -0,0 +1,451 @@
+"""Write calls to compact binary trace files, and read them back."""
+
+import atexit
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+from logger_helper.emitters import Emitter
+from logger_helper.messages import Arguments
+from logger_helper.messages import CallMessage
+from logger_helper.messages import ExceptionMessage
+from logger_helper.messages import ReturnMessage
+from logger_helper.messages import YieldMessage
+
+
+MAGIC = b'LHTRACE1'
+SUFFIX = '.lht'
+
+# The kinds of record.
+CALL = 1
+RETURN = 2
+EXCEPTION = 3
+YIELD = 4
+MESSAGE = 5
+NAME = 6
+
+KINDS = {
+    CALL: 'call',
+    RETURN: 'return',
+    EXCEPTION: 'exception',
+    YIELD: 'yield',
+    MESSAGE: 'message'
+}
+
+# Set in a record's flags when it has an elapsed time.
+_HAS_ELAPSED = 1
+
+# The header at the start of each segment: the magic number, the size of the
+# header and of a record, the index of the segment, the id of the process,
+# the wall clock time and the performance counter when the segment was
+# created, then the number of records and where the payloads start. The last
+# two are updated after each record is written.
+_HEADER = struct.Struct('<8sHHIIdQII')
+_COUNTS = struct.Struct('<II')
+_COUNTS_OFFSET = _HEADER.size - _COUNTS.size
+HEADER_SIZE = 64
+
+# A record: its kind, flags, the id of the callable's name, the id of the
+# thread, the performance counter when it was written, the elapsed time of
+# the call and the offset and length of its payload.
+_RECORD = struct.Struct('<BBxxIQQQII')
+RECORD_SIZE = _RECORD.size
+
+
+TraceEvent = collections.namedtuple(
+    'TraceEvent', ('kind', 'name', 'thread', 'time', 'elapsed', 'payload'))
+TraceEvent.__doc__ = """An event read from a binary trace.
+
+Attributes:
+    kind (str): `call`, `return`, `exception`, `yield` or `message`.
+    name (str): The name of the callable, or `None` for a message.
+    thread (int): The id of the thread the event happened in.
+    time (float): When the event happened, in seconds since the epoch.
+    elapsed (float): How long the call took, in seconds, for returns and
+        exceptions (when it was timed).
+    payload (str): The arguments of a call, the `value_repr` of a returned
+        or yielded value, the exception (as `Name: message`) or the text of
+        a message.
+"""
+
+
+def segment_paths(directory, prefix='trace'):
+    """List the segment files of a trace, in the order they were written.
+
+    Parameters:
+        directory (str): The directory the segments were written to.
+        prefix (str): The prefix of the segments' file names.
+
+    Returns:
+        list: The paths of the segments.
+    """
+    names = [
+        name for name in os.listdir(directory)
+        if name.startswith(prefix + '-') and name.endswith(SUFFIX)]
+
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+class BinaryTraceEmitter(Emitter):
+    """Write calls to memory-mapped binary trace files.
+
+    Instead of formatting a line of text for each message, the name of each
+    callable is written once per segment and each event is written as a
+    fixed-size record (its kind, the id of the name, the thread, a timestamp
+    and the elapsed time), with the arguments or value as a payload. Records
+    are written from the start of a segment and payloads from the end, so a
+    segment is full when they meet, and the next one is started.
+
+    Segments are created at their full size and mapped into memory, so
+    writing an event is a memory copy, not a system call. Everything
+    written is in the operating system's page cache straight away, so it
+    survives the process crashing (`flush` also writes it to disk, to
+    survive the machine crashing). Use `read_trace` to read the events back.
+
+    Note:
+        The messages aren't passed on to the logger. Arguments and values are
+        run through the helper's `value_repr` (or the formatters of the
+        callable) when the event is written.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(self, directory, segment_size=16 * 1024 * 1024,
+                 max_payload=4096, prefix='trace'):
+        """Create a new emitter and its first segment.
+
+        Parameters:
+            directory (str): The directory to write the segments to. It's
+                created if it doesn't exist. Segments already in it are left
+                alone, and the new ones are numbered after them.
+            segment_size (int): The size of each segment file, in bytes.
+            max_payload (int): The most bytes of each payload to write,
+                longer payloads are cut short.
+            prefix (str): The prefix of the segments' file names, which are
+                followed by the index of the segment.
+
+        Raises:
+            ValueError: When `segment_size` is too small to hold an event
+                with a payload of `max_payload` bytes.
+        """
+        if segment_size < HEADER_SIZE + 2 * (RECORD_SIZE + max_payload):
+            raise ValueError(
+                'A segment size of {} is too small for payloads of {} '
+                'bytes.'.format(segment_size, max_payload))
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_payload = max_payload
+        self.prefix = prefix
+
+        existing = segment_paths(directory, prefix)
+        self._index = (
+            int(existing[-1][:-len(SUFFIX)].rsplit('-', 1)[1]) + 1
+            if existing else 0)
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._names = {}
+        self._count = 0
+        self._record_end = HEADER_SIZE
+        self._payload_start = segment_size
+        self._closed = False
+
+        self._open_segment()
+
+        atexit.register(self.close)
+
+    def emit(self, logger, level, message):
+        """Write the record for a message.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for (unused).
+            level (int): The level to log the message at (unused).
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+        timestamp = time.perf_counter_ns()
+        thread = threading.get_ident()
+        elapsed = None
+        name = None
+
+        if isinstance(message, CallMessage):
+            kind = CALL
+            payload = str(Arguments(
+                message.helper, message.plan, message.args, message.kwargs))
+        elif isinstance(message, ReturnMessage):
+            kind = RETURN
+            payload = message.helper.value_repr(message.return_value)
+            elapsed = message.elapsed
+        elif isinstance(message, ExceptionMessage):
+            kind = EXCEPTION
+            payload = '{}: {}'.format(
+                message.exception.__class__.__qualname__, message.exception)
+            elapsed = message.elapsed
+        elif isinstance(message, YieldMessage):
+            kind = YIELD
+            payload = message.helper.value_repr(message.value)
+        else:
+            kind = MESSAGE
+            payload = str(message)
+
+        if kind != MESSAGE:
+            name = message.plan.name
+
+        self._write(kind, name, thread, timestamp, elapsed, payload)
+
+    # pylint: disable=too-many-arguments
+    def _write(self, kind, name, thread, timestamp, elapsed, payload):
+        """Write a record, and the name of its callable if it's new.
+
+        Parameters:
+            kind (int): The kind of record.
+            name (str): The name of the callable, or `None`.
+            thread (int): The id of the thread.
+            timestamp (int): The performance counter, in nanoseconds.
+            elapsed (int): The elapsed time of the call, in nanoseconds, or
+                `None`.
+            payload (str): The payload.
+
+        Returns:
+            None
+        """
+        payload = self._encode(payload)
+
+        with self._lock:
+            if self._closed:
+                return
+
+            name_id = 0
+            name_payload = None
+            if name is not None:
+                name_id = self._names.get(name, 0)
+                if not name_id:
+                    name_payload = self._encode(name)
+
+            needed = RECORD_SIZE + len(payload)
+            if name_payload is not None:
+                needed += RECORD_SIZE + len(name_payload)
+
+            if self._record_end + needed > self._payload_start:
+                self._map.close()
+                self._file.close()
+                self._open_segment()
+
+                if name is not None and name_payload is None:
+                    name_payload = self._encode(name)
+
+            if name_payload is not None:
+                name_id = len(self._names) + 1
+                self._names[name] = name_id
+                self._append(NAME, 0, name_id, 0, 0, 0, name_payload)
+
+            flags = 0
+            if elapsed is not None:
+                flags = _HAS_ELAPSED
+            else:
+                elapsed = 0
+
+            self._append(
+                kind, flags, name_id, thread, timestamp, elapsed, payload)
+
+    def _encode(self, text):
+        """Encode a payload, cutting it short if it's too long.
+
+        Parameters:
+            text (str): The payload.
+
+        Returns:
+            bytes: The encoded payload, at most `max_payload` bytes long.
+        """
+        return text.encode('utf-8', 'backslashreplace')[:self.max_payload]
+
+    # pylint: disable=too-many-arguments
+    def _append(self, kind, flags, name_id, thread, timestamp, elapsed,
+                payload):
+        """Append a record to the current segment, which must have room.
+
+        Note:
+            The record and its payload are written before the counts in the
+            header, so a reader never sees a record that's half written.
+
+        Parameters:
+            kind (int): The kind of record.
+            flags (int): The record's flags.
+            name_id (int): The id of the callable's name, or `0`.
+            thread (int): The id of the thread.
+            timestamp (int): The performance counter, in nanoseconds.
+            elapsed (int): The elapsed time of the call, in nanoseconds.
+            payload (bytes): The payload.
+
+        Returns:
+            None
+        """
+        payload_start = self._payload_start - len(payload)
+        self._map[payload_start:self._payload_start] = payload
+
+        _RECORD.pack_into(
+            self._map, self._record_end, kind, flags, name_id, thread,
+            timestamp, elapsed, payload_start, len(payload))
+
+        self._count += 1
+        self._record_end += RECORD_SIZE
+        self._payload_start = payload_start
+        _COUNTS.pack_into(
+            self._map, _COUNTS_OFFSET, self._count, payload_start)
+
+    def _open_segment(self):
+        """Create the next segment and map it into memory.
+
+        Returns:
+            None
+        """
+        path = os.path.join(self.directory, '{}-{:06d}{}'.format(
+            self.prefix, self._index, SUFFIX))
+        self._index += 1
+
+        self._file = open(path, 'w+b')
+        self._file.truncate(self.segment_size)
+        self._map = mmap.mmap(self._file.fileno(), self.segment_size)
+
+        _HEADER.pack_into(
+            self._map, 0, MAGIC, HEADER_SIZE, RECORD_SIZE, self._index - 1,
+            os.getpid(), time.time(), time.perf_counter_ns(), 0,
+            self.segment_size)
+
+        self._names = {}
+        self._count = 0
+        self._record_end = HEADER_SIZE
+        self._payload_start = self.segment_size
+
+    def flush(self, timeout=None):
+        """Write the current segment to disk.
+
+        Parameters:
+            timeout (float): Ignored, the segment is written before this
+                returns.
+
+        Returns:
+            bool: `True`.
+        """
+        with self._lock:
+            if not self._closed:
+                self._map.flush()
+
+        return True
+
+    def close(self):
+        """Write the current segment to disk and close it.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+
+        atexit.unregister(self.close)
+
+
+def record_count(path):
+    """Count the records written to a segment so far.
+
+    Note:
+        Segments are created at their full size, so this tells whether a
+        segment has been written to when its size hasn't changed.
+
+    Parameters:
+        path (str): The path of the segment.
+
+    Raises:
+        ValueError: When the file isn't a segment of a binary trace.
+
+    Returns:
+        int: The number of records, including the names of the callables.
+    """
+    with open(path, 'rb') as segment:
+        header = segment.read(_HEADER.size)
+
+    if len(header) < _HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a binary trace.'.format(path))
+
+    return _COUNTS.unpack_from(header, _COUNTS_OFFSET)[0]
+
+
+def read_segment(path):
+    """Read the events from a segment of a binary trace.
+
+    Parameters:
+        path (str): The path of the segment.
+
+    Raises:
+        ValueError: When the file isn't a segment of a binary trace.
+
+    Yields:
+        TraceEvent: Each event in the segment, in the order they were
+        written.
+    """
+    with open(path, 'rb') as segment:
+        if os.fstat(segment.fileno()).st_size < HEADER_SIZE:
+            raise ValueError('{} is not a binary trace.'.format(path))
+
+        contents = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        if contents[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a binary trace.'.format(path))
+
+        (_, header_size, record_size, _, _, created, base, count,
+         _) = _HEADER.unpack_from(contents)
+
+        names = {}
+        for index in range(count):
+            (kind, flags, name_id, thread, timestamp, elapsed, offset,
+             length) = _RECORD.unpack_from(
+                 contents, header_size + index * record_size)
+            payload = contents[offset:offset + length].decode(
+                'utf-8', 'replace')
+
+            if kind == NAME:
+                names[name_id] = payload
+                continue
+
+            yield TraceEvent(
+                KINDS.get(kind, 'unknown'), names.get(name_id), thread,
+                created + (timestamp - base) / 1e9,
+                elapsed / 1e9 if flags & _HAS_ELAPSED else None, payload)
+    finally:
+        contents.close()
+
+
+def read_trace(path, prefix='trace'):
+    """Read the events from a binary trace.
+
+    Parameters:
+        path (str): The directory the segments were written to, or the path
+            of a single segment.
+        prefix (str): The prefix of the segments' file names, when `path` is
+            a directory.
+
+    Yields:
+        TraceEvent: Each event in the trace, in the order they were written.
+    """
+    if os.path.isdir(path):
+        paths = segment_paths(path, prefix)
+    else:
+        paths = [path]
+
+    for segment in paths:
+        yield from read_segment(segment)
@@ -0,0 +1,107 @@
+"""Generate wrappers with the same parameters as the callables they wrap."""
+
+import functools
+import inspect
+
+# The generated wrappers call back into the helper that made them.
+# pylint: disable=protected-access
+
+
+# The source of the wrappers generated by `compile_wrapper`.
+_COMPILED_WRAPPER = """
+def wrapped_callable({parameters}):
+    if not (_lh_switch.enabled and _lh_is_enabled(_lh_helper._log_level)):
+        return _lh_callable({call})
+
+    return _lh_invoke(_lh_plan, ({args}), {{{kwargs}}})
+"""
+
+
+def compile_wrapper(helper, plan, switch):
+    """Generate a wrapper with the same parameters as the callable.
+
+    Note:
+        The generated wrapper calls the original callable directly with its
+        own parameters when logging is switched off, rather than packing and
+        unpacking `*args` and `**kwargs`. When logging is switched on, it
+        passes the arguments to the helper's `_invoke` already in the order
+        of the plan, just like the generic wrapper.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper to log the calls
+            with.
+        plan (logger_helper.plans.CallPlan): The plan of the callable to
+            wrap.
+        switch (logger_helper.registry.Switch): The switch for the callable.
+
+    Returns:
+        The generated wrapper, or `None` if one can't be generated for the
+        callable (for example, if it's a builtin).
+    """
+    if not inspect.isfunction(plan.callable):
+        return None
+
+    namespace = {
+        '_lh_callable': plan.callable,
+        '_lh_plan': plan,
+        '_lh_switch': switch,
+        '_lh_helper': helper,
+        '_lh_is_enabled': helper._logger.isEnabledFor,
+        '_lh_invoke': helper._invoke
+    }
+
+    definition = []
+    positional = []
+    keywords = []
+    var_positional = var_keyword = None
+    previous_kind = None
+    for parameter in inspect.signature(plan.callable).parameters.values():
+        name = parameter.name
+        if name.startswith('_lh_'):
+            return None
+
+        if (previous_kind == inspect.Parameter.POSITIONAL_ONLY and
+                parameter.kind != previous_kind):
+            definition.append('/')
+        previous_kind = parameter.kind
+
+        source = name
+        if parameter.default is not inspect.Parameter.empty:
+            default_name = '_lh_default_{}'.format(len(namespace))
+            namespace[default_name] = parameter.default
+            source = '{}={}'.format(name, default_name)
+
+        if parameter.kind == inspect.Parameter.VAR_POSITIONAL:
+            var_positional = name
+            definition.append('*' + name)
+        elif parameter.kind == inspect.Parameter.VAR_KEYWORD:
+            var_keyword = name
+            definition.append('**' + name)
+        elif parameter.kind == inspect.Parameter.KEYWORD_ONLY:
+            if var_positional is None and not keywords:
+                definition.append('*')
+            keywords.append(name)
+            definition.append(source)
+        else:
+            positional.append(name)
+            definition.append(source)
+
+    if previous_kind == inspect.Parameter.POSITIONAL_ONLY:
+        definition.append('/')
+
+    args = positional + (['*' + var_positional] if var_positional else [])
+    kwargs = ['{0!r}: {0}'.format(name) for name in keywords] + (
+        ['**' + var_keyword] if var_keyword else [])
+    call = args + ['{0}={0}'.format(name) for name in keywords] + (
+        ['**' + var_keyword] if var_keyword else [])
+
+    source = _COMPILED_WRAPPER.format(
+        parameters=', '.join(definition),
+        call=', '.join(call),
+        args=''.join(arg + ', ' for arg in args),
+        kwargs=', '.join(kwargs))
+
+    exec(compile(  # pylint: disable=exec-used
+        source, '<wrapper of {}>'.format(plan.name), 'exec'), namespace)
+
+    return functools.wraps(plan.callable)(namespace['wrapped_callable'])
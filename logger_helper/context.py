@@ -0,0 +1,198 @@
+"""Identify each wrapped call and the call (and request) it was made in."""
+
+import contextvars
+import itertools
+import uuid
+
+
+# Taking the next value from a count is atomic, so no lock is needed.
+_call_ids = itertools.count(1)
+
+_current_call = contextvars.ContextVar('logger_helper_call', default=None)
+_trace_id = contextvars.ContextVar('logger_helper_trace_id', default=None)
+
+
+class CallContext:
+    """Where a wrapped call was made.
+
+    Attributes:
+        call_id (int): A number that identifies the call, unique within the
+            process.
+        parent_id (int): The `call_id` of the wrapped call this call was made
+            from, or `None` if there isn't one.
+        depth (int): The number of wrapped calls this call was made within.
+        trace_id (str): The trace ID set when the call was made (see
+            `trace`), or `None`.
+        parent (CallContext): The context of the wrapped call this call was
+            made from, or `None`.
+    """
+
+    __slots__ = (
+        'call_id', 'parent_id', 'depth', 'trace_id', 'parent', '_token')
+
+    def __init__(self, parent, trace_id):
+        """Create the context of a new call.
+
+        Parameters:
+            parent (CallContext): The context of the calling call, or `None`.
+            trace_id (str): The current trace ID, or `None`.
+        """
+        self.call_id = next(_call_ids)
+        self.parent = parent
+        self.trace_id = trace_id
+        # The token to reset the current call with while this one is current.
+        self._token = None
+
+        if parent is None:
+            self.parent_id = None
+            self.depth = 0
+        else:
+            self.parent_id = parent.call_id
+            self.depth = parent.depth + 1
+
+    def extra(self):
+        """Get the context as `logging.LogRecord` attributes.
+
+        Returns:
+            dict: The `call_id`, `parent_id`, `depth` and `trace_id`.
+        """
+        return {
+            'call_id': self.call_id,
+            'parent_id': self.parent_id,
+            'depth': self.depth,
+            'trace_id': self.trace_id
+        }
+
+
+def enter():
+    """Start the context of a new call within the current one.
+
+    Returns:
+        CallContext: The context of the new call, to pass to `exit`.
+    """
+    context = CallContext(_current_call.get(), _trace_id.get())
+    resume(context)
+
+    return context
+
+
+def resume(context):
+    """Make the context of a suspended call current again.
+
+    Note:
+        A generator's context should only be current while it runs, and not
+        while it's suspended, otherwise the calls made by whatever is
+        consuming it would be given it as their parent. Its wrapper `exit`s
+        the context after each step and `resume`s it before the next.
+
+    Parameters:
+        context (CallContext): The context returned by `enter`.
+
+    Returns:
+        None
+    """
+    # pylint: disable=protected-access
+    context._token = _current_call.set(context)
+
+
+def exit(context):  # pylint: disable=redefined-builtin
+    """End or suspend the context of a call, going back to the previous one.
+
+    Note:
+        Nothing happens if the context isn't current (it's already been
+        exited).
+
+    Parameters:
+        context (CallContext): The context returned by `enter`.
+
+    Returns:
+        None
+    """
+    # pylint: disable=protected-access
+    token, context._token = context._token, None
+    if token is None:
+        return
+
+    try:
+        _current_call.reset(token)
+    except ValueError:
+        # The call ended in a different context than it started in.
+        _current_call.set(context.parent)
+
+
+def current():
+    """Get the context of the wrapped call in progress.
+
+    Returns:
+        CallContext: The context, or `None` if there isn't a wrapped call in
+        progress.
+    """
+    return _current_call.get()
+
+
+def get_trace_id():
+    """Get the current trace ID.
+
+    Returns:
+        str: The trace ID, or `None` if one hasn't been set.
+    """
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id):
+    """Set the trace ID given to calls made from now on in this context.
+
+    Parameters:
+        trace_id (str): The trace ID, or `None` to clear it.
+
+    Returns:
+        None
+    """
+    _trace_id.set(trace_id)
+
+
+class trace:  # pylint: disable=invalid-name
+    """Set the trace ID for the calls made within a `with` block.
+
+    For example, to give every call made while handling a request the ID of
+    the request::
+
+        with logger_helper.context.trace(request.id):
+            handle(request)
+
+    The trace ID (and the current call) are kept in context variables, so
+    they follow `asyncio` tasks, and threads started with
+    `contextvars.copy_context().run` (or `asyncio.to_thread`).
+    """
+
+    def __init__(self, trace_id=None):
+        """Create a new trace.
+
+        Parameters:
+            trace_id (str): The trace ID. A random one is made if this isn't
+                given.
+        """
+        self.trace_id = uuid.uuid4().hex if trace_id is None else trace_id
+        self._previous = None
+
+    def __enter__(self):
+        """Set the trace ID.
+
+        Returns:
+            str: The trace ID.
+        """
+        self._previous = _trace_id.get()
+        _trace_id.set(self.trace_id)
+
+        return self.trace_id
+
+    def __exit__(self, *exc_info):
+        """Put the previous trace ID back.
+
+        Parameters:
+            exc_info: The details of the exception raised in the block.
+
+        Returns:
+            None
+        """
+        _trace_id.set(self._previous)
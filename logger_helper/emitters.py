@@ -0,0 +1,868 @@
+"""Emitters that change how and when messages reach the logger."""
+
+import abc
+import atexit
+import collections
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from logger_helper.messages import CallMessage
+from logger_helper.messages import ExceptionMessage
+from logger_helper.messages import ReturnMessage
+from logger_helper.messages import YieldMessage
+from logger_helper.messages import make_record
+from logger_helper.messages import make_structured_record
+from logger_helper.plans import repr_arguments
+
+
+class Emitter(abc.ABC):
+    """Receive the messages logged by a `logger_helper.LoggerHelper`.
+
+    Set an emitter as the `emitter` attribute of a helper to replace the
+    default behaviour of passing each message straight to the logger. Emitters
+    are given the messages unformatted (see `logger_helper.messages`), it's up
+    to each emitter to decide when (or whether) they're formatted.
+    """
+
+    @abc.abstractmethod
+    def emit(self, logger, level, message):
+        """Handle a message.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for.
+            level (int): The level to log the message at.
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+
+    def flush(self, timeout=None):  # pylint: disable=unused-argument
+        """Wait for any messages the emitter is holding on to to be logged.
+
+        Emitters that log each message as it's emitted have nothing to wait
+        for, so by default this returns straight away.
+
+        Parameters:
+            timeout (float): The most time, in seconds, to wait for. If this
+                is `None`, wait for as long as it takes.
+
+        Returns:
+            bool: `True` if all of the messages were logged.
+        """
+        return True
+
+    def close(self):
+        """Log any remaining messages and release the emitter's resources.
+
+        Returns:
+            None
+        """
+
+
+def _make_record(logger, level, message, created, thread, thread_name):
+    """Create a log record for a message that was logged earlier.
+
+    Parameters:
+        logger (logging.Logger): The logger the message is for.
+        level (int): The level to log the message at.
+        message: The message to log.
+        created (float): The time the message was logged at, as returned by
+            `time.time`.
+        thread (int): The identifier of the thread the message was logged on.
+        thread_name (str): The name of the thread the message was logged on.
+
+    Returns:
+        logging.LogRecord: The record, as if it were made when and where the
+        message was logged (with the message's call context, if it has one,
+        or its fields if the helper's `structured_extras` is set, which are
+        added when the record is used).
+    """
+    helper = getattr(message, 'helper', None)
+    if helper is not None and helper.structured_extras:
+        record = make_structured_record(logger, level, message, message)
+    else:
+        record = make_record(logger, level, message, message)
+
+        context = getattr(message, 'context', None)
+        if context is not None:
+            record.__dict__.update(context.extra())
+
+    record.created = created
+    record.msecs = (created - int(created)) * 1000
+    # pylint: disable=protected-access
+    record.relativeCreated = (created - logging._startTime) * 1000
+    record.thread = thread
+    record.threadName = thread_name
+
+    return record
+
+
+class AsyncEmitter(Emitter):
+    """Log messages from a background thread.
+
+    Messages are put on a bounded queue along with the time and thread they
+    were logged on, then a worker thread creates the log records and passes
+    them through the logger's handlers. This keeps slow handlers off the
+    threads making the calls.
+
+    Note:
+        Unless `snapshot` is set, messages are formatted by the worker, so
+        arguments that are changed after a call will be logged with their new
+        values. The helper's `lazy_messages` setting doesn't apply.
+    """
+
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    BLOCK = 'block'
+
+    def __init__(self, max_size=10000, overflow=DROP_OLDEST, snapshot=False):
+        """Create a new emitter and start its worker thread.
+
+        Parameters:
+            max_size (int): The most messages that can be waiting to be
+                logged.
+            overflow (str): What to do with a message when the queue is full.
+                One of:
+
+                 - `AsyncEmitter.DROP_OLDEST` - Discard the oldest waiting
+                   message to make room for it.
+                 - `AsyncEmitter.DROP_NEWEST` - Discard the new message.
+                 - `AsyncEmitter.BLOCK` - Wait for there to be room for it.
+
+            snapshot (bool): Whether to format messages on the calling thread
+                before they're queued, so they show the arguments as they
+                were at the time of the call.
+
+        Attributes:
+            dropped (int): The number of messages that have been discarded
+                because the queue was full, or because they were emitted after
+                the emitter was closed.
+
+        Raises:
+            ValueError: When `overflow` isn't one of the policies above.
+        """
+        if overflow not in (self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK):
+            raise ValueError('Unknown overflow policy {!r}.'.format(overflow))
+
+        self.dropped = 0
+
+        self._max_size = max_size
+        self._overflow = overflow
+        self._snapshot = snapshot
+
+        # Appending to and popping from a deque are atomic, so the queue
+        # itself needs no lock. A deque with a `maxlen` discards the oldest
+        # item when it's full.
+        self._queue = collections.deque(
+            maxlen=max_size if overflow == self.DROP_OLDEST else None)
+        self._wakeup = threading.Event()
+        self._state = threading.Condition()
+        self._busy = False
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._work, name='logger-helper-emitter', daemon=True)
+        self._worker.start()
+
+        atexit.register(self.close)
+
+    def emit(self, logger, level, message):
+        """Queue a message to be logged by the worker thread.
+
+        Messages emitted once the emitter is closed have no worker to log
+        them, so they're discarded and counted in `dropped`.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for.
+            level (int): The level to log the message at.
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+        if self._closed:
+            self.dropped += 1
+            return
+
+        if self._snapshot:
+            message = str(message)
+
+        queue = self._queue
+        if len(queue) >= self._max_size:
+            if self._overflow == self.DROP_NEWEST:
+                self.dropped += 1
+                return
+            elif self._overflow == self.DROP_OLDEST:
+                self.dropped += 1
+            elif not self._wait_for_space():
+                self.dropped += 1
+                return
+
+        thread = threading.current_thread()
+        queue.append(
+            (logger, level, message, time.time(), thread.ident, thread.name))
+
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _wait_for_space(self):
+        """Block until there's room in the queue for another message.
+
+        Returns:
+            bool: `True` if there's room, or `False` if the emitter was closed
+            while waiting.
+        """
+        with self._state:
+            while len(self._queue) >= self._max_size and not self._closed:
+                self._wakeup.set()
+                self._state.wait(0.1)
+
+            return not self._closed
+
+    def flush(self, timeout=None):
+        """Wait for all of the queued messages to be logged.
+
+        Parameters:
+            timeout (float): The most time, in seconds, to wait for. If this
+                is `None`, wait for as long as it takes.
+
+        Returns:
+            bool: `True` if all of the messages were logged.
+        """
+        self._wakeup.set()
+
+        with self._state:
+            return self._state.wait_for(
+                lambda: not self._queue and not self._busy, timeout)
+
+    def close(self):
+        """Log the queued messages and stop the worker thread.
+
+        Returns:
+            None
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._wakeup.set()
+        self._worker.join()
+
+        atexit.unregister(self.close)
+
+    def _work(self):
+        """Log queued messages until the emitter is closed.
+
+        Returns:
+            None
+        """
+        queue = self._queue
+
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            with self._state:
+                self._busy = True
+
+            while True:
+                try:
+                    event = queue.popleft()
+                except IndexError:
+                    break
+
+                logger = event[0]
+                try:
+                    logger.handle(_make_record(*event))
+                except Exception:  # pylint: disable=broad-except
+                    # A broken handler mustn't stop the worker, the handlers
+                    # report their own errors through `handleError`.
+                    pass
+
+            with self._state:
+                self._busy = False
+                self._state.notify_all()
+
+            if self._closed and not queue:
+                return
+
+
+class _Ring:
+    """A fixed-size buffer of the latest messages logged on a thread."""
+
+    __slots__ = ('thread', 'events', 'index')
+
+    def __init__(self, thread, size):
+        """Create an empty buffer.
+
+        Parameters:
+            thread (threading.Thread): The thread the buffer is for.
+            size (int): The number of messages the buffer holds.
+        """
+        self.thread = thread
+        self.events = [None] * size
+        self.index = 0
+
+    def drain(self):
+        """Take the messages out of the buffer.
+
+        Returns:
+            list: The messages, oldest first.
+        """
+        events = self.events
+        index = self.index
+
+        ordered = events[index:] + events[:index]
+        for position in range(len(events)):
+            events[position] = None
+        self.index = 0
+
+        return [event for event in ordered if event is not None]
+
+
+class FlightRecorder(Emitter):
+    """Keep the latest messages and only log them when an exception occurs.
+
+    Each thread records its messages in its own preallocated ring buffer,
+    along with the time they were logged at. The messages keep references to
+    the arguments and return values, nothing is formatted while they're in
+    the buffer. When a call raises an exception (or `dump` is called), the
+    buffered messages are formatted with the helper's formats and logged
+    with the times they were recorded at, followed by the exception.
+
+    Note:
+        Arguments are formatted when they're dumped, so objects that are
+        changed after a call will be logged with their new values.
+    """
+
+    def __init__(self, size=100, dump_on_exception=True):
+        """Create a new recorder.
+
+        Parameters:
+            size (int): The number of messages to keep for each thread.
+            dump_on_exception (bool): Whether to log the buffered messages
+                when an exception message is emitted. If this isn't set,
+                exceptions are buffered like any other message.
+        """
+        self.size = size
+        self.dump_on_exception = dump_on_exception
+
+        self._local = threading.local()
+        self._rings = []
+        self._lock = threading.Lock()
+
+    def emit(self, logger, level, message):
+        """Record a message, logging the buffer if it's for an exception.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for.
+            level (int): The level to log the message at.
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+        try:
+            ring = self._local.ring
+        except AttributeError:
+            ring = self._add_ring()
+
+        event = (logger, level, message, time.time())
+
+        if self.dump_on_exception and isinstance(message, ExceptionMessage):
+            self._log(ring, ring.drain() + [event])
+            return
+
+        index = ring.index
+        ring.events[index] = event
+        ring.index = index + 1 if index + 1 < self.size else 0
+
+    def dump(self, all_threads=False):
+        """Log the buffered messages and empty the buffers.
+
+        Parameters:
+            all_threads (bool): Whether to log the messages recorded by every
+                thread, rather than just the current thread. The buffers of
+                other threads are read while they may be being written to, so
+                a message being recorded at the time may be lost.
+
+        Returns:
+            int: The number of messages that were logged.
+        """
+        if all_threads:
+            with self._lock:
+                rings = list(self._rings)
+                self._rings = [
+                    ring for ring in rings if ring.thread.is_alive()]
+        else:
+            rings = [getattr(self._local, 'ring', None)]
+
+        count = 0
+        for ring in rings:
+            if ring is not None:
+                events = ring.drain()
+                self._log(ring, events)
+                count += len(events)
+
+        return count
+
+    def clear(self):
+        """Discard the messages buffered by every thread.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            rings = list(self._rings)
+
+        for ring in rings:
+            ring.drain()
+
+    def close(self):
+        """Discard the buffered messages.
+
+        Returns:
+            None
+        """
+        self.clear()
+
+    @staticmethod
+    def _log(ring, events):
+        """Pass recorded messages through the loggers' handlers.
+
+        Parameters:
+            ring (_Ring): The buffer the messages were recorded in.
+            events (list): The `(logger, level, message, created)` tuples.
+
+        Returns:
+            None
+        """
+        thread = ring.thread
+        for logger, level, message, created in events:
+            logger.handle(_make_record(
+                logger, level, message, created, thread.ident, thread.name))
+
+    def _add_ring(self):
+        """Create the buffer for the current thread.
+
+        Returns:
+            _Ring: The buffer for the current thread.
+        """
+        ring = _Ring(threading.current_thread(), self.size)
+        self._local.ring = ring
+
+        with self._lock:
+            self._rings.append(ring)
+
+        return ring
+
+
+class _Batch:
+    """The messages logged by a single thread that are waiting to be logged."""
+
+    __slots__ = ('thread', 'events', 'lock', 'logging')
+
+    def __init__(self, thread):
+        """Create an empty batch.
+
+        Parameters:
+            thread (threading.Thread): The thread the batch is for.
+        """
+        self.thread = thread
+        self.events = []
+        # Held while the events are added or taken, never while they're
+        # logged.
+        self.lock = threading.Lock()
+        # Held while the events are logged, so batches are logged in order.
+        self.logging = threading.RLock()
+
+
+def _handlers(logger):
+    """Find the handlers that a logger passes its records to.
+
+    Parameters:
+        logger (logging.Logger): The logger.
+
+    Returns:
+        list: The handlers of the logger and its ancestors, stopping at the
+        first logger that doesn't propagate, just like `Logger.callHandlers`.
+    """
+    handlers = []
+    while logger is not None:
+        handlers.extend(logger.handlers)
+        if not logger.propagate:
+            break
+        logger = logger.parent
+
+    return handlers
+
+
+class BatchEmitter(Emitter):
+    """Collect messages on each thread and log them in batches.
+
+    Each thread appends its messages to its own buffer, so threads don't
+    contend over the handlers' locks on every call. A buffer is logged when
+    it's full, every `interval` seconds and when the program exits. The
+    records in a batch are passed to each handler while holding its lock
+    once, rather than once per record.
+
+    Each record is given a `seq` attribute, a number that increases with
+    every message logged through the emitter (on any thread), so the
+    records can be put back in order after they've been written. Records
+    from the same thread are always logged in order.
+
+    Note:
+        Messages are formatted by the handlers, so arguments that are
+        changed after a call, but before the batch is logged, will be logged
+        with their new values. The helper's `lazy_messages` setting doesn't
+        apply.
+    """
+
+    def __init__(self, batch_size=100, interval=1.0):
+        """Create a new emitter.
+
+        Parameters:
+            batch_size (int): The number of messages a thread collects before
+                they're logged.
+            interval (float): How often, in seconds, to log the messages that
+                are waiting, from a background thread. Use `None` to only log
+                them when a batch is full, when `flush` is called and at exit.
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+
+        # Taking the next value from a count is atomic, so no lock is needed.
+        self._sequence = itertools.count()
+        self._local = threading.local()
+        self._batches = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._worker = None
+        if interval is not None:
+            self._worker = threading.Thread(
+                target=self._work, name='logger-helper-batcher', daemon=True)
+            self._worker.start()
+
+        atexit.register(self.close)
+
+    def emit(self, logger, level, message):
+        """Add a message to the current thread's batch.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for.
+            level (int): The level to log the message at.
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+        try:
+            batch = self._local.batch
+        except AttributeError:
+            batch = self._add_batch()
+
+        event = (logger, level, message, time.time(), next(self._sequence))
+
+        with batch.lock:
+            batch.events.append(event)
+            full = len(batch.events) >= self.batch_size
+
+        if full:
+            self._log_batch(batch)
+
+    def flush(self, timeout=None):
+        """Log the messages waiting in every thread's batch.
+
+        Parameters:
+            timeout (float): Ignored, the messages are logged before this
+                returns.
+
+        Returns:
+            bool: `True`, as all of the messages were logged.
+        """
+        with self._lock:
+            batches = list(self._batches)
+            self._batches = [
+                batch for batch in batches if batch.thread.is_alive()]
+
+        for batch in batches:
+            self._log_batch(batch)
+
+        return True
+
+    def close(self):
+        """Log the waiting messages and stop the background thread.
+
+        Returns:
+            None
+        """
+        if self._closed.is_set():
+            return
+
+        self._closed.set()
+        if self._worker is not None:
+            self._worker.join()
+
+        self.flush()
+
+        atexit.unregister(self.close)
+
+    def _work(self):
+        """Log the waiting messages every `interval` until closed.
+
+        Returns:
+            None
+        """
+        while not self._closed.wait(self.interval):
+            self.flush()
+
+    def _log_batch(self, batch):
+        """Log the messages in a batch and empty it.
+
+        Note:
+            The messages are taken out of the batch under its `lock`, but
+            logged without it, holding only its reentrant `logging` lock, so
+            that batches from the same thread are logged in order. A handler
+            (or a `value_repr`) that calls a wrapped callable, and so logs
+            through the emitter again, doesn't deadlock.
+
+        Parameters:
+            batch (_Batch): The batch to log.
+
+        Returns:
+            None
+        """
+        with batch.logging:
+            with batch.lock:
+                events, batch.events = batch.events, []
+            if not events:
+                return
+
+            thread = batch.thread
+            records = []
+            for logger, level, message, created, sequence in events:
+                record = _make_record(
+                    logger, level, message, created, thread.ident,
+                    thread.name)
+                record.seq = sequence
+                records.append(record)
+
+            # Log the records logger by logger, keeping them in order.
+            start = 0
+            for index in range(1, len(records) + 1):
+                if index == len(records) or events[index][0] is not events[
+                        start][0]:
+                    self._handle(events[start][0], records[start:index])
+                    start = index
+
+    @staticmethod
+    def _handle(logger, records):
+        """Pass records to a logger's handlers, a batch at a time.
+
+        Parameters:
+            logger (logging.Logger): The logger the records are for.
+            records (list): The records.
+
+        Returns:
+            None
+        """
+        if logger.disabled:
+            return
+
+        records = [record for record in records if logger.filter(record)]
+        if not records:
+            return
+
+        handlers = _handlers(logger)
+        if not handlers:
+            if logging.lastResort is not None:
+                handlers = [logging.lastResort]
+            else:
+                return
+
+        for handler in handlers:
+            handler.acquire()
+            try:
+                for record in records:
+                    if record.levelno >= handler.level and (
+                            handler.filter(record)):
+                        handler.emit(record)
+            finally:
+                handler.release()
+
+    def _add_batch(self):
+        """Create the batch for the current thread.
+
+        Returns:
+            _Batch: The batch for the current thread.
+        """
+        batch = _Batch(threading.current_thread())
+        self._local.batch = batch
+
+        with self._lock:
+            self._batches.append(batch)
+
+        return batch
+
+
+class ChromeTraceEmitter(Emitter):
+    """Write calls as Chrome trace events, to be viewed as a timeline.
+
+    Each call is written as a begin (`B`) event, with its arguments, and each
+    return or exception as an end (`E`) event, with the return value or
+    exception. Yielded values and other messages are written as instant
+    (`i`) events. The file can be opened in Perfetto (https://ui.perfetto.dev)
+    or `chrome://tracing`, which show the calls nested on a timeline for
+    each thread.
+
+    Events are written to the file as they're emitted, nothing is kept in
+    memory. The file is a JSON array, which is closed when the emitter is
+    closed, but the viewers also accept a file that was cut short.
+
+    Note:
+        The messages aren't passed on to the logger. Arguments and return
+        values are run through the helper's `value_repr` (or the formatters
+        of the callable) when the event is written. Calls that aren't logged
+        because of sampling, but raise an exception that is, are written as
+        an end event without a begin event.
+    """
+
+    def __init__(self, file):
+        """Create a new emitter.
+
+        Parameters:
+            file: The path of the file to write the events to, or a file
+                object opened for writing text. A file object isn't closed
+                when the emitter is.
+        """
+        if isinstance(file, (str, bytes, os.PathLike)):
+            self._file = open(file, 'w', encoding='utf-8')
+            self._close_file = True
+        else:
+            self._file = file
+            self._close_file = False
+
+        self._pid = os.getpid()
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._separator = '[\n'
+        self._closed = False
+
+        atexit.register(self.close)
+
+    def emit(self, logger, level, message):
+        """Write the trace event for a message.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for (unused).
+            level (int): The level to log the message at (unused).
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+        timestamp = time.perf_counter_ns() / 1000
+        thread = threading.current_thread()
+
+        event = {'ph': 'i', 'ts': timestamp, 'pid': self._pid,
+                 'tid': thread.ident}
+
+        if isinstance(message, CallMessage):
+            event['ph'] = 'B'
+            event['args'] = dict(repr_arguments(
+                message.helper, message.plan, message.args, message.kwargs))
+        elif isinstance(message, ReturnMessage):
+            event['ph'] = 'E'
+            event['args'] = {
+                'return': message.helper.value_repr(message.return_value)}
+        elif isinstance(message, ExceptionMessage):
+            event['ph'] = 'E'
+            event['args'] = {
+                'exception': message.exception.__class__.__qualname__,
+                'message': str(message.exception)}
+        elif isinstance(message, YieldMessage):
+            event['s'] = 't'
+            event['args'] = {
+                'yield': message.helper.value_repr(message.value)}
+        else:
+            event['s'] = 't'
+            event['name'] = str(message)
+
+        if 'name' not in event:
+            plan = message.plan
+            event['name'] = plan.name
+            event['cat'] = getattr(plan.callable, '__module__', None) or ''
+
+        events = [event]
+        if thread.ident not in self._threads:
+            self._threads.add(thread.ident)
+            events.insert(0, {
+                'name': 'thread_name', 'ph': 'M', 'pid': self._pid,
+                'tid': thread.ident, 'args': {'name': thread.name}})
+
+        self._write(events)
+
+    def _write(self, events):
+        """Write events to the file.
+
+        Parameters:
+            events (list): The events, as dictionaries.
+
+        Returns:
+            None
+        """
+        text = ',\n'.join(
+            json.dumps(event, default=str, separators=(',', ':'))
+            for event in events)
+
+        with self._lock:
+            if self._closed:
+                return
+
+            self._file.write(self._separator)
+            self._file.write(text)
+            self._separator = ',\n'
+
+    def flush(self, timeout=None):
+        """Flush the events written so far to the file.
+
+        Parameters:
+            timeout (float): Ignored, the file is flushed before this returns.
+
+        Returns:
+            bool: `True`.
+        """
+        with self._lock:
+            if not self._closed:
+                self._file.flush()
+
+        return True
+
+    def close(self):
+        """Finish the JSON array and close the file (if it was opened here).
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+            if self._separator == ',\n':
+                self._file.write('\n]\n')
+            else:
+                self._file.write('[]\n')
+
+            if self._close_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+        atexit.unregister(self.close)
@@ -0,0 +1,246 @@
+"""Throttle the logging of callables whose logging costs too much."""
+
+import threading
+import time
+
+from logger_helper.sampling import EveryN
+from logger_helper.sampling import Never
+
+
+FULL = 'full'
+SAMPLED = 'sampled'
+SILENCED = 'silenced'
+
+# The states a callable moves through as its logging is throttled.
+STATES = (FULL, SAMPLED, SILENCED)
+
+
+class _Budget:
+    """How much logging a callable has cost, in the current window."""
+
+    __slots__ = (
+        'level', 'start', 'calls', 'logged', 'call_time', 'log_time', 'cost',
+        'original', 'sampler')
+
+    def __init__(self, start):
+        """Create the budget of a callable that's logged in full.
+
+        Parameters:
+            start (float): When the first window started, as returned by
+                `time.monotonic`.
+        """
+        self.level = 0
+        self.start = start
+        self.calls = 0
+        self.logged = 0
+        self.call_time = 0
+        self.log_time = 0
+        self.cost = None
+        self.original = None
+        self.sampler = None
+
+
+class Governor:
+    """Throttle logging of the callables it costs too much to log.
+
+    Set an instance as the `governor` attribute of a
+    `logger_helper.LoggerHelper` to measure, for each callable, the time
+    spent logging its calls against the time spent in the calls themselves.
+    When a callable is called often (at least `min_rate` times a second) and
+    logging it takes more than `budget` of the callable's own time, it's moved
+    from being logged in full to being sampled, and then to being silenced
+    (with the helper's `samplers`). It's moved back a step at a time when its
+    calls slow down, or when logging every call would be well within budget
+    again. Each change is logged with `log_format`, and the calls that aren't
+    logged are counted and reported by the helper (see
+    `logger_helper.LoggerHelper.report_suppressed`).
+
+    Note:
+        Exceptions raised by sampled and silenced calls are still logged.
+        Silenced calls still pass through the sampler, so they're still
+        measured and can be restored.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, budget=0.05, min_rate=100, window=1.0, restore=0.5,
+                 sampler=None):
+        """Create a new governor.
+
+        Parameters:
+            budget (float): The most time logging a callable may take, as a
+                fraction of the time spent in the callable.
+            min_rate (float): The number of calls per second below which a
+                callable is never throttled.
+            window (float): How often, in seconds, each callable's cost is
+                checked.
+            restore (float): How far under the `budget` (and `min_rate`)
+                things must fall, as a fraction, for a callable to be moved
+                back a step, so that it doesn't flip back and forth.
+            sampler: A callable that returns a new
+                `logger_helper.sampling.Sampler` for a callable that's being
+                sampled, by default `EveryN(100)`.
+
+        Attributes:
+            log_format (str): The format of the message logged when a
+                callable changes state. The `callable`, its new `state` and
+                `previous` state, the fraction of its time that logging
+                took (`overhead`) and would take if every call were logged
+                (`projected`) and the `rate` of calls per second are
+                available.
+        """
+        self.budget = budget
+        self.min_rate = min_rate
+        self.window = window
+        self.restore = restore
+        self.sampler = sampler or (lambda: EveryN(100))
+        self.log_format = (
+            'Logging of {callable} changed from {previous} to {state}, '
+            'logging took {overhead:.1%} of its time at {rate:.0f} calls/s')
+
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    # pylint: disable=too-many-arguments
+    def record(self, helper, name, elapsed, overhead, logged):
+        """Record a call, and throttle or restore its callable if needed.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper that logged the
+                call.
+            name (str): The name of the callable.
+            elapsed (int): How long the call took, in nanoseconds.
+            overhead (int): How long logging the call took, in nanoseconds.
+            logged (bool): Whether the call was logged (it may not have been
+                because of sampling).
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            budget = self._budgets.get(name)
+            if budget is None:
+                budget = self._budgets[name] = _Budget(now)
+
+            budget.calls += 1
+            budget.call_time += elapsed
+            budget.log_time += overhead
+            if logged:
+                budget.logged += 1
+
+            if now - budget.start < self.window:
+                return
+
+            change = self._check(helper, name, budget, now)
+
+        # Logged outside of the lock, in case logging calls something that
+        # records a call.
+        if change is not None:
+            helper.log_message(
+                self.log_format.format(callable=name, **change))
+
+    def _check(self, helper, name, budget, now):
+        """Check the cost of a callable at the end of a window.
+
+        Note:
+            The lock must be held when this is called.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper that logs it.
+            name (str): The name of the callable.
+            budget (_Budget): The callable's budget.
+            now (float): The time, as returned by `time.monotonic`.
+
+        Returns:
+            dict: The tokens of the message to log if the callable changed
+            state, otherwise `None`.
+        """
+        call_time = max(budget.call_time, 1)
+        rate = budget.calls / max(now - budget.start, 1e-9)
+        overhead = budget.log_time / call_time
+        if budget.logged:
+            budget.cost = budget.log_time / budget.logged
+        projected = overhead
+        if budget.cost is not None:
+            projected = budget.cost * budget.calls / call_time
+
+        level = budget.level
+        if level < len(STATES) - 1 and (
+                rate >= self.min_rate and overhead > self.budget):
+            level += 1
+        elif level > 0 and (
+                rate < self.min_rate * self.restore or
+                projected <= self.budget * self.restore):
+            level -= 1
+
+        budget.start = now
+        budget.calls = 0
+        budget.logged = 0
+        budget.call_time = 0
+        budget.log_time = 0
+
+        if level == budget.level:
+            return None
+
+        previous = budget.level
+        budget.level = level
+        self._apply(helper, name, budget, previous)
+
+        return {
+            'state': STATES[level],
+            'previous': STATES[previous],
+            'overhead': overhead,
+            'projected': projected,
+            'rate': rate
+        }
+
+    def _apply(self, helper, name, budget, previous):
+        """Set the helper's sampler for a callable to match its state.
+
+        Note:
+            The callable's own sampler, if it had one, is put back when it's
+            logged in full again. If the sampler is replaced (or removed)
+            while the callable is throttled, the replacement is what's put
+            back instead.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper that logs it.
+            name (str): The name of the callable.
+            budget (_Budget): The callable's budget, in its new state.
+            previous (int): The level of the state it was in.
+
+        Returns:
+            None
+        """
+        current = helper.samplers.get(name)
+        if previous == 0 or current is not budget.sampler:
+            budget.original = current
+
+        state = STATES[budget.level]
+        if state == FULL:
+            if budget.original is None:
+                helper.samplers.pop(name, None)
+            else:
+                helper.samplers[name] = budget.original
+            budget.original = None
+            budget.sampler = None
+            return
+
+        if state == SAMPLED:
+            budget.sampler = self.sampler()
+        else:
+            budget.sampler = Never()
+        helper.samplers[name] = budget.sampler
+
+    def states(self):
+        """Get the state of each callable that's being throttled.
+
+        Returns:
+            dict: The state (`sampled` or `silenced`) of each callable that
+            isn't logged in full, keyed by its name.
+        """
+        with self._lock:
+            return {
+                name: STATES[budget.level]
+                for name, budget in self._budgets.items() if budget.level}
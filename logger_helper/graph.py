@@ -0,0 +1,372 @@
+"""Aggregate who calls what, for call graphs and flame graphs."""
+
+import contextvars
+import threading
+
+
+class _Node:
+    """A node of the calling context tree: a callable called along a path."""
+
+    __slots__ = (
+        'name', 'parent', 'depth', 'children', 'count', 'inclusive',
+        'exclusive')
+
+    def __init__(self, name, parent):
+        """Create a new node.
+
+        Parameters:
+            name (str): The name of the callable, or `None` for the root.
+            parent (_Node): The node of the caller, or `None` for the root.
+        """
+        self.name = name
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.children = {}
+        self.count = 0
+        self.inclusive = 0
+        self.exclusive = 0
+
+    def path(self):
+        """Get the names of the callables from the root down to this node.
+
+        Returns:
+            list: The names, outermost first.
+        """
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+
+        return names[::-1]
+
+
+class _Edge:
+    """The calls from one callable to another."""
+
+    __slots__ = ('count', 'inclusive')
+
+    def __init__(self):
+        """Create an edge with no calls."""
+        self.count = 0
+        self.inclusive = 0
+
+
+class Frame:
+    """A call to a callable that's in progress.
+
+    Frames are returned by `CallGraph.enter` and must be passed back to
+    `CallGraph.exit` when the call finishes.
+
+    Attributes:
+        name (str): The name of the callable that was called.
+        parent (Frame): The frame of the call this call was made from, or
+            `None`.
+        node (_Node): The node of the calling context tree the call is
+            counted in, or `None` if the stack is deeper than the graph's
+            `max_depth`.
+        children (int): The time spent in calls made from this call so far,
+            in nanoseconds.
+    """
+
+    __slots__ = ('name', 'parent', 'node', 'children', '_token')
+
+    def __init__(self, name, parent, node):
+        """Create a new frame.
+
+        Parameters:
+            name (str): The name of the callable that was called.
+            parent (Frame): The frame of the calling call, or `None`.
+            node (_Node): The node the call is counted in, or `None`.
+        """
+        self.name = name
+        self.parent = parent
+        self.node = node
+        self.children = 0
+        # The token to reset the current frame with while this one is current.
+        self._token = None
+
+
+class CallGraph:
+    """Aggregate the calls between wrapped callables.
+
+    Set an instance as the `call_graph` attribute of a
+    `logger_helper.LoggerHelper` to record the calls it wraps. The stack of
+    wrapped calls in progress is kept in a context variable, so it's separate
+    for each thread and each `asyncio` task. Calls are aggregated into a
+    calling context tree (a node for each distinct stack of callables) and
+    the edges between callers and callees, so the memory used depends on the
+    shape of the code, not on the number of calls.
+
+    Note:
+        Generators are timed from when they start to when they finish, but
+        their frames are only current while they run, so calls made by
+        whatever consumes a generator, in between the items, aren't counted
+        as if the generator made them.
+    """
+
+    def __init__(self, max_depth=64):
+        """Create an empty call graph.
+
+        Parameters:
+            max_depth (int): The deepest stack to record in the calling
+                context tree. Calls made deeper than this (for example, by
+                deep recursion) are only counted in the edges.
+        """
+        self.max_depth = max_depth
+
+        self._current = contextvars.ContextVar(
+            'logger_helper_call_frame', default=None)
+        self._root = _Node(None, None)
+        self._edges = {}
+        self._lock = threading.Lock()
+
+    def enter(self, name):
+        """Record the start of a call.
+
+        Parameters:
+            name (str): The name of the callable being called.
+
+        Returns:
+            Frame: The frame of the call, to pass to `exit`.
+        """
+        parent = self._current.get()
+        parent_node = self._root if parent is None else parent.node
+
+        node = None
+        if parent_node is not None and parent_node.depth < self.max_depth:
+            node = parent_node.children.get(name)
+            if node is None:
+                with self._lock:
+                    node = parent_node.children.setdefault(
+                        name, _Node(name, parent_node))
+
+        frame = Frame(name, parent, node)
+        self.resume(frame)
+
+        return frame
+
+    def resume(self, frame):
+        """Make the frame of a suspended call current again.
+
+        Note:
+            A generator's frame should only be current while it runs, and not
+            while it's suspended, otherwise the calls made by whatever is
+            consuming it would be counted as its own. Its wrapper `suspend`s
+            the frame after each step and `resume`s it before the next.
+
+        Parameters:
+            frame (Frame): The frame returned by `enter`.
+
+        Returns:
+            None
+        """
+        # pylint: disable=protected-access
+        frame._token = self._current.set(frame)
+
+    def suspend(self, frame):
+        """Go back to the frame that was current before a call's frame.
+
+        Note:
+            Nothing happens if the frame isn't current (it's already been
+            suspended).
+
+        Parameters:
+            frame (Frame): The frame returned by `enter`.
+
+        Returns:
+            None
+        """
+        # pylint: disable=protected-access
+        token, frame._token = frame._token, None
+        if token is None:
+            return
+
+        try:
+            self._current.reset(token)
+        except ValueError:
+            # The call ended in a different context than it started in.
+            self._current.set(frame.parent)
+
+    def exit(self, frame, elapsed):
+        """Record the end of a call.
+
+        Parameters:
+            frame (Frame): The frame returned by `enter`.
+            elapsed (int): How long the call took, in nanoseconds.
+
+        Returns:
+            None
+        """
+        self.suspend(frame)
+
+        parent = frame.parent
+
+        key = (None if parent is None else parent.name, frame.name)
+        exclusive = elapsed - frame.children
+
+        with self._lock:
+            edge = self._edges.get(key)
+            if edge is None:
+                edge = self._edges[key] = _Edge()
+            edge.count += 1
+            edge.inclusive += elapsed
+
+            node = frame.node
+            if node is not None:
+                node.count += 1
+                node.inclusive += elapsed
+                node.exclusive += exclusive
+
+            if parent is not None:
+                parent.children += elapsed
+
+    def reset(self):
+        """Forget everything that's been recorded.
+
+        Note:
+            Calls in progress are still recorded when they finish, but only
+            in the edges.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._root = _Node(None, None)
+            self._edges = {}
+
+    def edges(self):
+        """Get the calls between each pair of callables.
+
+        Returns:
+            dict: A dictionary for each `(caller, callee)` pair of names
+            (the caller is `None` for calls made from outside any wrapped
+            callable), with the `count` of calls and the `inclusive` time
+            spent in them, in nanoseconds.
+        """
+        with self._lock:
+            return {
+                key: {'count': edge.count, 'inclusive': edge.inclusive}
+                for key, edge in self._edges.items()}
+
+    def summary(self):
+        """Summarise the calls to each callable.
+
+        Returns:
+            dict: A dictionary for each callable, keyed by its name, with the
+            `count` of calls, the `inclusive` time spent in them, the
+            `exclusive` time (not counting the wrapped callables they called)
+            and the `callers` and `callees`, as dictionaries of call counts
+            keyed by name. Times are in nanoseconds and are only counted for
+            calls within `max_depth`.
+        """
+        summary = {}
+
+        def entry(name):
+            """Get the summary of a callable, creating it if needed."""
+            return summary.setdefault(name, {
+                'count': 0, 'inclusive': 0, 'exclusive': 0, 'callers': {},
+                'callees': {}})
+
+        with self._lock:
+            for (caller, callee), edge in self._edges.items():
+                callee_entry = entry(callee)
+                callee_entry['count'] += edge.count
+                callee_entry['callers'][caller] = edge.count
+                if caller is not None:
+                    entry(caller)['callees'][callee] = edge.count
+
+            for node in self._nodes():
+                node_entry = entry(node.name)
+                node_entry['exclusive'] += node.exclusive
+
+                # Recursive calls are already counted by the outermost call.
+                if node.name not in self._ancestor_names(node):
+                    node_entry['inclusive'] += node.inclusive
+
+        return summary
+
+    def folded(self, weight='exclusive'):
+        """Export the calling context tree as folded stacks.
+
+        The output can be given to flame graph tools, such as
+        `flamegraph.pl`, speedscope or Perfetto.
+
+        Parameters:
+            weight (str): What to weight each stack by, `exclusive` (the
+                time spent in the callable itself, in nanoseconds) or `count`
+                (the number of calls).
+
+        Returns:
+            str: A line for each distinct stack, of the names of the
+            callables separated by `;`, then a space and the weight.
+
+        Raises:
+            ValueError: When `weight` isn't `exclusive` or `count`.
+        """
+        if weight not in ('exclusive', 'count'):
+            raise ValueError('Unknown weight {!r}.'.format(weight))
+
+        with self._lock:
+            lines = [
+                '{} {}'.format(';'.join(node.path()), getattr(node, weight))
+                for node in self._nodes()]
+
+        return ''.join(line + '\n' for line in sorted(lines))
+
+    def tree(self):
+        """Export the calling context tree.
+
+        Returns:
+            list: A dictionary for each callable called from outside any
+            wrapped callable, with its `name`, `count`, `inclusive` and
+            `exclusive` times (in nanoseconds) and its `children`, a list of
+            dictionaries in the same form.
+        """
+        def export(node):
+            """Export a node and its descendants."""
+            return {
+                'name': node.name,
+                'count': node.count,
+                'inclusive': node.inclusive,
+                'exclusive': node.exclusive,
+                'children': [
+                    export(child)
+                    for child in list(node.children.values())]}
+
+        with self._lock:
+            return [
+                export(child) for child in list(self._root.children.values())]
+
+    def _nodes(self):
+        """List every node of the calling context tree except the root.
+
+        Returns:
+            list: The nodes, parents before their children.
+        """
+        nodes = []
+        pending = list(self._root.children.values())
+        while pending:
+            node = pending.pop()
+            nodes.append(node)
+            pending.extend(node.children.values())
+
+        return nodes
+
+    @staticmethod
+    def _ancestor_names(node):
+        """Get the names of the callables above a node.
+
+        Parameters:
+            node (_Node): The node.
+
+        Returns:
+            set: The names of the node's ancestors.
+        """
+        names = set()
+        node = node.parent
+        while node is not None and node.parent is not None:
+            names.add(node.name)
+            node = node.parent
+
+        return names
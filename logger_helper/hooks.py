@@ -0,0 +1,321 @@
+"""Wrap packages as they're imported, deferring the work until it's needed."""
+
+import functools
+import inspect
+import sys
+import weakref
+
+from logger_helper.registry import matches
+
+
+# pylint: disable=protected-access
+
+
+def _lazy_function(helper, module, name, function):
+    """Create a stand-in for a function that wraps it when it's first called.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper to wrap it with.
+        module (module): The module the function belongs to.
+        name (str): The name of the function in the module.
+        function: The function to wrap.
+
+    Returns:
+        A function that wraps the original on its first call, replaces
+        itself in the module with the wrapper and then calls the wrapper.
+        Anything that kept hold of the stand-in (for example, through `from
+        module import function`) keeps working.
+    """
+    wrapped = None
+
+    @functools.wraps(function)
+    def stand_in(*args, **kwargs):
+        """Wrap the function if it hasn't been already, then call it.
+
+        Parameters:
+            args (list): The positional parameters to pass to the function.
+            kwargs (dict): The keyword parameters to pass to the function.
+
+        Returns:
+            Whatever the function returns.
+        """
+        nonlocal wrapped
+        if wrapped is None:
+            wrapped = helper._wrap_callable(function)
+            if module.__dict__.get(name) is stand_in:
+                setattr(module, name, wrapped)
+
+        return wrapped(*args, **kwargs)
+
+    return stand_in
+
+
+class _LazyMethod:
+    """A stand-in for a method that wraps it when it's first looked up."""
+
+    __slots__ = ('helper', 'owner', 'name', 'function', '__wrapped__')
+
+    def __init__(self, helper, owner, name, function):
+        """Create a new stand-in.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper to wrap it with.
+            owner (type): The class the method belongs to.
+            name (str): The name of the method in the class.
+            function: The method to wrap.
+        """
+        self.helper = helper
+        self.owner = owner
+        self.name = name
+        self.function = function
+        self.__wrapped__ = function
+
+    def __get__(self, instance, owner=None):
+        """Wrap the method and replace the stand-in in the class with it.
+
+        Parameters:
+            instance: The instance the method was looked up on, or `None`.
+            owner (type): The class the method was looked up on.
+
+        Returns:
+            The wrapped method, bound to `instance` if there is one.
+        """
+        wrapped = self.helper._wrap_callable(self.function, True)
+        if self.owner.__dict__.get(self.name) is self:
+            setattr(self.owner, self.name, wrapped)
+
+        return wrapped.__get__(instance, owner)
+
+
+class ImportHook:
+    """Wrap the functions and classes of packages as they're imported.
+
+    Install the hook before the packages are imported. Each module that
+    matches one of the hook's patterns (including the modules within a
+    matching package) has the functions and the methods of the classes that
+    are defined in it wrapped in place, like `logger_helper.LoggerHelper.mod`.
+
+    Wrapping a callable means inspecting its signature, which adds up for a
+    large code base. So each function is replaced by a stand-in that wraps it
+    the first time it's called, and each method by one that wraps it the
+    first time it's looked up. The cost of wrapping is only paid for the
+    callables that are used.
+
+    Note:
+        Coroutine functions, generator functions and asynchronous generator
+        functions are wrapped straight away, so that they can still be told
+        apart from ordinary functions. Callables only appear in the helper's
+        `registry` once they've been wrapped, but patterns given to it apply
+        to them when they are.
+    """
+
+    def __init__(self, helper, *patterns):
+        """Create a new hook.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper to wrap the
+                callables with.
+            patterns (str): The names of the packages or modules to wrap, or
+                glob patterns to match the names of modules against.
+        """
+        self.helper = helper
+        self.patterns = patterns
+
+        self._wrapped = weakref.WeakSet()
+
+    def install(self):
+        """Start wrapping the modules that match as they're imported.
+
+        Note:
+            Modules that match and have already been imported are wrapped
+            straight away.
+
+        Returns:
+            None
+        """
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+        for name, module in list(sys.modules.items()):
+            if (module is not None and module not in self._wrapped and
+                    self.matches(name)):
+                self.wrap_module(module)
+
+    def uninstall(self):
+        """Stop wrapping modules as they're imported.
+
+        Note:
+            Modules that have already been wrapped stay wrapped.
+
+        Returns:
+            None
+        """
+        while self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def matches(self, name):
+        """Check whether a module should be wrapped.
+
+        Parameters:
+            name (str): The fully qualified name of the module.
+
+        Returns:
+            bool: `True` if the name matches one of the hook's patterns.
+        """
+        return any(matches(name, pattern) for pattern in self.patterns)
+
+    def find_spec(self, fullname, path, target=None):
+        """Find the spec of a module, if it's one to wrap.
+
+        Note:
+            The rest of the finders on `sys.meta_path` are asked to find the
+            module, then its loader is replaced with one that wraps the
+            module once it's been executed.
+
+        Parameters:
+            fullname (str): The fully qualified name of the module.
+            path (list): The search path for the module, for submodules.
+            target (module): The module being reloaded, if it's a reload.
+
+        Returns:
+            importlib.machinery.ModuleSpec: The spec, or `None` if the module
+            isn't one to wrap or can't be found.
+        """
+        if not self.matches(fullname):
+            return None
+
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+
+            if spec.loader is not None and hasattr(
+                    spec.loader, 'exec_module'):
+                spec.loader = _WrappingLoader(spec.loader, self)
+
+            return spec
+
+        return None
+
+    def wrap_module(self, module):
+        """Wrap the functions and classes defined in a module, in place.
+
+        Parameters:
+            module (module): The module to wrap.
+
+        Returns:
+            None
+        """
+        helper = self.helper
+        module_name = module.__name__
+        self._wrapped.add(module)
+
+        for name, member in list(vars(module).items()):
+            if getattr(member, '__module__', None) != module_name:
+                continue
+
+            if inspect.isclass(member):
+                self.wrap_class(member)
+            elif not inspect.isfunction(member):
+                continue
+            elif _is_plain_function(member):
+                setattr(module, name, _lazy_function(
+                    helper, module, name, member))
+            else:
+                setattr(module, name, helper._wrap_callable(member))
+
+    def wrap_class(self, cls):
+        """Wrap the methods defined in a class, in place.
+
+        Note:
+            Like `logger_helper.LoggerHelper.cls`, methods that start and end
+            with `__` aren't wrapped and `staticmethod` and `classmethod`
+            objects and the functions of properties are. Plain methods are
+            wrapped when they're first called.
+
+        Parameters:
+            cls (type): The class to wrap.
+
+        Returns:
+            None
+        """
+        helper = self.helper
+
+        for name, member in list(vars(cls).items()):
+            if name.startswith('__') and name.endswith('__'):
+                continue
+
+            if inspect.isfunction(member) and _is_plain_function(member):
+                setattr(cls, name, _LazyMethod(helper, cls, name, member))
+                continue
+
+            wrapped = helper._wrap_member(member, {})
+            if wrapped is not None:
+                setattr(cls, name, wrapped)
+
+
+def _is_plain_function(function):
+    """Check whether a function can be wrapped lazily.
+
+    Parameters:
+        function: The function to check.
+
+    Returns:
+        bool: `True` if the function isn't a coroutine function, generator
+        function or asynchronous generator function.
+    """
+    return not (
+        inspect.iscoroutinefunction(function) or
+        inspect.isgeneratorfunction(function) or
+        inspect.isasyncgenfunction(function))
+
+
+class _WrappingLoader:
+    """A loader that wraps modules after another loader has executed them."""
+
+    def __init__(self, loader, hook):
+        """Create a new loader.
+
+        Parameters:
+            loader (importlib.abc.Loader): The loader to execute the modules.
+            hook (ImportHook): The hook to wrap the modules with.
+        """
+        self._loader = loader
+        self._hook = hook
+
+    def create_module(self, spec):
+        """Create a module, using the original loader.
+
+        Parameters:
+            spec (importlib.machinery.ModuleSpec): The spec of the module.
+
+        Returns:
+            module: The new module, or `None` for the default.
+        """
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        """Execute a module with the original loader, then wrap it.
+
+        Parameters:
+            module (module): The module to execute.
+
+        Returns:
+            None
+        """
+        self._loader.exec_module(module)
+        self._hook.wrap_module(module)
+
+    def __getattr__(self, name):
+        """Pass anything else on to the original loader.
+
+        Parameters:
+            name (str): The name of the attribute.
+
+        Returns:
+            The attribute of the original loader.
+        """
+        return getattr(self._loader, name)
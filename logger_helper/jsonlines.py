@@ -0,0 +1,210 @@
+"""Write messages as JSON lines, with the fields of each message."""
+
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from logger_helper.emitters import Emitter
+from logger_helper.messages import Message
+
+
+# Encodes a string as a quoted JSON string, escaping everything that isn't
+# ASCII (this is the C implementation, when it's available).
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+def _encode_value(value):
+    """Encode a value of a message's fields as JSON.
+
+    Parameters:
+        value: The value, a string, number, `None` or dictionary (anything
+            else is converted to a string).
+
+    Returns:
+        str: The JSON, which is always ASCII.
+    """
+    if isinstance(value, str):
+        return _encode_string(value)
+    elif value is None:
+        return 'null'
+    elif value is True:
+        return 'true'
+    elif value is False:
+        return 'false'
+    elif isinstance(value, int):
+        return int.__repr__(value)
+    elif isinstance(value, float):
+        return float.__repr__(value) if math.isfinite(value) else 'null'
+    elif isinstance(value, dict):
+        return '{' + ','.join([
+            _encode_string(str(key)) + ':' + _encode_value(item)
+            for key, item in value.items()]) + '}'
+
+    return _encode_string(str(value))
+
+
+class JsonLinesEmitter(Emitter):
+    """Write each message as a line of JSON, with its fields.
+
+    Each line is an object with the `time` the message was logged (in
+    seconds since the epoch), the name of the `logger`, the `level`, the
+    `thread` id and `thread_name`, and the fields of the message (see
+    `logger_helper.messages.Message.fields`), so the callable, arguments,
+    return value, exception and elapsed time can be read without parsing
+    any text. Other messages have an `event` of `message` and their text as
+    the `message`.
+
+    Lines are encoded straight from the fields, without building the text of
+    the message, and copied into a buffer that's allocated once. The buffer
+    is written to the file when it's full, when the emitter is flushed or
+    closed and when the program exits, so there's a single write for many
+    messages.
+
+    Note:
+        The messages aren't passed on to the logger. Set the helper's
+        `structured_extras` instead to add the fields to the log records
+        that handlers receive. Messages still in the buffer are lost if the
+        process crashes, call `flush` to write them out.
+    """
+
+    def __init__(self, file, buffer_size=64 * 1024):
+        """Create a new emitter.
+
+        Parameters:
+            file: The path of the file to append the lines to, or a file
+                object opened for writing bytes. A file object isn't closed
+                when the emitter is.
+            buffer_size (int): The size of the buffer, in bytes. Lines longer
+                than this are written on their own.
+        """
+        if isinstance(file, (str, bytes, os.PathLike)):
+            self._file = open(file, 'ab')
+            self._close_file = True
+        else:
+            self._file = file
+            self._close_file = False
+
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._position = 0
+        self._prefixes = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        atexit.register(self.close)
+
+    def emit(self, logger, level, message):
+        """Encode a message and add it to the buffer.
+
+        Parameters:
+            logger (logging.Logger): The logger the message is for.
+            level (int): The level to log the message at.
+            message (logger_helper.messages.Message): The message.
+
+        Returns:
+            None
+        """
+        created = time.time()
+        thread = threading.current_thread()
+
+        if isinstance(message, Message):
+            fields = message.fields()
+        else:
+            fields = {'event': 'message', 'message': str(message)}
+
+        prefix = self._prefixes.get((logger.name, level))
+        if prefix is None:
+            prefix = self._prefixes[(logger.name, level)] = (
+                ',"logger":{},"level":{}'.format(
+                    _encode_string(logger.name),
+                    _encode_string(logging.getLevelName(level))))
+
+        parts = [
+            '{"time":', float.__repr__(created), prefix, ',"thread":',
+            str(thread.ident), ',"thread_name":', _encode_string(thread.name)]
+        for key, value in fields.items():
+            parts.append(',')
+            parts.append(_encode_string(key))
+            parts.append(':')
+            parts.append(_encode_value(value))
+        parts.append('}\n')
+
+        self._write(''.join(parts).encode('ascii'))
+
+    def _write(self, line):
+        """Add an encoded line to the buffer, writing the buffer if it's full.
+
+        Parameters:
+            line (bytes): The line.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            end = self._position + len(line)
+            if end > len(self._buffer):
+                self._write_buffer()
+
+                if len(line) > len(self._buffer):
+                    self._file.write(line)
+                    return
+                end = len(line)
+
+            self._buffer[self._position:end] = line
+            self._position = end
+
+    def _write_buffer(self):
+        """Write the contents of the buffer to the file and empty it.
+
+        Note:
+            The lock must be held when this is called.
+
+        Returns:
+            None
+        """
+        if self._position:
+            self._file.write(self._view[:self._position])
+            self._position = 0
+
+    def flush(self, timeout=None):
+        """Write the buffer to the file and flush it.
+
+        Parameters:
+            timeout (float): Ignored, the buffer is written before this
+                returns.
+
+        Returns:
+            bool: `True`.
+        """
+        with self._lock:
+            if not self._closed:
+                self._write_buffer()
+                self._file.flush()
+
+        return True
+
+    def close(self):
+        """Write the buffer to the file and close it (if it was opened here).
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+            self._write_buffer()
+            if self._close_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+        atexit.unregister(self.close)
@@ -0,0 +1,587 @@
+"""Log messages that are only formatted when they're needed."""
+
+import abc
+import logging
+
+from logger_helper.plans import format_arguments
+from logger_helper.plans import repr_arguments
+
+
+# The context tokens of messages about calls whose context isn't tracked.
+_NO_CONTEXT = {
+    'call_id': None,
+    'parent_id': None,
+    'depth': None,
+    'trace_id': None
+}
+
+
+def _context_tokens(context):
+    """Get the format tokens for the context of a call.
+
+    Parameters:
+        context (logger_helper.context.CallContext): The context, or `None`.
+
+    Returns:
+        dict: The `call_id`, `parent_id`, `depth` and `trace_id` tokens.
+    """
+    if context is None:
+        return _NO_CONTEXT
+
+    return context.extra()
+
+
+def _seconds(elapsed):
+    """Convert a duration in nanoseconds to seconds.
+
+    Parameters:
+        elapsed (int): The duration in nanoseconds, or `None`.
+
+    Returns:
+        float: The duration in seconds, or `None`.
+    """
+    if elapsed is None:
+        return None
+
+    return elapsed / 1e9
+
+
+class Message(abc.ABC):
+    """A log message about a callable that's formatted on demand.
+
+    Messages keep references to everything needed to format them, and are
+    only formatted when they're first converted to a string (for example, by
+    `logging.LogRecord.getMessage`). The formatted message is kept, so it's
+    only ever formatted once. So are the values run through the helper's
+    `value_repr`, which are shared between the text and the `fields`.
+    """
+
+    __slots__ = ('helper', 'plan', 'context', '_text', '_reprs')
+
+    # The name of the event the message is about, in its fields.
+    event = None
+
+    def __init__(self, helper, plan, context=None):
+        """Create a new message.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper whose formats
+                should be used to format the message.
+            plan (logger_helper.CallPlan): The plan of the callable that the
+                message is about.
+            context (logger_helper.context.CallContext): The context of the
+                call the message is about, if the helper tracks them.
+        """
+        self.helper = helper
+        self.plan = plan
+        self.context = context
+        self._text = None
+        self._reprs = None
+
+    @abc.abstractmethod
+    def format(self):
+        """Format the message.
+
+        Returns:
+            str: The formatted message.
+        """
+
+    def fields(self):
+        """Get the message as structured fields, without formatting it.
+
+        Note:
+            The field names don't clash with the attributes of
+            `logging.LogRecord`, so they can be given as `extra`.
+
+        Returns:
+            dict: The `event` (`call`, `return`, `yield` or `exception`), the
+            name of the `callable`, the fields of the particular event and
+            the call context (see `logger_helper.context.CallContext.extra`)
+            if there is one. Values are run through the helper's
+            `value_repr` and times are in seconds.
+        """
+        fields = {'event': self.event, 'callable': self.plan.name}
+        if self.context is not None:
+            fields.update(self.context.extra())
+
+        return fields
+
+    def __str__(self):
+        """Format the message, if it hasn't been already.
+
+        Returns:
+            str: The formatted message.
+        """
+        if self._text is None:
+            self._text = self.format()
+
+        return self._text
+
+    def __repr__(self):
+        """Get a representation of the message that includes its text.
+
+        Returns:
+            str: The representation of the message.
+        """
+        return '<{} {!r}>'.format(self.__class__.__name__, str(self))
+
+
+class CallMessage(Message):
+    """The message logged when a callable is called."""
+
+    __slots__ = ('args', 'kwargs')
+
+    event = 'call'
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, helper, plan, args, kwargs, context=None):
+        """Create a new message.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper whose formats
+                should be used to format the message.
+            plan (logger_helper.CallPlan): The plan of the callable that was
+                called.
+            args (tuple): The positional parameters passed to the callable.
+            kwargs (dict): The keyword parameters passed to the callable.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
+        """
+        super().__init__(helper, plan, context)
+
+        self.args = args
+        self.kwargs = kwargs
+
+    def format(self):
+        """Format the call with the helper's `call_log_format`.
+
+        Returns:
+            str: The formatted message.
+        """
+        return self.helper.call_log_format.format(
+            callable=self.plan.name,
+            args=format_arguments(
+                self.helper, self.plan, self.args, self.kwargs,
+                self._arguments()),
+            **_context_tokens(self.context))
+
+    def fields(self):
+        """Get the call as structured fields.
+
+        Returns:
+            dict: The common fields (see `Message.fields`) and the
+            `arguments`, a dictionary of the formatted value of each
+            argument, keyed by its name.
+        """
+        fields = super().fields()
+        fields['arguments'] = dict(self._arguments())
+
+        return fields
+
+    def _arguments(self):
+        """Run the arguments through `value_repr`, if they haven't been.
+
+        Returns:
+            list: A `(name, text)` tuple for each logged parameter.
+        """
+        if self._reprs is None:
+            self._reprs = repr_arguments(
+                self.helper, self.plan, self.args, self.kwargs)
+
+        return self._reprs
+
+
+class ReturnMessage(Message):
+    """The message logged when a callable returns."""
+
+    __slots__ = ('return_value', 'elapsed')
+
+    event = 'return'
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, helper, plan, return_value, elapsed=None,
+                 context=None):
+        """Create a new message.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper whose formats
+                should be used to format the message.
+            plan (logger_helper.CallPlan): The plan of the callable that
+                returned.
+            return_value: The value the callable returned.
+            elapsed (int): How long the call took, in nanoseconds.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
+        """
+        super().__init__(helper, plan, context)
+
+        self.return_value = return_value
+        self.elapsed = elapsed
+
+    def format(self):
+        """Format the return with the helper's `return_log_format`.
+
+        Returns:
+            str: The formatted message.
+        """
+        return self.helper.return_log_format.format(
+            callable=self.plan.name,
+            value=self._value(),
+            elapsed=_seconds(self.elapsed),
+            **_context_tokens(self.context))
+
+    def fields(self):
+        """Get the return as structured fields.
+
+        Returns:
+            dict: The common fields (see `Message.fields`), the formatted
+            `return_value` and the `elapsed` time.
+        """
+        fields = super().fields()
+        fields['return_value'] = self._value()
+        fields['elapsed'] = _seconds(self.elapsed)
+
+        return fields
+
+    def _value(self):
+        """Run the return value through `value_repr`, if it hasn't been.
+
+        Returns:
+            str: The formatted return value.
+        """
+        if self._reprs is None:
+            self._reprs = self.helper.value_repr(self.return_value)
+
+        return self._reprs
+
+
+class YieldMessage(Message):
+    """The message logged when a generator yields a value."""
+
+    __slots__ = ('value',)
+
+    event = 'yield'
+
+    def __init__(self, helper, plan, value, context=None):
+        """Create a new message.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper whose formats
+                should be used to format the message.
+            plan (logger_helper.CallPlan): The plan of the generator function
+                that yielded the value.
+            value: The value that was yielded.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
+        """
+        super().__init__(helper, plan, context)
+
+        self.value = value
+
+    def format(self):
+        """Format the yield with the helper's `yield_log_format`.
+
+        Returns:
+            str: The formatted message.
+        """
+        return self.helper.yield_log_format.format(
+            callable=self.plan.name,
+            value=self._value(),
+            **_context_tokens(self.context))
+
+    def fields(self):
+        """Get the yield as structured fields.
+
+        Returns:
+            dict: The common fields (see `Message.fields`) and the formatted
+            `value`.
+        """
+        fields = super().fields()
+        fields['value'] = self._value()
+
+        return fields
+
+    def _value(self):
+        """Run the yielded value through `value_repr`, if it hasn't been.
+
+        Returns:
+            str: The formatted value.
+        """
+        if self._reprs is None:
+            self._reprs = self.helper.value_repr(self.value)
+
+        return self._reprs
+
+
+class ExceptionMessage(Message):
+    """The message logged when a callable raises an exception."""
+
+    __slots__ = ('exception', 'elapsed', 'args', 'kwargs')
+
+    event = 'exception'
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, helper, plan, exception, elapsed=None, args=None,
+                 kwargs=None, context=None):
+        """Create a new message.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper whose formats
+                should be used to format the message.
+            plan (logger_helper.CallPlan): The plan of the callable that
+                raised the exception.
+            exception (BaseException): The exception that was raised.
+            elapsed (int): How long the call took, in nanoseconds.
+            args (tuple): The positional parameters passed to the callable,
+                if they were kept.
+            kwargs (dict): The keyword parameters passed to the callable, if
+                they were kept.
+            context (logger_helper.context.CallContext): The context of the
+                call, if the helper tracks them.
+        """
+        super().__init__(helper, plan, context)
+
+        self.exception = exception
+        self.elapsed = elapsed
+        self.args = args
+        self.kwargs = kwargs
+
+    def format(self):
+        """Format the exception with the helper's `exception_log_format`.
+
+        Returns:
+            str: The formatted message.
+        """
+        return self.helper.exception_log_format.format(
+            callable=self.plan.name,
+            name=self.exception.__class__.__qualname__,
+            message=str(self.exception),
+            elapsed=_seconds(self.elapsed),
+            args=self._arguments(),
+            **_context_tokens(self.context))
+
+    def fields(self):
+        """Get the exception as structured fields.
+
+        Returns:
+            dict: The common fields (see `Message.fields`), the name of the
+            `exception`'s type, the `exception_message`, the `elapsed` time
+            and, if they were kept (in `exceptions_only` mode), the
+            `arguments` (see `CallMessage.fields`).
+        """
+        fields = super().fields()
+        fields['exception'] = self.exception.__class__.__qualname__
+        fields['exception_message'] = str(self.exception)
+        fields['elapsed'] = _seconds(self.elapsed)
+        if self.args is not None or self.kwargs is not None:
+            fields['arguments'] = dict(self._arguments().reprs())
+
+        return fields
+
+    def _arguments(self):
+        """Get the arguments of the call, which are formatted only once.
+
+        Returns:
+            Arguments: The arguments.
+        """
+        if self._reprs is None:
+            self._reprs = Arguments(
+                self.helper, self.plan, self.args, self.kwargs)
+
+        return self._reprs
+
+
+class Arguments:
+    """The arguments of a call, formatted only if they're used.
+
+    This is given as the `args` token of formats that don't always include
+    the arguments (like `exception_log_format`), so the arguments are only
+    formatted when the format asks for them.
+    """
+
+    __slots__ = ('helper', 'plan', 'args', 'kwargs', '_reprs')
+
+    def __init__(self, helper, plan, args, kwargs):
+        """Create the arguments of a call.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper whose formats
+                should be used to format the arguments.
+            plan (logger_helper.CallPlan): The plan of the callable that was
+                called.
+            args (tuple): The positional parameters passed to the callable,
+                or `None` if they weren't kept.
+            kwargs (dict): The keyword parameters passed to the callable, or
+                `None` if they weren't kept.
+        """
+        self.helper = helper
+        self.plan = plan
+        self.args = args
+        self.kwargs = kwargs
+        self._reprs = None
+
+    def reprs(self):
+        """Run the arguments through `value_repr`, if they haven't been.
+
+        Returns:
+            list: A `(name, text)` tuple for each logged parameter, which is
+            empty if the arguments weren't kept.
+        """
+        if self._reprs is None:
+            if self.args is None and self.kwargs is None:
+                self._reprs = []
+            else:
+                self._reprs = repr_arguments(
+                    self.helper, self.plan, self.args or (),
+                    self.kwargs or {})
+
+        return self._reprs
+
+    def __str__(self):
+        """Format the arguments with the helper's `argument_format`.
+
+        Returns:
+            str: The formatted arguments, or an empty string if they weren't
+            kept.
+        """
+        if self.args is None and self.kwargs is None:
+            return ''
+
+        return format_arguments(
+            self.helper, self.plan, self.args or (), self.kwargs or {},
+            self.reprs())
+
+    def __format__(self, format_spec):
+        """Format the arguments for `str.format`.
+
+        Parameters:
+            format_spec (str): The format specification, applied to the
+                formatted arguments as a string.
+
+        Returns:
+            str: The formatted arguments.
+        """
+        return format(str(self), format_spec)
+
+
+class StructuredRecord(logging.LogRecord):
+    """A log record that's given the fields of its message when it's used.
+
+    The fields (see `Message.fields`) run values through the helper's
+    `value_repr`, so rather than being passed as `extra` (and paid for even
+    when a filter or handler drops the record), they're added to the record
+    when its message is first got (by a formatter, for example) or one of
+    them is first looked up.
+
+    Note:
+        Records are made by the logger's record factory, so use
+        `make_structured_record` rather than creating them directly. It gives
+        the factory's records the behaviour of this class.
+    """
+
+    def _add_fields(self):
+        """Add the fields of the message, if they haven't been already.
+
+        Returns:
+            None
+        """
+        message = self.__dict__.pop('_structured_message', None)
+        if message is not None:
+            self.__dict__.update(message.fields())
+
+    def getMessage(self):
+        """Add the fields of the message, then get the message's text.
+
+        Returns:
+            str: The text of the message.
+        """
+        self._add_fields()
+
+        return super().getMessage()
+
+    def __getattr__(self, name):
+        """Add the fields of the message when an attribute isn't found.
+
+        Parameters:
+            name (str): The name of the attribute.
+
+        Raises:
+            AttributeError: When the attribute isn't one of the fields.
+
+        Returns:
+            The value of the field.
+        """
+        if name.startswith('__') or (
+                '_structured_message' not in self.__dict__):
+            raise AttributeError(name)
+
+        self._add_fields()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+# The subclasses of `StructuredRecord` made for each record factory's class.
+_STRUCTURED_CLASSES = {logging.LogRecord: StructuredRecord}
+
+
+def make_record(logger, level, msg, message):
+    """Create a log record for a message with the logger's `makeRecord`.
+
+    Records are made through the logger so that the record factory (see
+    `logging.setLogRecordFactory`) is used, as it would be by `Logger.log`.
+
+    Parameters:
+        logger (logging.Logger): The logger the record is for.
+        level (int): The level of the record.
+        msg: The message to log, the `Message` itself or its text.
+        message: The message the record is for. If it's a `Message`, the
+            record's location is where its callable was defined.
+
+    Returns:
+        logging.LogRecord: The record.
+    """
+    plan = getattr(message, 'plan', None)
+    code = getattr(getattr(plan, 'callable', None), '__code__', None)
+    if code is None:
+        pathname, lineno, func = '(unknown file)', 0, None
+    else:
+        pathname, lineno, func = (
+            code.co_filename, code.co_firstlineno, code.co_name)
+
+    return logger.makeRecord(
+        logger.name, level, pathname, lineno, msg, (), None, func)
+
+
+def make_structured_record(logger, level, msg, message):
+    """Create a log record that's given the fields of a message when used.
+
+    Parameters:
+        logger (logging.Logger): The logger the record is for.
+        level (int): The level of the record.
+        msg: The message to log, the `Message` itself or its text.
+        message (Message): The message to add the fields of.
+
+    Returns:
+        StructuredRecord: The record, made by `make_record` and given the
+        behaviour of `StructuredRecord` on top of the record factory's class.
+    """
+    record = make_record(logger, level, msg, message)
+
+    record_class = record.__class__
+    try:
+        structured_class = _STRUCTURED_CLASSES[record_class]
+    except KeyError:
+        if issubclass(record_class, StructuredRecord):
+            structured_class = record_class
+        else:
+            structured_class = type(
+                record_class.__name__, (StructuredRecord, record_class), {})
+        _STRUCTURED_CLASSES[record_class] = structured_class
+
+    record.__class__ = structured_class
+    # pylint: disable=attribute-defined-outside-init,protected-access
+    record._structured_message = message
+
+    return record
@@ -0,0 +1,480 @@
+"""Log calls using `sys.monitoring` (PEP 669) instead of wrappers."""
+
+import functools
+import inspect
+import sys
+
+from logger_helper import CallPlan
+
+
+# pylint: disable=protected-access,unused-argument
+# pylint can't see the `inspect.CO_*` flags, which are set dynamically.
+# pylint: disable=no-member
+
+_monitoring = getattr(sys, 'monitoring', None)
+
+# The code of generators and asynchronous generators, which are suspended
+# between their steps.
+_GENERATOR_FLAGS = inspect.CO_GENERATOR | inspect.CO_ASYNC_GENERATOR
+
+
+def _frame_arguments(code, frame):
+    """Get the arguments a call was made with from its frame.
+
+    Note:
+        This must be called before the callable assigns to any of its
+        parameters, which is the case when its `PY_START` event fires.
+
+    Parameters:
+        code (types.CodeType): The code of the callable that was called.
+        frame (types.FrameType): The frame of the call.
+
+    Returns:
+        tuple: The positional parameters (a tuple) and the keyword parameters
+        (a dictionary) as they would have been passed to a wrapper.
+    """
+    f_locals = frame.f_locals
+    names = code.co_varnames
+    positional_count = code.co_argcount
+    count = positional_count + code.co_kwonlyargcount
+
+    args = [f_locals[name] for name in names[:positional_count]]
+    kwargs = {name: f_locals[name] for name in names[positional_count:count]}
+
+    if code.co_flags & inspect.CO_VARARGS:
+        args.extend(f_locals[names[count]])
+        count += 1
+    if code.co_flags & inspect.CO_VARKEYWORDS:
+        kwargs.update(f_locals[names[count]])
+
+    return tuple(args), kwargs
+
+
+class MonitoringEngine:
+    """Log calls to callables without wrapping them, using `sys.monitoring`.
+
+    Wrapping a callable replaces it with another object, and
+    `logger_helper.LoggerHelper.cls` returns a copy of the class, so checks
+    against the original (such as `isinstance`) stop working. Each call also
+    goes through the extra frame of the wrapper. On Python 3.12 and later
+    this engine selects the code objects of the callables instead, and asks
+    the interpreter to call it back when they start, return and raise. The
+    callables themselves are left exactly as they were.
+
+    The calls are logged through the helper, with the same formats, level,
+    registry, samplers, statistics, call graph and call context as its
+    wrappers. As with the wrappers, a generator's call is only current while
+    the generator runs, not while it's suspended. The start, return, yield
+    and resume events are only switched on for the code that's been
+    selected, and any that fire for code that isn't are disabled. Exceptions
+    are seen as they unwind each frame, and generators as they're resumed by
+    `throw`, which can only be switched on everywhere, so they cost a
+    dictionary lookup per frame.
+
+    Note:
+        A generator's call is logged when it's first resumed, rather than
+        when the generator function is called. Values yielded by generators
+        are logged if the helper's `log_yields` is set, but values yielded by
+        asynchronous generators aren't, because they can't be told apart
+        from the coroutine awaiting something. Calls made while a call is
+        being logged (for example, by a `__repr__`) aren't seen by the
+        engine.
+    """
+
+    def __init__(self, helper, tool_id=None):
+        """Create a new engine.
+
+        Parameters:
+            helper (logger_helper.LoggerHelper): The helper to log the calls
+                with.
+            tool_id (int): The `sys.monitoring` tool id to use. By default,
+                the first id that isn't reserved for debuggers, coverage
+                tools, profilers (such as `cProfile`) or optimizers, and isn't
+                in use, is picked when the engine is installed.
+        """
+        self.helper = helper
+        self.tool_id = tool_id
+
+        # The tool id in use while the engine is installed.
+        self._tool_id = None
+
+        # The code, plan and switch of each selected callable, keyed by the
+        # id of the code, as code objects with the same contents are equal.
+        self._plans = {}
+        self._calls = {}
+        self._installed = False
+
+    def install(self):
+        """Start logging the calls to the selected callables.
+
+        Raises:
+            RuntimeError: When `sys.monitoring` isn't available (before
+                Python 3.12).
+            ValueError: When the engine's tool id is already in use, or no
+                tool id is free.
+
+        Returns:
+            None
+        """
+        if self._installed:
+            return
+        if _monitoring is None:
+            raise RuntimeError('sys.monitoring needs Python 3.12 or later.')
+
+        tool_id = self.tool_id
+        if tool_id is None:
+            tool_id = self._free_tool_id()
+
+        events = _monitoring.events
+        _monitoring.use_tool_id(tool_id, 'logger_helper')
+        self._tool_id = tool_id
+        for event, callback in (
+                (events.PY_START, self._started),
+                (events.PY_RETURN, self._returned),
+                (events.PY_YIELD, self._yielded),
+                (events.PY_RESUME, self._resumed),
+                (events.PY_THROW, self._resumed),
+                (events.PY_UNWIND, self._unwound)):
+            _monitoring.register_callback(tool_id, event, callback)
+        # Exceptions unwinding a frame and generators resumed by `throw`
+        # aren't tied to a location in the code, so they can only be
+        # monitored everywhere.
+        _monitoring.set_events(tool_id, events.PY_THROW | events.PY_UNWIND)
+        self._installed = True
+
+        for code, _, _ in self._plans.values():
+            self._set_events(code)
+
+    def uninstall(self):
+        """Stop logging calls and release the tool id.
+
+        Note:
+            The callables stay selected, so they're logged again if the
+            engine is installed again. Calls in progress aren't logged when
+            they finish.
+
+        Returns:
+            None
+        """
+        if not self._installed:
+            return
+
+        tool_id = self._tool_id
+        for code, _, _ in self._plans.values():
+            _monitoring.set_local_events(tool_id, code, 0)
+        _monitoring.set_events(tool_id, 0)
+
+        events = _monitoring.events
+        for event in (
+                events.PY_START, events.PY_RETURN, events.PY_YIELD,
+                events.PY_RESUME, events.PY_THROW, events.PY_UNWIND):
+            _monitoring.register_callback(tool_id, event, None)
+        _monitoring.free_tool_id(tool_id)
+
+        self._installed = False
+        self._tool_id = None
+        self._calls.clear()
+
+    @staticmethod
+    def _free_tool_id():
+        """Find a tool id that isn't reserved for another kind of tool.
+
+        Raises:
+            ValueError: When every such tool id is in use.
+
+        Returns:
+            int: The tool id.
+        """
+        reserved = {
+            _monitoring.DEBUGGER_ID, _monitoring.COVERAGE_ID,
+            _monitoring.PROFILER_ID, _monitoring.OPTIMIZER_ID}
+        for tool_id in range(6):
+            if (tool_id not in reserved and
+                    _monitoring.get_tool(tool_id) is None):
+                return tool_id
+
+        raise ValueError('No sys.monitoring tool id is free.')
+
+    def func(self, function=None, **options):
+        """Log the calls to a function.
+
+        Parameters:
+            function: The function to log the calls to.
+            options: Options for the arguments of the function (see
+                `logger_helper.LoggerHelper.func`).
+
+        Returns:
+            `function`: The function itself. If `function` isn't given, a
+            decorator that selects a function with the options is returned
+            instead.
+        """
+        if function is None:
+            return functools.partial(self.func, **options)
+
+        self._select(function, False, options)
+
+        return function
+
+    def meth(self, method=None, **options):
+        """Log the calls to a method belonging to a class.
+
+        Parameters:
+            method: The method to log the calls to.
+            options: Options for the arguments of the method (see
+                `logger_helper.LoggerHelper.func`).
+
+        Returns:
+            `method`: The method itself. If `method` isn't given, a decorator
+            that selects a method with the options is returned instead.
+        """
+        if method is None:
+            return functools.partial(self.meth, **options)
+
+        self._select(method, True, options)
+
+        return method
+
+    def cls(self, cls=None, **options):
+        """Log the calls to a class's methods.
+
+        Note:
+            Methods whose names start and end with `__` aren't logged.
+            The same methods are selected as `logger_helper.LoggerHelper.cls`
+            would wrap, including the inherited ones, which are logged
+            whichever class they're called through.
+
+        Parameters:
+            cls: The class to log the calls to the methods of.
+            options: Options for the arguments of every method (see
+                `logger_helper.LoggerHelper.func`).
+
+        Returns:
+            `cls`: The class itself, *not* a copy. If `cls` isn't given, a
+            decorator that selects a class with the options is returned
+            instead.
+        """
+        if cls is None:
+            return functools.partial(self.cls, **options)
+
+        seen = set()
+        for owner in cls.__mro__:
+            if owner is object:
+                continue
+
+            for member_name, member in owner.__dict__.items():
+                if member_name in seen or (
+                        member_name.startswith('__') and
+                        member_name.endswith('__')):
+                    continue
+                seen.add(member_name)
+
+                self._select_member(member, options)
+
+        return cls
+
+    def mod(self, mod, symbols=None):
+        """Log the calls to a module's classes and functions.
+
+        Parameters:
+            mod (module): The module to log the calls to.
+            symbols (list): If this is specified, only the symbols
+                (classes/functions) listed are selected.
+
+        Returns:
+            None
+        """
+        for member_name, member in inspect.getmembers(mod):
+            if symbols is not None and member_name not in symbols:
+                continue
+
+            if inspect.isclass(member):
+                self.cls(member)
+            elif inspect.isfunction(member):
+                self.func(member)
+
+    def _select_member(self, member, options):
+        """Select a member of a class's `__dict__`, if it's a method.
+
+        Parameters:
+            member: The member to select.
+            options (dict): The options for the arguments of the method.
+
+        Returns:
+            None
+        """
+        if isinstance(member, staticmethod):
+            self._select(member.__func__, False, options)
+        elif isinstance(member, classmethod):
+            self._select(member.__func__, True, options)
+        elif isinstance(member, property):
+            for accessor in (member.fget, member.fset, member.fdel):
+                if inspect.isfunction(accessor):
+                    self._select(accessor, True, options)
+        elif inspect.isfunction(member):
+            self._select(member, True, options)
+
+    def _select(self, function, class_method, options):
+        """Select the code of a function to log the calls to.
+
+        Parameters:
+            function: The function to select.
+            class_method (bool): Whether the function takes the instance or
+                class as its first parameter.
+            options (dict): The options for the arguments of the function.
+
+        Returns:
+            None
+        """
+        function = inspect.unwrap(function)
+        code = getattr(function, '__code__', None)
+        if code is None:
+            return
+
+        plan = CallPlan(function, class_method, **options)
+        switch = self.helper.registry.register(plan.name)
+        self._plans[id(code)] = (code, plan, switch)
+
+        if self._installed:
+            self._set_events(code)
+
+    def _set_events(self, code):
+        """Switch on the events for a selected code object.
+
+        Parameters:
+            code (types.CodeType): The code to switch the events on for.
+
+        Returns:
+            None
+        """
+        events = _monitoring.events
+        code_events = events.PY_START | events.PY_RETURN
+        if code.co_flags & _GENERATOR_FLAGS:
+            code_events |= events.PY_YIELD | events.PY_RESUME
+
+        _monitoring.set_local_events(self._tool_id, code, code_events)
+
+    def _started(self, code, instruction_offset):
+        """Log the start of a call, if the callable is being logged.
+
+        Parameters:
+            code (types.CodeType): The code that started running.
+            instruction_offset (int): Where in the code it started.
+
+        Returns:
+            `sys.monitoring.DISABLE` if the code isn't selected.
+        """
+        try:
+            _, plan, switch = self._plans[id(code)]
+        except KeyError:
+            return _monitoring.DISABLE
+
+        helper = self.helper
+        if not (switch.enabled and
+                helper._logger.isEnabledFor(helper._log_level)):
+            return None
+
+        frame = sys._getframe(1)
+        args, kwargs = _frame_arguments(code, frame)
+        self._calls[frame] = helper._call_started(plan, args, kwargs)
+
+        return None
+
+    def _returned(self, code, instruction_offset, return_value):
+        """Log the value returned by a call, if the call is being logged.
+
+        Parameters:
+            code (types.CodeType): The code that returned.
+            instruction_offset (int): Where in the code it returned from.
+            return_value: The value that was returned.
+
+        Returns:
+            `sys.monitoring.DISABLE` if the code isn't selected.
+        """
+        call = self._calls.pop(sys._getframe(1), None)
+        if call is not None:
+            self.helper._call_returned(call, return_value)
+        elif id(code) not in self._plans:
+            return _monitoring.DISABLE
+
+        return None
+
+    def _yielded(self, code, instruction_offset, value):
+        """Suspend a generator's call, logging the value it yielded.
+
+        Note:
+            The value is only logged if the helper's `log_yields` is set, and
+            the code isn't an asynchronous generator's (whose yields can't be
+            told apart from its awaits).
+
+        Parameters:
+            code (types.CodeType): The code of the generator.
+            instruction_offset (int): Where in the code it yielded from.
+            value: The value that was yielded.
+
+        Returns:
+            `sys.monitoring.DISABLE` if the code isn't selected.
+        """
+        call = self._calls.get(sys._getframe(1))
+        if call is not None:
+            helper = self.helper
+            if (helper.log_yields and call.logged and
+                    code.co_flags & inspect.CO_GENERATOR):
+                helper._call_yielded(call, value)
+            helper._call_suspended(call)
+        elif id(code) not in self._plans:
+            return _monitoring.DISABLE
+
+        return None
+
+    def _resumed(self, code, instruction_offset, exception=None):
+        """Make a generator's call current again as it's resumed.
+
+        Parameters:
+            code (types.CodeType): The code of the generator.
+            instruction_offset (int): Where in the code it was resumed.
+            exception (BaseException): The exception thrown into the
+                generator, if it was resumed by `throw`.
+
+        Returns:
+            `sys.monitoring.DISABLE` if the code isn't selected and the
+            generator wasn't resumed by `throw`.
+        """
+        call = self._calls.get(sys._getframe(1))
+        if call is not None:
+            self.helper._call_resumed(call)
+        elif exception is None and id(code) not in self._plans:
+            return _monitoring.DISABLE
+
+        return None
+
+    def _unwound(self, code, instruction_offset, exception):
+        """Log an exception raised by a call, if the call is being logged.
+
+        Note:
+            `PY_UNWIND` events fire for every frame an exception passes
+            through, whether its code is selected or not, and can't be
+            disabled. A generator that's closed early is logged as having
+            returned `None`, except on Python 3.13 and later when it's
+            suspended outside of a `try` block, as it's closed without
+            unwinding.
+
+        Parameters:
+            code (types.CodeType): The code that raised the exception.
+            instruction_offset (int): Where in the code it was raised.
+            exception (BaseException): The exception that was raised.
+
+        Returns:
+            None
+        """
+        if id(code) not in self._plans:
+            return
+
+        call = self._calls.pop(sys._getframe(1), None)
+        if call is None:
+            return
+
+        if isinstance(exception, GeneratorExit):
+            # A generator that's closed before it finishes hasn't failed.
+            self.helper._call_returned(call, None)
+        else:
+            self.helper._call_raised(call, exception)
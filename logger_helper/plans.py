@@ -0,0 +1,262 @@
+"""Plan which arguments of a callable are logged, and how they're formatted."""
+
+import inspect
+
+
+def get_callable_name(clbl):
+    """Get the fully qualified name of a callable.
+
+    Parameters:
+        clbl: The callable to get the name for.
+
+    Returns:
+        str: A string representing the full path to the given callable.
+    """
+    return '{module}.{callable}'.format(
+        module=clbl.__module__,
+        callable=clbl.__qualname__)
+
+
+class _Redacted:
+    """The value logged in place of an argument that's been redacted."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        """Get the text logged in place of the argument.
+
+        Returns:
+            str: `<redacted>`.
+        """
+        return '<redacted>'
+
+    __str__ = __repr__
+
+
+REDACTED = _Redacted()
+
+
+class CallPlan:
+    """The details of a callable that are needed to log calls to it.
+
+    A plan is built once, when the callable is wrapped, so that the signature
+    of the callable doesn't have to be inspected every time it's called. Plans
+    aren't modified after they've been created.
+    """
+
+    POSITIONAL = 0
+    POSITIONAL_ONLY = 1
+    VAR_POSITIONAL = 2
+    KEYWORD = 3
+    VAR_KEYWORD = 4
+
+    __slots__ = (
+        'callable', 'name', 'parameters', 'positional_count', 'names',
+        'redacted', 'hidden_keywords', 'formatters')
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def __init__(self, clbl, class_method=False, include=None, exclude=None,
+                 redact=None, formatters=None):
+        """Create the plan for a callable.
+
+        Parameters:
+            clbl: The callable to create the plan for.
+            class_method (bool): Whether the callable is a method. If it is,
+                its first parameter (the instance, or the class for a
+                `classmethod`) isn't logged, whatever it's called.
+            include (list): If this is given, only the parameters with these
+                names are logged.
+            exclude (list): The names of parameters that aren't logged. Keys
+                with these names are also left out of `**kwargs`.
+            redact (list): The names of parameters whose values are replaced
+                by `REDACTED` (logged as `<redacted>`). Keys with these names
+                are also redacted in `**kwargs`.
+            formatters (dict): Callables to format the values of particular
+                parameters with instead of the helper's `value_repr`, keyed by
+                the name of the parameter. Redacted parameters aren't passed
+                to their formatters.
+
+        Attributes:
+            callable: The callable the plan was created for.
+            name (str): The fully qualified name of the callable.
+            parameters (tuple): A `(kind, name, index, default)` tuple for
+                each parameter that should be logged, in the order they're
+                declared. `kind` is one of the `CallPlan.POSITIONAL`,
+                `CallPlan.POSITIONAL_ONLY`, `CallPlan.VAR_POSITIONAL`,
+                `CallPlan.KEYWORD` or `CallPlan.VAR_KEYWORD` constants and
+                `index` is the position the parameter is passed in (or `None`
+                when it can't be passed positionally).
+            positional_count (int): The number of parameters that can be
+                passed positionally, used to find the start of `*args`.
+            names (frozenset): The names of the parameters that can be passed
+                as keywords, used to find the contents of `**kwargs`.
+            redacted (frozenset): The names of the parameters (and keys of
+                `**kwargs`) that are redacted.
+            hidden_keywords (frozenset): The keys left out of `**kwargs`.
+            formatters (dict): The custom formatters of the parameters that
+                are logged, and aren't redacted.
+
+        Note:
+            Excluded parameters are left out of `parameters`, so their values
+            are never looked at when a call is logged.
+        """
+        kinds = {
+            inspect.Parameter.POSITIONAL_OR_KEYWORD: self.POSITIONAL,
+            inspect.Parameter.POSITIONAL_ONLY: self.POSITIONAL_ONLY,
+            inspect.Parameter.VAR_POSITIONAL: self.VAR_POSITIONAL,
+            inspect.Parameter.KEYWORD_ONLY: self.KEYWORD,
+            inspect.Parameter.VAR_KEYWORD: self.VAR_KEYWORD
+        }
+
+        try:
+            signature_parameters = inspect.signature(clbl).parameters.values()
+        except (TypeError, ValueError):
+            # Some builtins don't have a signature, log everything they're
+            # given instead.
+            signature_parameters = (
+                inspect.Parameter('args', inspect.Parameter.VAR_POSITIONAL),
+                inspect.Parameter('kwargs', inspect.Parameter.VAR_KEYWORD))
+
+        exclude = frozenset(exclude or ())
+        include = None if include is None else frozenset(include)
+
+        parameters = []
+        positional_count = 0
+        names = set()
+        for parameter in signature_parameters:
+            kind = kinds[parameter.kind]
+
+            index = None
+            if kind in (self.POSITIONAL, self.POSITIONAL_ONLY):
+                index = positional_count
+                positional_count += 1
+
+            if kind in (self.POSITIONAL, self.KEYWORD):
+                names.add(parameter.name)
+
+            if class_method and index == 0:
+                continue
+            if parameter.name in exclude or (
+                    include is not None and parameter.name not in include):
+                continue
+
+            parameters.append(
+                (kind, parameter.name, index, parameter.default))
+
+        self.callable = clbl
+        self.name = get_callable_name(clbl)
+        self.parameters = tuple(parameters)
+        self.positional_count = positional_count
+        self.names = frozenset(names)
+        self.redacted = frozenset(redact or ())
+        self.hidden_keywords = exclude
+        self.formatters = {
+            name: formatter for name, formatter in (formatters or {}).items()
+            if name not in self.redacted and
+            any(name == parameter[1] for parameter in self.parameters)}
+
+    def arguments(self, args, kwargs):
+        """Match the arguments of a call up with the parameters they're for.
+
+        Parameters:
+            args (tuple): The positional parameters passed to the callable.
+            kwargs (dict): The keyword parameters passed to the callable.
+
+        Returns:
+            list: A `(name, value)` tuple for each parameter in the plan.
+            Parameters that weren't passed are given their default value and
+            redacted parameters are given `REDACTED`.
+        """
+        arg_count = len(args)
+        redacted = self.redacted
+
+        arguments = []
+        for kind, name, index, default in self.parameters:
+            if index is not None and index < arg_count:
+                value = args[index]
+            elif kind == self.POSITIONAL or kind == self.KEYWORD:
+                value = kwargs.get(name, default)
+            elif kind == self.VAR_POSITIONAL:
+                value = tuple(args[self.positional_count:])
+            elif kind == self.VAR_KEYWORD:
+                value = {
+                    key: REDACTED if key in redacted else val
+                    for key, val in kwargs.items()
+                    if key not in self.names and
+                    key not in self.hidden_keywords}
+            else:
+                value = default
+
+            if name in redacted:
+                value = REDACTED
+
+            arguments.append((name, value))
+
+        return arguments
+
+
+def _get_plan(clbl, class_method=False):
+    """Get the plan for a callable, creating it if it's not already a plan.
+
+    Parameters:
+        clbl: The callable, or an existing `CallPlan`.
+        class_method (bool): Whether the callable is a class method.
+
+    Returns:
+        CallPlan: The plan for the callable.
+    """
+    if isinstance(clbl, CallPlan):
+        return clbl
+
+    return CallPlan(clbl, class_method)
+
+
+def repr_arguments(helper, plan, args, kwargs):
+    """Run the arguments of a call through the helper's `value_repr`.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper whose `value_repr`
+            should be used.
+        plan (CallPlan): The plan of the callable that was called.
+        args (list): Positional parameters passed to the callable.
+        kwargs (dict): Keyword parameters passed to the callable.
+
+    Returns:
+        list: A `(name, text)` tuple for each parameter in the plan, the text
+        coming from the parameter's formatter if it has one.
+    """
+    value_repr = helper.value_repr
+    formatters = plan.formatters
+    if formatters:
+        return [
+            (name, formatters.get(name, value_repr)(value))
+            for name, value in plan.arguments(args, kwargs)]
+
+    return [
+        (name, value_repr(value))
+        for name, value in plan.arguments(args, kwargs)]
+
+
+def format_arguments(helper, plan, args, kwargs, reprs=None):
+    """Format the arguments of a call with the helper's `argument_format`.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper whose formats should
+            be used.
+        plan (CallPlan): The plan of the callable that was called.
+        args (list): Positional parameters passed to the callable.
+        kwargs (dict): Keyword parameters passed to the callable.
+        reprs (list): The arguments already run through `value_repr` (see
+            `repr_arguments`), if they have been.
+
+    Returns:
+        str: The formatted arguments, joined with the helper's
+        `argument_separator`.
+    """
+    if reprs is None:
+        reprs = repr_arguments(helper, plan, args, kwargs)
+    argument_format = helper.argument_format
+
+    return helper.argument_separator.join([
+        argument_format.format(name=name, value=value)
+        for name, value in reprs])
@@ -0,0 +1,868 @@
+r"""Query captured call traces from the command line.
+
+Traces can be text logs, written with a `logger_helper.LoggerHelper`'s
+formats, JSON lines written by `logger_helper.jsonlines.JsonLinesEmitter` or
+binary traces written by `logger_helper.binary.BinaryTraceEmitter`. The
+first query of a trace builds a sidecar index next to it, which summarises
+each block of the trace (its time range and the callables and exception types
+in it), so later queries only read the blocks that can match. Traces are
+streamed, so the memory used doesn't depend on their size.
+
+Run it as ``python -m logger_helper.query`` or ``logger-helper-query``, for
+example::
+
+    logger-helper-query app.log --name 'app.db.*' --exception TimeoutError \
+        --since '2024-01-01 12:00:00' --until '2024-01-01 13:00:00'
+    logger-helper-query traces/ --stats
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import re
+import string
+import sys
+import time
+
+from logger_helper import LoggerHelper
+from logger_helper.binary import MAGIC
+from logger_helper.binary import TraceEvent
+from logger_helper.binary import read_segment
+from logger_helper.binary import record_count
+from logger_helper.binary import segment_paths
+from logger_helper.registry import matches
+from logger_helper.timing import LatencyHistogram
+
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.lhi'
+
+KINDS = ('call', 'return', 'exception', 'yield', 'message')
+
+# The keys events are counted under by `statistics`, by their kind.
+_COUNTS = {
+    'call': 'calls',
+    'return': 'returns',
+    'exception': 'exceptions',
+    'yield': 'yields'
+}
+
+# The `asctime` of the standard `logging.Formatter`, or an ISO 8601 time, at
+# the start of a line of a text log.
+_TIME_PATTERN = re.compile(
+    r'(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d)(?:[,.](\d+))?')
+
+# The patterns of the tokens that can't contain spaces, the rest match
+# anything.
+_TOKEN_PATTERNS = {
+    'callable': r'\S+',
+    'name': r'\S+',
+    'elapsed': r'\S+'
+}
+
+
+def _format_pattern(log_format):
+    """Turn one of the helper's formats into a regular expression.
+
+    Parameters:
+        log_format (str): The format, such as `call_log_format`.
+
+    Returns:
+        re.Pattern: A pattern that matches the end of a line written with the
+        format, with a group for each token.
+    """
+    parts = []
+    seen = set()
+    for literal, field, _, _ in string.Formatter().parse(log_format):
+        parts.append(re.escape(literal))
+        if field is None:
+            continue
+
+        field = re.split(r'[.\[]', field, maxsplit=1)[0]
+        if not field.isidentifier():
+            parts.append('.*?')
+        elif field in seen:
+            parts.append('(?P={})'.format(field))
+        else:
+            seen.add(field)
+            parts.append('(?P<{}>{})'.format(
+                field, _TOKEN_PATTERNS.get(field, '.*?')))
+
+    return re.compile(''.join(parts) + '$')
+
+
+def _exception_type(event):
+    """Get the name of the type of exception an event is about.
+
+    Parameters:
+        event (logger_helper.binary.TraceEvent): An `exception` event.
+
+    Returns:
+        str: The name of the exception's type.
+    """
+    return event.payload.split(':', 1)[0]
+
+
+class TextTrace:
+    """A text log, written with the formats of a helper.
+
+    Note:
+        Events are only given a time if the line starts with one, as written
+        by `logging.Formatter` with `%(asctime)s` at the start of its format
+        (or in ISO 8601), and an elapsed time if the format has an
+        `{elapsed}` token.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, path, call_format, return_format, yield_format,
+                 exception_format, block_lines=10000):
+        """Create a new trace.
+
+        Parameters:
+            path (str): The path of the log.
+            call_format (str): The `call_log_format` it was written with.
+            return_format (str): The `return_log_format` it was written with.
+            yield_format (str): The `yield_log_format` it was written with.
+            exception_format (str): The `exception_log_format` it was
+                written with.
+            block_lines (int): The number of lines in each block of the
+                index.
+        """
+        self.path = path
+        self.block_lines = block_lines
+
+        self._patterns = [
+            ('call', _format_pattern(call_format)),
+            ('return', _format_pattern(return_format)),
+            ('yield', _format_pattern(yield_format)),
+            ('exception', _format_pattern(exception_format))]
+
+    def sources(self):
+        """List the files the trace is read from.
+
+        Returns:
+            list: The paths of the files.
+        """
+        return [self.path]
+
+    def index_path(self):
+        """Get the path of the trace's index.
+
+        Returns:
+            str: The path.
+        """
+        return self.path + INDEX_SUFFIX
+
+    def stamp(self, source):
+        """Get what identifies the contents of a file of the trace.
+
+        Parameters:
+            source (str): The path of the file.
+
+        Returns:
+            list: The name, size and modification time of the file.
+        """
+        stat = os.stat(source)
+
+        return [os.path.basename(source), stat.st_size, stat.st_mtime_ns]
+
+    def blocks(self):
+        """Summarise each block of the trace, for the index.
+
+        Yields:
+            dict: The summary of each block, with the `offset` of its first
+            line and the number of `lines` in it.
+        """
+        with open(self.path, 'rb') as trace:
+            offset = 0
+            while True:
+                summary = _Summary()
+                start = offset
+                lines = 0
+                for line in itertools.islice(trace, self.block_lines):
+                    lines += 1
+                    offset += len(line)
+                    summary.add(self._parse(line))
+
+                if not lines:
+                    return
+
+                yield summary.block(offset=start, lines=lines)
+
+    def read(self, block=None):
+        """Read the events from a block of the trace.
+
+        Parameters:
+            block (dict): The summary of the block from the index, or `None`
+                to read the whole trace.
+
+        Yields:
+            logger_helper.binary.TraceEvent: Each event in the block.
+        """
+        with open(self.path, 'rb') as trace:
+            lines = trace
+            if block is not None:
+                trace.seek(block['offset'])
+                lines = itertools.islice(trace, block['lines'])
+
+            for line in lines:
+                event = self._parse(line)
+                if event is not None:
+                    yield event
+
+    def _parse(self, line):
+        """Parse a line of the log.
+
+        Parameters:
+            line (bytes): The line.
+
+        Returns:
+            logger_helper.binary.TraceEvent: The event the line is about, or
+            `None` if it doesn't match any of the formats.
+        """
+        line = line.decode('utf-8', 'replace').rstrip('\r\n')
+
+        for kind, pattern in self._patterns:
+            match = pattern.search(line)
+            if match is not None:
+                break
+        else:
+            return None
+
+        tokens = match.groupdict()
+
+        when = None
+        time_match = _TIME_PATTERN.match(line)
+        if time_match is not None:
+            seconds, fraction = time_match.groups()
+            when = time.mktime(time.strptime(
+                seconds.replace('T', ' '), '%Y-%m-%d %H:%M:%S'))
+            if fraction:
+                when += float('0.' + fraction)
+
+        elapsed = None
+        try:
+            elapsed = float(tokens['elapsed'])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        if kind == 'call':
+            payload = tokens.get('args', '')
+        elif kind == 'exception':
+            payload = '{}: {}'.format(
+                tokens.get('name', ''), tokens.get('message', ''))
+        else:
+            payload = tokens.get('value', '')
+
+        return TraceEvent(
+            kind, tokens.get('callable'), None, when, elapsed, payload)
+
+
+class JsonLinesTrace(TextTrace):
+    """A log written by `logger_helper.jsonlines.JsonLinesEmitter`."""
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, path, block_lines=10000):
+        """Create a new trace.
+
+        Parameters:
+            path (str): The path of the log.
+            block_lines (int): The number of lines in each block of the
+                index.
+        """
+        self.path = path
+        self.block_lines = block_lines
+
+    def _parse(self, line):
+        """Parse a line of the log.
+
+        Parameters:
+            line (bytes): The line.
+
+        Returns:
+            logger_helper.binary.TraceEvent: The event the line is about, or
+            `None` if it isn't a JSON object.
+        """
+        try:
+            fields = json.loads(line.decode('utf-8', 'replace'))
+        except ValueError:
+            return None
+        if not isinstance(fields, dict):
+            return None
+
+        kind = fields.get('event')
+        if kind == 'call':
+            payload = ', '.join(
+                '{} = {}'.format(name, value)
+                for name, value in fields.get('arguments', {}).items())
+        elif kind == 'return':
+            payload = fields.get('return_value')
+        elif kind == 'yield':
+            payload = fields.get('value')
+        elif kind == 'exception':
+            payload = '{}: {}'.format(
+                fields.get('exception'), fields.get('exception_message'))
+        else:
+            payload = fields.get('message')
+
+        return TraceEvent(
+            kind, fields.get('callable'), fields.get('thread'),
+            fields.get('time'), fields.get('elapsed'), payload or '')
+
+
+class BinaryTrace:
+    """A binary trace, written by `logger_helper.binary.BinaryTraceEmitter`.
+
+    Each segment of the trace is a block of the index.
+    """
+
+    def __init__(self, path):
+        """Create a new trace.
+
+        Parameters:
+            path (str): The directory the segments were written to, or the
+                path of a single segment.
+        """
+        self.path = path
+
+    def sources(self):
+        """List the files the trace is read from.
+
+        Returns:
+            list: The paths of the segments.
+        """
+        if os.path.isdir(self.path):
+            return segment_paths(self.path)
+
+        return [self.path]
+
+    def index_path(self):
+        """Get the path of the trace's index.
+
+        Returns:
+            str: The path.
+        """
+        if os.path.isdir(self.path):
+            return os.path.join(self.path, 'index' + INDEX_SUFFIX)
+
+        return self.path + INDEX_SUFFIX
+
+    def stamp(self, source):
+        """Get what identifies the contents of a segment of the trace.
+
+        Note:
+            Segments don't change size as they're written to, and their
+            modification time isn't updated until the operating system
+            writes them to disk, so the number of records is used instead.
+
+        Parameters:
+            source (str): The path of the segment.
+
+        Returns:
+            list: The name of the segment and the number of records in it.
+        """
+        return [os.path.basename(source), record_count(source)]
+
+    def blocks(self):
+        """Summarise each segment of the trace, for the index.
+
+        Yields:
+            dict: The summary of each segment, with its `path`.
+        """
+        for path in self.sources():
+            summary = _Summary()
+            for event in read_segment(path):
+                summary.add(event)
+
+            yield summary.block(path=path)
+
+    def read(self, block=None):
+        """Read the events from a segment of the trace.
+
+        Parameters:
+            block (dict): The summary of the segment from the index, or
+                `None` to read the whole trace.
+
+        Yields:
+            logger_helper.binary.TraceEvent: Each event in the segment.
+        """
+        paths = self.sources() if block is None else [block['path']]
+        for path in paths:
+            yield from read_segment(path)
+
+
+class _Summary:
+    """The summary of a block of a trace, as it's read."""
+
+    def __init__(self):
+        """Create an empty summary."""
+        self.events = 0
+        self.start = None
+        self.end = None
+        self.names = set()
+        self.exceptions = set()
+
+    def add(self, event):
+        """Add an event to the summary.
+
+        Parameters:
+            event (logger_helper.binary.TraceEvent): The event, or `None`.
+
+        Returns:
+            None
+        """
+        if event is None:
+            return
+
+        self.events += 1
+        if event.time is not None:
+            if self.start is None or event.time < self.start:
+                self.start = event.time
+            if self.end is None or event.time > self.end:
+                self.end = event.time
+        if event.name is not None:
+            self.names.add(event.name)
+        if event.kind == 'exception':
+            self.exceptions.add(_exception_type(event))
+
+    def block(self, **fields):
+        """Get the summary as an entry of the index.
+
+        Parameters:
+            fields: Where the block is in the trace.
+
+        Returns:
+            dict: The summary.
+        """
+        block = {
+            'events': self.events,
+            'start': self.start,
+            'end': self.end,
+            'names': sorted(self.names),
+            'exceptions': sorted(self.exceptions)
+        }
+        block.update(fields)
+
+        return block
+
+
+def open_trace(path, formats=None):
+    """Open a trace, working out what kind of trace it is.
+
+    Parameters:
+        path (str): The path of a text log, a JSON lines log, a segment of
+            a binary trace or the directory of a binary trace.
+        formats (dict): The `call_format`, `return_format`, `yield_format`
+            and `exception_format` of a text log, by default those of a new
+            `logger_helper.LoggerHelper`.
+
+    Returns:
+        TextTrace, JsonLinesTrace or BinaryTrace: The trace.
+    """
+    if os.path.isdir(path):
+        return BinaryTrace(path)
+
+    with open(path, 'rb') as trace:
+        start = trace.read(len(MAGIC))
+        if start == MAGIC:
+            return BinaryTrace(path)
+        elif start.startswith(b'{'):
+            return JsonLinesTrace(path)
+
+    defaults = LoggerHelper(logging.getLogger(__name__), logging.DEBUG)
+    options = {
+        'call_format': defaults.call_log_format,
+        'return_format': defaults.return_log_format,
+        'yield_format': defaults.yield_log_format,
+        'exception_format': defaults.exception_log_format
+    }
+    options.update(formats or {})
+
+    return TextTrace(path, **options)
+
+
+def build_index(trace, rebuild=False):
+    """Build the sidecar index of a trace, unless it's up to date.
+
+    Note:
+        The index records a stamp of each file of the trace (see
+        `TextTrace.stamp` and `BinaryTrace.stamp`), and is built again when
+        any of them change.
+
+    Parameters:
+        trace (TextTrace or BinaryTrace): The trace.
+        rebuild (bool): Whether to build it even if it's up to date.
+
+    Returns:
+        str: The path of the index.
+    """
+    header = {
+        'version': INDEX_VERSION,
+        'sources': [trace.stamp(source) for source in trace.sources()]
+    }
+
+    path = trace.index_path()
+    if not rebuild:
+        try:
+            with open(path, encoding='utf-8') as index:
+                if json.loads(index.readline()) == header:
+                    return path
+        except (OSError, ValueError):
+            pass
+
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as index:
+        index.write(json.dumps(header) + '\n')
+        for block in trace.blocks():
+            index.write(json.dumps(block) + '\n')
+    os.replace(temporary, path)
+
+    return path
+
+
+def read_index(path):
+    """Read the blocks of an index.
+
+    Parameters:
+        path (str): The path of the index.
+
+    Yields:
+        dict: The summary of each block.
+    """
+    with open(path, encoding='utf-8') as index:
+        index.readline()
+        for line in index:
+            yield json.loads(line)
+
+
+class Query:
+    """A filter for the events of a trace."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, names=None, kinds=None, exceptions=None, since=None,
+                 until=None):
+        """Create a new query.
+
+        Parameters:
+            names (list): Glob patterns (or the names of modules or classes)
+                that the callables must match one of.
+            kinds (list): The kinds of event to match.
+            exceptions (list): The names of the types of exception to match,
+                only `exception` events match if this is given.
+            since (float): The earliest time to match, in seconds since the
+                epoch.
+            until (float): The latest time to match, in seconds since the
+                epoch.
+        """
+        self.names = names or None
+        self.kinds = set(kinds) if kinds else None
+        self.exceptions = set(exceptions) if exceptions else None
+        self.since = since
+        self.until = until
+
+        if self.exceptions is not None:
+            self.kinds = {'exception'}
+
+    def matches_block(self, block):
+        """Check whether any of the events in a block might match.
+
+        Parameters:
+            block (dict): The summary of the block from the index.
+
+        Returns:
+            bool: `False` if none of the events in the block match.
+        """
+        if not block['events']:
+            return False
+        if self.names is not None and not any(
+                self._matches_name(name) for name in block['names']):
+            return False
+        if self.exceptions is not None and self.exceptions.isdisjoint(
+                block['exceptions']):
+            return False
+        if self.since is not None or self.until is not None:
+            if block['start'] is None:
+                return False
+            if self.since is not None and block['end'] < self.since:
+                return False
+            if self.until is not None and block['start'] > self.until:
+                return False
+
+        return True
+
+    def matches(self, event):
+        """Check whether an event matches.
+
+        Parameters:
+            event (logger_helper.binary.TraceEvent): The event.
+
+        Returns:
+            bool: `True` if the event matches.
+        """
+        if self.kinds is not None and event.kind not in self.kinds:
+            return False
+        if self.names is not None and (
+                event.name is None or not self._matches_name(event.name)):
+            return False
+        if self.exceptions is not None and (
+                _exception_type(event) not in self.exceptions):
+            return False
+        if self.since is not None or self.until is not None:
+            if event.time is None:
+                return False
+            if self.since is not None and event.time < self.since:
+                return False
+            if self.until is not None and event.time > self.until:
+                return False
+
+        return True
+
+    def _matches_name(self, name):
+        """Check whether a callable's name matches one of the patterns.
+
+        Parameters:
+            name (str): The name.
+
+        Returns:
+            bool: `True` if it matches.
+        """
+        return any(matches(name, pattern) for pattern in self.names)
+
+    def run(self, trace, index=None):
+        """Find the events in a trace that match.
+
+        Parameters:
+            trace (TextTrace or BinaryTrace): The trace.
+            index (str): The path of the trace's index, or `None` to read the
+                whole trace.
+
+        Yields:
+            logger_helper.binary.TraceEvent: Each event that matches.
+        """
+        if index is None:
+            blocks = [None]
+        else:
+            blocks = (
+                block for block in read_index(index)
+                if self.matches_block(block))
+
+        for block in blocks:
+            for event in trace.read(block):
+                if self.matches(event):
+                    yield event
+
+
+def statistics(events):
+    """Aggregate events by callable.
+
+    Parameters:
+        events: The events to aggregate.
+
+    Returns:
+        dict: A dictionary for each callable, keyed by its name, with the
+        number of `calls`, `returns`, `exceptions` and `yields` and the 50th,
+        90th and 99th percentile of the elapsed times (`p50`, `p90` and
+        `p99`, in seconds, or `None` if none of the events were timed).
+        Events of other kinds (like messages) are left out.
+    """
+    counts = {}
+    histograms = {}
+    for event in events:
+        key = _COUNTS.get(event.kind)
+        if event.name is None or key is None:
+            continue
+
+        entry = counts.get(event.name)
+        if entry is None:
+            entry = counts[event.name] = {
+                'calls': 0, 'returns': 0, 'exceptions': 0, 'yields': 0}
+            histograms[event.name] = LatencyHistogram()
+
+        entry[key] += 1
+        if event.elapsed is not None:
+            histograms[event.name].add(int(event.elapsed * 1e9))
+
+    for name, entry in counts.items():
+        for percent in (50, 90, 99):
+            value = histograms[name].percentile(percent)
+            entry['p{}'.format(percent)] = (
+                None if value is None else value / 1e9)
+
+    return counts
+
+
+def _parse_time(text):
+    """Parse a time given on the command line.
+
+    Parameters:
+        text (str): Seconds since the epoch, or a local time as
+            `YYYY-MM-DD HH:MM:SS` (or with a `T` in the middle).
+
+    Raises:
+        argparse.ArgumentTypeError: When the time can't be parsed.
+
+    Returns:
+        float: The time, in seconds since the epoch.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    for time_format in (
+            '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(text, time_format))
+        except ValueError:
+            continue
+
+    raise argparse.ArgumentTypeError('Unknown time {!r}.'.format(text))
+
+
+def _format_event(event):
+    """Format an event as a line of output.
+
+    Parameters:
+        event (logger_helper.binary.TraceEvent): The event.
+
+    Returns:
+        str: The line.
+    """
+    when = '-'
+    if event.time is not None:
+        when = datetime.datetime.fromtimestamp(event.time).isoformat(' ')
+
+    line = '{} {} {} {} {}'.format(
+        when, '-' if event.thread is None else event.thread, event.kind,
+        event.name or '-', event.payload)
+    if event.elapsed is not None:
+        line += ' ({:.6f}s)'.format(event.elapsed)
+
+    return line
+
+
+def _format_seconds(seconds):
+    """Format a duration for the statistics table.
+
+    Parameters:
+        seconds (float): The duration, or `None`.
+
+    Returns:
+        str: The duration.
+    """
+    return '-' if seconds is None else '{:.6f}'.format(seconds)
+
+
+def main(argv=None):
+    """Run a query from the command line.
+
+    Parameters:
+        argv (list): The command line arguments, by default `sys.argv`.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog='logger-helper-query',
+        description=__doc__.split('\n', maxsplit=1)[0])
+    parser.add_argument(
+        'trace', help='A text log, JSON lines log, binary trace segment or '
+        'binary trace directory.')
+    parser.add_argument(
+        '--name', '-n', action='append',
+        help='Only match callables that match this glob pattern (or module '
+        'or class name). Can be given more than once.')
+    parser.add_argument(
+        '--kind', '-k', action='append', choices=KINDS,
+        help='Only match events of this kind. Can be given more than once.')
+    parser.add_argument(
+        '--exception', '-e', action='append',
+        help='Only match exceptions of this type. Can be given more than '
+        'once.')
+    parser.add_argument(
+        '--since', type=_parse_time,
+        help='Only match events at or after this time.')
+    parser.add_argument(
+        '--until', type=_parse_time,
+        help='Only match events at or before this time.')
+
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        '--count', action='store_true',
+        help='Print the number of events that match.')
+    output.add_argument(
+        '--stats', action='store_true',
+        help='Print the counts and latency percentiles of each callable.')
+
+    parser.add_argument(
+        '--json', action='store_true', help='Print the results as JSON.')
+    parser.add_argument(
+        '--reindex', action='store_true',
+        help='Build the index again, even if it looks up to date.')
+    parser.add_argument(
+        '--no-index', action='store_true',
+        help='Read the whole trace without building an index.')
+
+    for name in ('call', 'return', 'yield', 'exception'):
+        parser.add_argument(
+            '--{}-format'.format(name),
+            help='The {}_log_format a text log was written with.'.format(
+                name))
+
+    arguments = parser.parse_args(argv)
+
+    formats = {
+        '{}_format'.format(name): getattr(arguments, '{}_format'.format(name))
+        for name in ('call', 'return', 'yield', 'exception')
+        if getattr(arguments, '{}_format'.format(name)) is not None}
+
+    trace = open_trace(arguments.trace, formats)
+    query = Query(
+        arguments.name, arguments.kind, arguments.exception, arguments.since,
+        arguments.until)
+
+    index = None
+    if not arguments.no_index:
+        try:
+            index = build_index(trace, arguments.reindex)
+        except OSError as ex:
+            sys.stderr.write('Not using an index: {}\n'.format(ex))
+
+    events = query.run(trace, index)
+
+    if arguments.count:
+        count = sum(1 for _ in events)
+        sys.stdout.write('{}\n'.format(
+            json.dumps({'count': count}) if arguments.json else count))
+    elif arguments.stats:
+        summary = statistics(events)
+        if arguments.json:
+            sys.stdout.write('{}\n'.format(
+                json.dumps(summary, indent=2, sort_keys=True)))
+        else:
+            row_format = (
+                '{:<50} {:>8} {:>8} {:>10} {:>10} {:>10} {:>10}\n')
+            sys.stdout.write(row_format.format(
+                'callable', 'calls', 'returns', 'exceptions', 'p50', 'p90',
+                'p99'))
+            for name, entry in sorted(summary.items()):
+                sys.stdout.write(row_format.format(
+                    name, entry['calls'], entry['returns'],
+                    entry['exceptions'], _format_seconds(entry['p50']),
+                    _format_seconds(entry['p90']),
+                    _format_seconds(entry['p99'])))
+    else:
+        for event in events:
+            if arguments.json:
+                sys.stdout.write('{}\n'.format(json.dumps(event._asdict())))
+            else:
+                sys.stdout.write('{}\n'.format(_format_event(event)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Switch logging of wrapped callables on and off while the program runs."""
+
+import fnmatch
+import threading
+
+
+def matches(name, pattern):
+    """Check whether a name matches a pattern.
+
+    Parameters:
+        name (str): The fully qualified name of a callable or module.
+        pattern (str): A glob pattern (see `fnmatch`), or the name itself or
+            of anything that contains it (a package, module or class).
+
+    Returns:
+        bool: `True` if the name matches.
+    """
+    return (
+        fnmatch.fnmatchcase(name, pattern) or
+        fnmatch.fnmatchcase(name, pattern + '.*'))
+
+
+class Switch:
+    """Whether calls to the callables with a particular name are logged.
+
+    A switch is shared by every wrapper of a callable with the same name, so
+    the wrappers only have to check a single attribute on each call.
+
+    Attributes:
+        name (str): The fully qualified name of the callable.
+        enabled (bool): Whether calls to the callable are logged.
+    """
+
+    __slots__ = ('name', 'enabled')
+
+    def __init__(self, name, enabled=True):
+        """Create a new switch.
+
+        Parameters:
+            name (str): The fully qualified name of the callable.
+            enabled (bool): Whether calls to the callable are logged.
+        """
+        self.name = name
+        self.enabled = enabled
+
+    def __repr__(self):
+        """Get a representation of the switch, for debugging.
+
+        Returns:
+            str: The name of the switch and whether it's enabled.
+        """
+        return '<Switch {} {}>'.format(
+            self.name, 'enabled' if self.enabled else 'disabled')
+
+
+class Registry:
+    """The callables wrapped by a `logger_helper.LoggerHelper`.
+
+    Each callable is registered under its fully qualified name (see
+    `logger_helper.get_callable_name`) when it's wrapped. Logging of the
+    callables can then be switched on and off by name, by glob pattern (using
+    `fnmatch`) or by the name of a module or class, in which case everything
+    within it is affected. A disabled callable calls straight through to the
+    original after a single check.
+
+    Patterns are remembered, so callables wrapped later (for example, when a
+    module is imported) are enabled or disabled to match.
+    """
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._switches = {}
+        self._rules = []
+        self._lock = threading.Lock()
+
+    def register(self, name):
+        """Get the switch for a callable, creating it if needed.
+
+        Parameters:
+            name (str): The fully qualified name of the callable.
+
+        Returns:
+            Switch: The switch for the callable.
+        """
+        with self._lock:
+            try:
+                return self._switches[name]
+            except KeyError:
+                pass
+
+            switch = Switch(name)
+            for pattern, enabled in self._rules:
+                if matches(name, pattern):
+                    switch.enabled = enabled
+
+            self._switches[name] = switch
+
+            return switch
+
+    def enable(self, pattern='*'):
+        """Log the calls to the callables that match a pattern.
+
+        Parameters:
+            pattern (str): The name of a callable, module or class, or a glob
+                pattern to match the names of callables against.
+
+        Returns:
+            list: The names of the callables that were enabled.
+        """
+        return self._set(pattern, True)
+
+    def disable(self, pattern='*'):
+        """Stop logging the calls to the callables that match a pattern.
+
+        Parameters:
+            pattern (str): The name of a callable, module or class, or a glob
+                pattern to match the names of callables against.
+
+        Returns:
+            list: The names of the callables that were disabled.
+        """
+        return self._set(pattern, False)
+
+    def is_enabled(self, name):
+        """Check whether calls to a callable are logged.
+
+        Parameters:
+            name (str): The fully qualified name of the callable.
+
+        Returns:
+            bool: `True` if the callable is enabled, or would be if it were
+            wrapped now.
+        """
+        with self._lock:
+            switch = self._switches.get(name)
+            if switch is not None:
+                return switch.enabled
+
+            enabled = True
+            for pattern, rule_enabled in self._rules:
+                if matches(name, pattern):
+                    enabled = rule_enabled
+
+            return enabled
+
+    def names(self, pattern='*'):
+        """List the names of the wrapped callables.
+
+        Parameters:
+            pattern (str): Only list the names that match this pattern.
+
+        Returns:
+            list: The sorted names of the callables.
+        """
+        with self._lock:
+            names = list(self._switches)
+
+        return sorted(name for name in names if matches(name, pattern))
+
+    def _set(self, pattern, enabled):
+        """Enable or disable the callables that match a pattern.
+
+        Parameters:
+            pattern (str): The pattern to match the callables with.
+            enabled (bool): Whether to enable the callables.
+
+        Returns:
+            list: The sorted names of the callables that matched.
+        """
+        with self._lock:
+            # A rule that matches everything overrides all of the rules
+            # before it, so there's no point keeping them around.
+            if pattern == '*':
+                self._rules = []
+            self._rules.append((pattern, enabled))
+
+            names = []
+            for name, switch in self._switches.items():
+                if matches(name, pattern):
+                    switch.enabled = enabled
+                    names.append(name)
+
+        return sorted(names)
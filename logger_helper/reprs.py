@@ -0,0 +1,152 @@
+"""A bounded, cached replacement for `repr` when logging values."""
+
+import enum
+import functools
+import reprlib
+
+
+class ReprEngine(reprlib.Repr):
+    """Create size limited representations of arguments and return values.
+
+    An instance can be used as the `value_repr` of a
+    `logger_helper.LoggerHelper`. Containers are limited in length and depth
+    and long strings are cut short, in the style of `reprlib`, with `...`
+    marking where something has been left out. Formatters can be registered
+    for specific types, and the representations of small immutable values
+    (integers, short strings, enums, etc.) are cached.
+    """
+
+    # Floats aren't cached because `0.0 == -0.0`, but their representations
+    # differ.
+    CACHEABLE_TYPES = frozenset((int, bool, str, bytes, type(None)))
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, max_length=1000, max_string=200, max_items=20,
+                 max_level=3, cache_size=1024, cache_max_string=100):
+        """Create a new engine.
+
+        Parameters:
+            max_length (int): The most characters in a representation. Use
+                `None` for no limit.
+            max_string (int): The most characters of a string to include.
+            max_items (int): The most items of a container to include.
+            max_level (int): The most levels of nested containers to include.
+            cache_size (int): The number of representations to cache. Use `0`
+                to switch the cache off.
+            cache_max_string (int): The longest string (or bytes) whose
+                representation is cached.
+        """
+        super().__init__()
+
+        self.max_length = max_length
+        self.maxstring = max_string
+        self.maxother = max_string
+        self.maxlong = max_string
+        self.maxlevel = max_level
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdict = \
+            self.maxset = self.maxfrozenset = self.maxdeque = max_items
+
+        self.cache_max_string = cache_max_string
+
+        self._formatters = {}
+        self._type_formatters = {}
+        self._cached_repr = functools.lru_cache(
+            maxsize=cache_size, typed=True)(self._limited_repr)
+
+    def register(self, value_type, formatter):
+        """Register a formatter for a type (and its subclasses).
+
+        Parameters:
+            value_type (type): The type to use the formatter for.
+            formatter: A callable that's given a value and returns its
+                representation, as a string.
+
+        Returns:
+            None
+        """
+        self._formatters[value_type] = formatter
+        self._type_formatters.clear()
+        self._cached_repr.cache_clear()
+
+    def __call__(self, value):
+        """Get the representation of a value.
+
+        Parameters:
+            value: The value to represent.
+
+        Returns:
+            str: The representation of the value.
+        """
+        value_type = type(value)
+        if (value_type in self.CACHEABLE_TYPES and (
+                value_type not in (str, bytes) or
+                len(value) <= self.cache_max_string)) or (
+                    isinstance(value_type, enum.EnumMeta)):
+            return self._cached_repr(value)
+
+        return self._limited_repr(value)
+
+    def cache_info(self):
+        """Get the statistics of the cache.
+
+        Returns:
+            The `functools.lru_cache` statistics (hits, misses, etc.).
+        """
+        return self._cached_repr.cache_info()
+
+    def repr1(self, x, level):
+        """Get the representation of a value, or an item within one.
+
+        Parameters:
+            x: The value to represent.
+            level (int): The number of levels of nesting left to include.
+
+        Returns:
+            str: The representation of the value.
+        """
+        formatter = self._formatter_for(type(x))
+        if formatter is not None:
+            return formatter(x)
+
+        return super().repr1(x, level)
+
+    def _limited_repr(self, value):
+        """Get the representation of a value, limited to `max_length`.
+
+        Parameters:
+            value: The value to represent.
+
+        Returns:
+            str: The representation of the value.
+        """
+        text = self.repr(value)
+
+        if self.max_length is not None and len(text) > self.max_length:
+            text = text[:max(self.max_length - 3, 0)] + '...'
+
+        return text
+
+    def _formatter_for(self, value_type):
+        """Find the registered formatter for a type.
+
+        Parameters:
+            value_type (type): The type to find the formatter for.
+
+        Returns:
+            The formatter for the closest registered type in the method
+            resolution order of the type, or `None` if there isn't one.
+        """
+        try:
+            return self._type_formatters[value_type]
+        except KeyError:
+            pass
+
+        formatter = None
+        for base in value_type.__mro__:
+            if base in self._formatters:
+                formatter = self._formatters[base]
+                break
+
+        self._type_formatters[value_type] = formatter
+
+        return formatter
@@ -0,0 +1,115 @@
+"""Sampling policies that decide which calls are logged."""
+
+import itertools
+import threading
+import time
+
+
+class Sampler:
+    """Decide whether each call to a callable should be logged.
+
+    Samplers are consulted before anything about the call is formatted, so
+    calls that aren't sampled cost very little. This base class samples every
+    call.
+
+    Attributes:
+        log_exceptions (bool): Whether exceptions raised by calls that weren't
+            sampled should be logged anyway.
+    """
+
+    log_exceptions = True
+
+    def sample(self):
+        """Decide whether to log a call.
+
+        Returns:
+            bool: `True` if the call should be logged.
+        """
+        return True
+
+
+class EveryN(Sampler):
+    """Log one in every `n` calls."""
+
+    def __init__(self, n, log_exceptions=True):
+        """Create a new sampler.
+
+        Parameters:
+            n (int): Log one call out of this many, starting with the first.
+            log_exceptions (bool): Whether exceptions raised by calls that
+                weren't sampled should be logged anyway.
+        """
+        self.n = n
+        self.log_exceptions = log_exceptions
+
+        # Taking the next value from a count is atomic, so no lock is needed.
+        self._counter = itertools.count()
+
+    def sample(self):
+        """Decide whether to log a call.
+
+        Returns:
+            bool: `True` for every `n`th call.
+        """
+        return next(self._counter) % self.n == 0
+
+
+class Never(Sampler):
+    """Don't log any calls (but log their exceptions, by default)."""
+
+    def __init__(self, log_exceptions=True):
+        """Create a new sampler.
+
+        Parameters:
+            log_exceptions (bool): Whether exceptions raised by the calls
+                should be logged anyway.
+        """
+        self.log_exceptions = log_exceptions
+
+    def sample(self):
+        """Decide whether to log a call.
+
+        Returns:
+            bool: `False`.
+        """
+        return False
+
+
+class RateLimit(Sampler):
+    """Log at most a certain number of calls per second (a token bucket)."""
+
+    def __init__(self, rate, burst=None, log_exceptions=True):
+        """Create a new sampler.
+
+        Parameters:
+            rate (float): The number of calls per second to log.
+            burst (float): The most calls that can be logged at once after a
+                quiet period. Defaults to `rate`.
+            log_exceptions (bool): Whether exceptions raised by calls that
+                weren't sampled should be logged anyway.
+        """
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self.log_exceptions = log_exceptions
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Decide whether to log a call.
+
+        Returns:
+            bool: `True` if there's a token left for the call.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens < 1:
+                return False
+
+            self._tokens -= 1
+            return True
@@ -0,0 +1,298 @@
+"""Aggregate statistics about how long wrapped calls take."""
+
+import threading
+
+
+class LatencyHistogram:
+    """Count durations in logarithmic buckets.
+
+    Each power of two is split into `2 ** SUB_BUCKET_BITS` buckets, so a
+    percentile read from the histogram is within about 20% of the real value
+    however large the durations get, and the number of buckets stays small.
+    """
+
+    SUB_BUCKET_BITS = 2
+
+    __slots__ = ('buckets',)
+
+    def __init__(self):
+        """Create an empty histogram.
+
+        Attributes:
+            buckets (dict): The number of durations in each bucket, keyed by
+                the index of the bucket.
+        """
+        self.buckets = {}
+
+    @classmethod
+    def bucket(cls, value):
+        """Find the bucket a duration belongs in.
+
+        Parameters:
+            value (int): The duration, in nanoseconds.
+
+        Returns:
+            int: The index of the bucket.
+        """
+        if value <= 0:
+            return 0
+
+        exponent = value.bit_length() - 1
+        if exponent <= cls.SUB_BUCKET_BITS:
+            return value
+
+        shift = exponent - cls.SUB_BUCKET_BITS
+        return (shift << cls.SUB_BUCKET_BITS) + (value >> shift)
+
+    @classmethod
+    def bucket_limit(cls, index):
+        """Get the largest duration that belongs in a bucket.
+
+        Parameters:
+            index (int): The index of the bucket.
+
+        Returns:
+            int: The largest duration, in nanoseconds.
+        """
+        sub_buckets = 1 << cls.SUB_BUCKET_BITS
+        if index < 2 * sub_buckets:
+            return index
+
+        shift = (index >> cls.SUB_BUCKET_BITS) - 1
+        mantissa = index - (shift << cls.SUB_BUCKET_BITS)
+        return ((mantissa + 1) << shift) - 1
+
+    def add(self, value):
+        """Count a duration.
+
+        Parameters:
+            value (int): The duration, in nanoseconds.
+
+        Returns:
+            None
+        """
+        index = self.bucket(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        """Add the counts from another histogram to this one.
+
+        Parameters:
+            other (LatencyHistogram): The histogram to add.
+
+        Returns:
+            None
+        """
+        for index, count in list(other.buckets.items()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def percentile(self, percent):
+        """Estimate a percentile of the durations.
+
+        Parameters:
+            percent (float): The percentile to estimate, from 0 to 100.
+
+        Returns:
+            int: The upper limit of the bucket the percentile falls in, or
+            `None` if the histogram is empty.
+        """
+        total = sum(self.buckets.values())
+        if not total:
+            return None
+
+        target = max(total * percent / 100, 1)
+
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return self.bucket_limit(index)
+
+        return self.bucket_limit(max(self.buckets))
+
+
+class _Accumulator:
+    """The statistics for a single callable, collected by a single thread."""
+
+    __slots__ = ('count', 'failures', 'total', 'min', 'max', 'histogram')
+
+    def __init__(self):
+        """Create an empty accumulator."""
+        self.count = 0
+        self.failures = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.histogram = LatencyHistogram()
+
+    def add(self, elapsed, failed):
+        """Count a call.
+
+        Parameters:
+            elapsed (int): How long the call took, in nanoseconds.
+            failed (bool): Whether the call raised an exception.
+
+        Returns:
+            None
+        """
+        self.count += 1
+        self.total += elapsed
+
+        if failed:
+            self.failures += 1
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if self.max is None or elapsed > self.max:
+            self.max = elapsed
+
+        self.histogram.add(elapsed)
+
+    def merge(self, other):
+        """Add the statistics from another accumulator to this one.
+
+        Parameters:
+            other (_Accumulator): The accumulator to add.
+
+        Returns:
+            None
+        """
+        self.count += other.count
+        self.failures += other.failures
+        self.total += other.total
+
+        if other.count:
+            self.min = other.min if self.min is None else min(
+                self.min, other.min)
+            self.max = other.max if self.max is None else max(
+                self.max, other.max)
+
+        self.histogram.merge(other.histogram)
+
+
+class _ThreadStats:
+    """The accumulators for all of the callables called by a single thread."""
+
+    __slots__ = ('thread', 'accumulators')
+
+    def __init__(self, thread):
+        """Create the statistics for a thread.
+
+        Parameters:
+            thread (threading.Thread): The thread the statistics are for.
+        """
+        self.thread = thread
+        self.accumulators = {}
+
+
+class CallStats:
+    """Collect the number of calls to each callable and how long they took.
+
+    Set an instance as the `stats` attribute of a `logger_helper.LoggerHelper`
+    to collect statistics for the calls it logs. Each thread records into its
+    own accumulators, so recording a call never waits on a lock, the
+    accumulators are only combined when a snapshot is taken.
+    """
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self):
+        """Create an empty set of statistics."""
+        self._local = threading.local()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, failed=False):
+        """Record a call.
+
+        Parameters:
+            name (str): The name of the callable that was called.
+            elapsed (int): How long the call took, in nanoseconds.
+            failed (bool): Whether the call raised an exception.
+
+        Returns:
+            None
+        """
+        try:
+            accumulators = self._local.stats.accumulators
+        except AttributeError:
+            accumulators = self._add_thread().accumulators
+
+        try:
+            accumulator = accumulators[name]
+        except KeyError:
+            accumulator = accumulators[name] = _Accumulator()
+
+        accumulator.add(elapsed, failed)
+
+    def snapshot(self, reset=False):
+        """Combine the statistics from all threads.
+
+        Parameters:
+            reset (bool): Whether to start collecting the statistics again
+                from scratch. A call that's being recorded while the
+                statistics are reset may be lost.
+
+        Returns:
+            dict: A dictionary for each callable, keyed by its name. Each
+            dictionary has the `count` of calls, the number of `failures`,
+            the `total`, `mean`, `min` and `max` durations and the
+            percentiles of the durations (`p50`, `p90`, `p99` and `p99.9`).
+            All durations are in nanoseconds.
+        """
+        with self._lock:
+            threads = list(self._threads)
+
+            if reset:
+                self._threads = [
+                    stats for stats in threads if stats.thread.is_alive()]
+
+        combined = {}
+        for stats in threads:
+            accumulators = stats.accumulators
+            if reset:
+                stats.accumulators = {}
+
+            for name, accumulator in list(accumulators.items()):
+                combined.setdefault(name, _Accumulator()).merge(accumulator)
+
+        return {
+            name: self._summarise(accumulator)
+            for name, accumulator in combined.items()}
+
+    def _summarise(self, accumulator):
+        """Turn an accumulator into a dictionary of statistics.
+
+        Parameters:
+            accumulator (_Accumulator): The accumulator to summarise.
+
+        Returns:
+            dict: The statistics, as described in `snapshot`.
+        """
+        summary = {
+            'count': accumulator.count,
+            'failures': accumulator.failures,
+            'total': accumulator.total,
+            'mean': accumulator.total / accumulator.count,
+            'min': accumulator.min,
+            'max': accumulator.max
+        }
+
+        for percent in self.PERCENTILES:
+            summary['p{:g}'.format(percent)] = (
+                accumulator.histogram.percentile(percent))
+
+        return summary
+
+    def _add_thread(self):
+        """Create the statistics for the current thread.
+
+        Returns:
+            _ThreadStats: The statistics for the current thread.
+        """
+        stats = _ThreadStats(threading.current_thread())
+        self._local.stats = stats
+
+        with self._lock:
+            self._threads.append(stats)
+
+        return stats
@@ -0,0 +1,287 @@
+"""Wrap coroutine, generator and asynchronous generator functions."""
+
+import functools
+
+# The wrappers log calls through the helper that made them.
+# pylint: disable=protected-access
+
+
+def _logged_yields(helper, call, generator):
+    """Pass values through from a generator, logging each one.
+
+    Note:
+        Values sent or thrown into this generator are passed on to the
+        original generator, just like `yield from`.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper to log the values
+            with.
+        call (logger_helper._CallState): The state of the call that created
+            the generator.
+        generator: The generator to pass the values through from.
+
+    Returns:
+        Whatever the original generator returns.
+    """
+    try:
+        value = next(generator)
+        while True:
+            helper._call_yielded(call, value)
+
+            try:
+                sent = yield value
+            except GeneratorExit:
+                generator.close()
+                raise
+            except BaseException as ex:  # pylint: disable=broad-except
+                value = generator.throw(ex)
+            else:
+                value = generator.send(sent)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _in_call(helper, call, generator):
+    """Pass values through from a generator, running it as a call's.
+
+    Note:
+        The call's context and call graph frame are only current while the
+        generator runs, not while it's suspended. Values sent or thrown into
+        this generator are passed on to the original generator, just like
+        `yield from`.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper that's logging the
+            call.
+        call (logger_helper._CallState): The state of the call that created
+            the generator.
+        generator: The generator to pass the values through from.
+
+    Returns:
+        Whatever the original generator returns.
+    """
+    step, argument = generator.send, None
+    while True:
+        helper._call_resumed(call)
+        try:
+            value = step(argument)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            helper._call_suspended(call)
+
+        try:
+            argument = yield value
+        except GeneratorExit:
+            helper._call_resumed(call)
+            try:
+                generator.close()
+            finally:
+                helper._call_suspended(call)
+            raise
+        except BaseException as ex:  # pylint: disable=broad-except
+            step, argument = generator.throw, ex
+        else:
+            step = generator.send
+
+
+def wrap_coroutine_function(helper, plan, switch):
+    """Wrap a coroutine function (`async def`).
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper to log the calls
+            with.
+        plan (logger_helper.plans.CallPlan): The plan of the coroutine
+            function to wrap.
+        switch (logger_helper.registry.Switch): The switch for the
+            coroutine function.
+
+    Returns:
+        A coroutine function that logs the call and the awaited result.
+    """
+    clbl = plan.callable
+
+    @functools.wraps(clbl)
+    async def wrapped_callable(*args, **kwargs):
+        """Log calls, exceptions and awaited return values.
+
+        Parameters:
+            args (list): The positional parameters to pass to the original
+                callable.
+            kwargs (dict): The keyword parameters to pass to the original
+                callable.
+
+        Returns:
+            Whatever the original coroutine returns.
+        """
+        if not (switch.enabled and
+                helper._logger.isEnabledFor(helper._log_level)):
+            return await clbl(*args, **kwargs)
+
+        call = helper._call_started(plan, args, kwargs)
+
+        try:
+            return_value = await clbl(*args, **kwargs)
+        except BaseException as ex:
+            helper._call_raised(call, ex)
+            raise
+
+        helper._call_returned(call, return_value)
+
+        return return_value
+
+    return wrapped_callable
+
+
+def wrap_generator_function(helper, plan, switch):
+    """Wrap a generator function.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper to log the calls
+            with.
+        plan (logger_helper.plans.CallPlan): The plan of the generator
+            function to wrap.
+        switch (logger_helper.registry.Switch): The switch for the
+            generator function.
+
+    Returns:
+        A generator function that logs the call, the value the generator
+        returns and, if `log_yields` is set, each value it yields.
+    """
+    clbl = plan.callable
+
+    @functools.wraps(clbl)
+    def wrapped_callable(*args, **kwargs):
+        """Log calls, yields, exceptions and return values.
+
+        Parameters:
+            args (list): The positional parameters to pass to the original
+                callable.
+            kwargs (dict): The keyword parameters to pass to the original
+                callable.
+
+        Returns:
+            Whatever the original generator returns.
+        """
+        if not (switch.enabled and
+                helper._logger.isEnabledFor(helper._log_level)):
+            return (yield from clbl(*args, **kwargs))
+
+        call = helper._call_started(plan, args, kwargs)
+
+        try:
+            generator = clbl(*args, **kwargs)
+            if call.context is not None or call.frame is not None:
+                # The call is current while the generator runs, not
+                # while it's suspended.
+                helper._call_suspended(call)
+                generator = _in_call(helper, call, generator)
+            if helper.log_yields and call.logged:
+                generator = _logged_yields(helper, call, generator)
+
+            return_value = yield from generator
+        except GeneratorExit:
+            # The generator was closed before it finished (by `break`,
+            # for example), which isn't a failure.
+            helper._call_returned(call, None)
+            raise
+        except BaseException as ex:
+            helper._call_raised(call, ex)
+            raise
+
+        helper._call_returned(call, return_value)
+
+        return return_value
+
+    return wrapped_callable
+
+
+def wrap_async_generator_function(helper, plan, switch):
+    """Wrap an asynchronous generator function.
+
+    Parameters:
+        helper (logger_helper.LoggerHelper): The helper to log the calls
+            with.
+        plan (logger_helper.plans.CallPlan): The plan of the asynchronous
+            generator function to wrap.
+        switch (logger_helper.registry.Switch): The switch for the
+            asynchronous generator function.
+
+    Returns:
+        An asynchronous generator function that logs the call, the end of
+        the generator and, if `log_yields` is set, each value it yields.
+    """
+    clbl = plan.callable
+
+    @functools.wraps(clbl)
+    async def wrapped_callable(*args, **kwargs):
+        """Log calls, yields and exceptions.
+
+        Parameters:
+            args (list): The positional parameters to pass to the original
+                callable.
+            kwargs (dict): The keyword parameters to pass to the original
+                callable.
+        """
+        call = None
+        if switch.enabled and helper._logger.isEnabledFor(helper._log_level):
+            call = helper._call_started(plan, args, kwargs)
+        log_yields = call is not None and call.logged and helper.log_yields
+
+        generator = clbl(*args, **kwargs)
+
+        # The call is current while the generator runs, not while it's
+        # suspended.
+        suspends = call is not None and (
+            call.context is not None or call.frame is not None)
+        if suspends:
+            helper._call_suspended(call)
+
+        # There's no `yield from` for asynchronous generators, so
+        # `asend`, `athrow` and `aclose` are passed on by hand.
+        try:
+            step, argument = generator.asend, None
+            while True:
+                if suspends:
+                    helper._call_resumed(call)
+                try:
+                    value = await step(argument)
+                finally:
+                    if suspends:
+                        helper._call_suspended(call)
+
+                if log_yields:
+                    helper._call_yielded(call, value)
+
+                try:
+                    argument = yield value
+                except GeneratorExit:
+                    if suspends:
+                        helper._call_resumed(call)
+                    try:
+                        await generator.aclose()
+                    finally:
+                        if suspends:
+                            helper._call_suspended(call)
+                    raise
+                except BaseException as ex:  # pylint: disable=broad-except
+                    step, argument = generator.athrow, ex
+                else:
+                    step = generator.asend
+        except StopAsyncIteration:
+            pass
+        except GeneratorExit:
+            # The generator was closed before it finished, which isn't a
+            # failure.
+            if call is not None:
+                helper._call_returned(call, None)
+            raise
+        except BaseException as ex:
+            if call is not None:
+                helper._call_raised(call, ex)
+            raise
+
+        if call is not None:
+            helper._call_returned(call, None)
+
+    return wrapped_callable
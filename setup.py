@@ -13,13 +13,20 @@ setup(
     description='A simple way to gather verbose logs from your application!',
     long_description=open('README.rst').read(),
     url='https://github.com/vimist/logger-helper',
+    python_requires='>=3.7',
     classifiers=[
         'Intended Audience :: Developers',
         'Natural Language :: English',
         'Operating System :: OS Independent',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Software Development :: Bug Tracking',
         'Topic :: System :: Logging',
         'Topic :: System :: Monitoring'
     ],
-    packages=['logger_helper']
+    packages=['logger_helper'],
+    entry_points={
+        'console_scripts': [
+            'logger-helper-query = logger_helper.query:main'
+        ]
+    }
 )
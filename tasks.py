@@ -5,6 +5,7 @@ from invoke import task
 
 
 TESTS_FILE = 'tests.py'
+BENCHMARKS_FILE = 'benchmarks.py'
 MODULE_NAME = 'logger_helper'
 DOCS_DIR = 'docs'
 CI_IMAGE = 'logger-helper-ci'
@@ -78,6 +79,15 @@ def unit_test(cxt):
     command = 'coverage run -m unittest {tests_file}'
     ci(cxt, command.format(tests_file=TESTS_FILE))
 
+@task(build_ci)
+def benchmark(cxt, output='benchmarks.json', quick=False):
+    """Run the benchmarks and write the results as JSON."""
+    command = 'python3 {benchmarks_file} --output {output}{quick}'
+    ci(cxt, command.format(
+        benchmarks_file=BENCHMARKS_FILE,
+        output=output,
+        quick=' --quick' if quick else ''))
+
 @task
 def test_install(cxt):
     """Test that the package installs with PIP."""
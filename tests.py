@@ -1,11 +1,47 @@
+import asyncio
+import cProfile
+import gc
 import inspect
+import io
+import json
 import logging
+import os
+import sys
+import tempfile
+import threading
+import time
 import types
 import unittest
 from unittest.mock import patch
 
+from logger_helper import CallPlan
 from logger_helper import LoggerHelper
+from logger_helper import context
 from logger_helper import get_callable_name
+from logger_helper import query
+from logger_helper.binary import BinaryTraceEmitter
+from logger_helper.binary import TraceEvent
+from logger_helper.binary import read_trace
+from logger_helper.binary import segment_paths
+from logger_helper.emitters import AsyncEmitter
+from logger_helper.emitters import BatchEmitter
+from logger_helper.emitters import ChromeTraceEmitter
+from logger_helper.emitters import Emitter
+from logger_helper.emitters import FlightRecorder
+from logger_helper.governor import Governor
+from logger_helper.graph import CallGraph
+from logger_helper.hooks import ImportHook
+from logger_helper.jsonlines import JsonLinesEmitter
+from logger_helper.messages import CallMessage
+from logger_helper.messages import Message
+from logger_helper.monitoring import MonitoringEngine
+from logger_helper.registry import Registry
+from logger_helper.reprs import ReprEngine
+from logger_helper.sampling import EveryN
+from logger_helper.sampling import Never
+from logger_helper.sampling import RateLimit
+from logger_helper.timing import CallStats
+from logger_helper.timing import LatencyHistogram
 
 
 # pylint: disable=invalid-name,unused-argument
@@ -18,6 +54,30 @@ def exception_function():
     raise Exception('This is an exception')
 
 
+def run_coroutine(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class LoggerMixin:
+    def _set_up_logger(self, name, emit=None, handler=None):
+        # Log to a logger of the test's own, which only the test handles.
+        self._records = []
+        if handler is None:
+            handler = logging.Handler()
+            handler.emit = self._records.append if emit is None else emit
+
+        self._logger = logging.getLogger('{}.{}'.format(__name__, name))
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.propagate = False
+        self._logger.handlers = [handler]
+
+        self._logger_helper = LoggerHelper(self._logger, logging.DEBUG)
+
+
 # pylint: disable=unused-variable
 class BasicClass:
     def __init__(self):
@@ -89,6 +149,345 @@ class TestLoggerHelper(unittest.TestCase):
         self.assertEqual(
             '(a, b, c, d=1, e=2)', str(inspect.signature(wrapped)))
 
+    def test__wrap_callable_skips_logging_when_level_disabled(self):
+        self._logger.setLevel(logging.INFO)
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+
+        with patch('logger_helper.LoggerHelper._log_call') as mock:
+            self.assertEqual('Test', wrapped(1, 2, 3))
+
+        mock.assert_not_called()
+        self.assertEqual([], self._logs)
+
+    def test__wrap_callable_logs_again_when_level_enabled(self):
+        self._logger.setLevel(logging.INFO)
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+        wrapped(1, 2, 3)
+
+        self._logger.setLevel(logging.DEBUG)
+        wrapped(1, 2, 3)
+
+        self.assertEqual(['tests.basic_function', '\'Test\''], self._logs)
+
+    def test__wrap_callable_only_inspects_signature_once(self):
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+
+        with patch('inspect.signature') as mock:
+            wrapped(1, 2, 3)
+            wrapped(4, 5, 6)
+
+        mock.assert_not_called()
+
+    def test__wrap_callable_compiled_logs_call_and_return(self):
+        self._logger_helper.compile_wrappers = True
+        self._logger_helper.call_log_format = '{callable}:{args}'
+
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+        wrapped(1, 2, 3, e=5)
+
+        self.assertEqual(
+            ['tests.basic_function:a=1,b=2,c=3,d=1,e=5', '\'Test\''],
+            self._logs)
+
+    def test__wrap_callable_compiled_keeps_signature_and_docstring(self):
+        self._logger_helper.compile_wrappers = True
+
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+
+        self.assertEqual(
+            '(a, b, c, d=1, e=2)', str(inspect.signature(wrapped)))
+        self.assertEqual('Test Docstring 1.', wrapped.__doc__)
+        self.assertIs(basic_function, wrapped.__wrapped__)
+
+    def test__wrap_callable_compiled_passes_variable_arguments(self):
+        self._logger_helper.compile_wrappers = True
+
+        def variable_function(a, *args, b=1, **kwargs):
+            """Test function."""
+            return a, args, b, kwargs
+
+        wrapped = self._logger_helper._wrap_callable(variable_function)
+
+        self.assertEqual(
+            (1, (2, 3), 4, {'c': 5}), wrapped(1, 2, 3, b=4, c=5))
+
+        self._logger.setLevel(logging.INFO)
+        self.assertEqual((1, (), 1, {}), wrapped(1))
+
+    def test__wrap_callable_lazy_messages_format_when_needed(self):
+        self._logger_helper.lazy_messages = True
+        self._logger_helper.call_log_format = '{callable}:{args}'
+
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+        wrapped(1, 2, 3)
+
+        self.assertIsInstance(self._logs[0], CallMessage)
+        self.assertEqual(
+            ['tests.basic_function:a=1,b=2,c=3,d=1,e=2', '\'Test\''],
+            [str(log) for log in self._logs])
+
+    def test_message_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Message(self._logger_helper, CallPlan(basic_function))
+
+    def test__wrap_callable_lazy_messages_skip_filtered_records(self):
+        self._logger_helper.lazy_messages = True
+        self._logger.addFilter(lambda record: False)
+        self.addCleanup(self._logger.filters.clear)
+
+        class Argument:
+            def __repr__(self):
+                raise AssertionError('The argument was formatted')
+
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+        wrapped(Argument(), 2, 3)
+
+        self.assertEqual([], self._logs)
+
+    def test_exceptions_only_logs_arguments_of_failed_calls(self):
+        self._logger_helper.exceptions_only = True
+        self._logger_helper.exception_log_format = '{callable}({args}) {name}'
+
+        def failing_function(a, b=2):
+            if a:
+                raise ValueError(a)
+            return a
+
+        for compile_wrappers in (False, True):
+            self._logger_helper.compile_wrappers = compile_wrappers
+            wrapped = self._logger_helper.func(failing_function)
+
+            self.assertEqual(0, wrapped(0))
+            with self.assertRaises(ValueError):
+                wrapped(1, b=3)
+
+        self.assertEqual(
+            ['{}(a=1,b=3) ValueError'.format(
+                get_callable_name(failing_function))] * 2,
+            self._logs)
+
+    def test_exceptions_only_with_stats_and_coroutines(self):
+        self._logger_helper.exceptions_only = True
+        self._logger_helper.stats = CallStats()
+        self._logger_helper.exception_log_format = '{args}'
+
+        async def coroutine_function(a):
+            raise ValueError(a)
+
+        wrapped = self._logger_helper.func(coroutine_function)
+        self._logger_helper.func(basic_function)(1, 2, 3)
+        with self.assertRaises(ValueError):
+            run_coroutine(wrapped(1))
+
+        self.assertEqual(['a=1'], self._logs)
+        self.assertEqual(
+            1, self._logger_helper.stats.snapshot()[
+                'tests.basic_function']['count'])
+
+    def test_exception_args_are_empty_without_exceptions_only(self):
+        self._logger_helper.exception_log_format = '{name}({args})'
+
+        with self.assertRaises(Exception):
+            self._logger_helper.func(exception_function)()
+
+        self.assertEqual('Exception()', self._logs[-1])
+
+    def test_func_options_select_and_redact_arguments(self):
+        self._logger_helper.call_log_format = '{args}'
+
+        def login(user, password, payload, **kwargs):
+            return True
+
+        for compile_wrappers in (False, True):
+            self._logger_helper.compile_wrappers = compile_wrappers
+            wrapped = self._logger_helper.func(
+                exclude=['payload', 'secret'], redact=['password', 'token'],
+                formatters={'user': str.upper, 'password': str.upper})(login)
+
+            wrapped('me', 'hunter2', object(), token='t', secret='s', a=1)
+
+        self.assertEqual(
+            ['user=ME,password=<redacted>,'
+             'kwargs={\'token\': <redacted>, \'a\': 1}'] * 2,
+            self._logs[::2])
+
+    def test_include_skips_repr_of_other_arguments(self):
+        self._logger_helper.call_log_format = '{args}'
+
+        class Payload:
+            def __repr__(self):
+                raise AssertionError('Payload was formatted')
+
+        wrapped = self._logger_helper.func(basic_function, include=['a', 'e'])
+        wrapped(1, Payload(), Payload())
+
+        self.assertEqual('a=1,e=2', self._logs[0])
+
+    def test_cls_options_apply_to_every_method(self):
+        self._logger_helper.call_log_format = '{args}'
+
+        class Account:
+            def login(self, password):
+                pass
+
+        @self._logger_helper.cls(redact=['password'])
+        class Wrapped(Account):
+            pass
+
+        Wrapped().login('hunter2')
+
+        self.assertEqual('password=<redacted>', self._logs[0])
+
+    def test_cls_wraps_descriptors(self):
+        class Descriptors:
+            @staticmethod
+            def static(a):
+                return a
+
+            @classmethod
+            def class_method(cls, a):
+                return cls, a
+
+            @property
+            def value(self):
+                return 1
+
+        wrapped = self._logger_helper.cls(Descriptors)
+        self._logger_helper.call_log_format = '{args}'
+
+        self.assertEqual(
+            'test_cls_wraps_descriptors.<locals>.Descriptors',
+            wrapped.__qualname__.split('.', 1)[1])
+        self.assertEqual(2, wrapped.static(2))
+        self.assertEqual((wrapped, 3), wrapped.class_method(3))
+        self.assertEqual(1, wrapped().value)
+        self.assertEqual(
+            ['a=2', '2', 'a=3', repr((wrapped, 3)), '', '1'], self._logs)
+
+    def test_cls_shares_inherited_wrappers(self):
+        class Base:
+            def method(self):
+                return 'Base'
+
+        class Child(Base):
+            pass
+
+        class GrandChild(Child):
+            def other(self):
+                pass
+
+        wrapped_child = self._logger_helper.cls(Child)
+        wrapped_grand_child = self._logger_helper.cls(GrandChild)
+
+        self.assertIs(
+            wrapped_child.__dict__['method'],
+            wrapped_grand_child.__dict__['method'])
+        self.assertIs(Base.method, wrapped_child.method.__wrapped__)
+        self.assertNotIn('__dict__', wrapped_grand_child.__dict__)
+        self.assertEqual('Base', wrapped_grand_child().method())
+
+    def test_cls_releases_wrappers_of_discarded_classes(self):
+        def make_class():
+            class Discarded:
+                def method(self):
+                    pass
+
+            return Discarded
+
+        for _ in range(10):
+            self._logger_helper.cls(make_class())
+        gc.collect()
+
+        self.assertEqual(0, len(self._logger_helper._method_wrappers))
+
+    def test__wrap_callable_logs_awaited_coroutine_result(self):
+        async def coroutine_function(a):
+            await asyncio.sleep(0)
+            return a * 2
+
+        wrapped = self._logger_helper._wrap_callable(coroutine_function)
+
+        self.assertTrue(inspect.iscoroutinefunction(wrapped))
+        self.assertEqual(4, run_coroutine(wrapped(2)))
+        self.assertEqual('4', self._logs[-1])
+
+    def test__wrap_callable_logs_coroutine_exception(self):
+        async def coroutine_function():
+            raise ValueError('Test')
+
+        wrapped = self._logger_helper._wrap_callable(coroutine_function)
+
+        with self.assertRaises(ValueError):
+            run_coroutine(wrapped())
+
+        self.assertEqual('ValueError', self._logs[-1])
+
+    def test__wrap_callable_logs_generator_yields_and_return(self):
+        self._logger_helper.log_yields = True
+        self._logger_helper.yield_log_format = 'yield {value}'
+
+        def generator_function():
+            received = yield 1
+            yield received
+            return 'Done'
+
+        wrapped = self._logger_helper._wrap_callable(generator_function)
+        generator = wrapped()
+
+        self.assertEqual(1, next(generator))
+        self.assertEqual('Sent', generator.send('Sent'))
+        self.assertEqual([], list(generator))
+        self.assertEqual(
+            ['yield 1', 'yield \'Sent\'', '\'Done\''], self._logs[1:])
+
+    def test__wrap_callable_logs_async_generator_yields(self):
+        self._logger_helper.log_yields = True
+        self._logger_helper.yield_log_format = 'yield {value}'
+
+        async def generator_function():
+            yield 1
+            yield 2
+
+        async def consume(generator):
+            return [value async for value in generator]
+
+        wrapped = self._logger_helper._wrap_callable(generator_function)
+
+        self.assertTrue(inspect.isasyncgenfunction(wrapped))
+        self.assertEqual([1, 2], run_coroutine(consume(wrapped())))
+        self.assertEqual(['yield 1', 'yield 2', 'None'], self._logs[1:])
+
+    def test__wrap_callable_closes_generators_without_failing(self):
+        self._logger_helper.stats = CallStats()
+
+        def generator_function():
+            yield 1
+            yield 2
+
+        async def async_generator_function():
+            yield 1
+            yield 2
+
+        async def consume(generator):
+            async for value in generator:
+                break
+            await generator.aclose()
+
+        wrapped = self._logger_helper._wrap_callable(generator_function)
+        for _ in wrapped():
+            break
+        generator = wrapped()
+        next(generator)
+        generator.close()
+        run_coroutine(consume(
+            self._logger_helper._wrap_callable(async_generator_function)()))
+
+        self.assertEqual(['None'] * 3, self._logs[1::2])
+        self.assertEqual(
+            [0, 0],
+            [summary['failures'] for summary in
+             self._logger_helper.stats.snapshot().values()])
+
     def test_get_callable_name(self):
         callable_name = get_callable_name(basic_function)
         self.assertEqual('tests.basic_function', callable_name)
@@ -114,6 +513,29 @@ class TestLoggerHelper(unittest.TestCase):
 
         self.assertEqual('param_one=456', self._logs[0])
 
+    def test__log_call_only_ignores_the_first_parameter_of_methods(self):
+        self._logger_helper.call_log_format = '{args}'
+
+        def register(self, cls, name):
+            """Test function."""
+
+        self._logger_helper._log_call(
+            register, [123, 'cls', 'name'], {}, class_method=True)
+
+        self.assertEqual('cls=\'cls\',name=\'name\'', self._logs[0])
+
+    def test__log_call_logs_variable_arguments(self):
+        self._logger_helper.call_log_format = '{args}'
+
+        def variable_function(a, *args, b=1, **kwargs):
+            """Test function."""
+
+        self._logger_helper._log_call(
+            variable_function, (1, 2, 3), {'c': 4})
+
+        self.assertEqual(
+            'a=1,args=(2, 3),b=1,kwargs={\'c\': 4}', self._logs[0])
+
     def test__log_return(self):
         self._logger_helper._log_return(basic_function, 'Test')
 
@@ -171,3 +593,1408 @@ class TestLoggerHelper(unittest.TestCase):
             self._logger_helper.mod(self._basic_module, ['BasicClass'])
 
         mock.assert_called_once_with(BasicClass)
+
+
+class TestCallPlan(unittest.TestCase):
+    def test_name(self):
+        self.assertEqual(
+            'tests.basic_function', CallPlan(basic_function).name)
+
+    def test_arguments_uses_positions_keywords_and_defaults(self):
+        plan = CallPlan(basic_function)
+
+        self.assertEqual(
+            [('a', 1), ('b', 2), ('c', 3), ('d', 1), ('e', 5)],
+            plan.arguments((1, 2), {'c': 3, 'e': 5}))
+
+    def test_arguments_skips_self_for_class_methods(self):
+        plan = CallPlan(BasicClass.method_1, class_method=True)
+
+        self.assertEqual([], plan.arguments((BasicClass(),), {}))
+
+    def test_arguments_without_signature(self):
+        plan = CallPlan(max)
+
+        self.assertEqual(
+            [('args', (1, 2)), ('kwargs', {'key': None})],
+            plan.arguments((1, 2), {'key': None}))
+
+
+class TestAsyncEmitter(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._handling = threading.Event()
+        self._release = threading.Event()
+        self._release.set()
+
+        test = self
+
+        class CustomHandler(logging.Handler):
+            def emit(self, record):
+                test._handling.set()
+                test._release.wait()
+                test._records.append(record)
+
+        self._set_up_logger('async', handler=CustomHandler())
+        self._logger_helper.call_log_format = '{callable}'
+        self._logger_helper.return_log_format = '{value}'
+
+    def _emit_while_blocked(self, emitter, values):
+        self._release.clear()
+        self._logger_helper.emitter = emitter
+
+        self._logger_helper._log_return(basic_function, 'First')
+        self._handling.wait()
+
+        for value in values:
+            self._logger_helper._log_return(basic_function, value)
+
+        self._release.set()
+        emitter.flush()
+        emitter.close()
+
+        return [record.getMessage() for record in self._records]
+
+    def test_emit_logs_on_worker_thread_with_caller_details(self):
+        emitter = AsyncEmitter()
+        self._logger_helper.emitter = emitter
+
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+        wrapped(1, 2, 3)
+        self.assertTrue(emitter.flush(5))
+        emitter.close()
+
+        self.assertEqual(
+            ['tests.basic_function', '\'Test\''],
+            [record.getMessage() for record in self._records])
+        self.assertEqual(
+            threading.current_thread().name, self._records[0].threadName)
+
+    def test_emit_drops_oldest_when_full(self):
+        emitter = AsyncEmitter(max_size=2)
+
+        messages = self._emit_while_blocked(emitter, [1, 2, 3])
+
+        self.assertEqual(['\'First\'', '2', '3'], messages)
+        self.assertEqual(1, emitter.dropped)
+
+    def test_emit_drops_newest_when_full(self):
+        emitter = AsyncEmitter(max_size=2, overflow=AsyncEmitter.DROP_NEWEST)
+
+        messages = self._emit_while_blocked(emitter, [1, 2, 3])
+
+        self.assertEqual(['\'First\'', '1', '2'], messages)
+        self.assertEqual(1, emitter.dropped)
+
+    def test_emit_blocks_when_full(self):
+        emitter = AsyncEmitter(max_size=2, overflow=AsyncEmitter.BLOCK)
+        self._release.clear()
+        self._logger_helper.emitter = emitter
+
+        self._logger_helper._log_return(basic_function, 'First')
+        self._handling.wait()
+
+        def log_returns():
+            for value in [1, 2, 3]:
+                self._logger_helper._log_return(basic_function, value)
+
+        thread = threading.Thread(target=log_returns, daemon=True)
+        thread.start()
+        thread.join(0.5)
+        self.assertTrue(thread.is_alive())
+
+        self._release.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(emitter.flush(5))
+        emitter.close()
+
+        self.assertEqual(
+            ['\'First\'', '1', '2', '3'],
+            [record.getMessage() for record in self._records])
+        self.assertEqual(0, emitter.dropped)
+
+    def test_emit_after_close_drops(self):
+        emitter = AsyncEmitter()
+        self._logger_helper.emitter = emitter
+        emitter.close()
+
+        self._logger_helper._log_return(basic_function, 'Late')
+
+        self.assertEqual([], self._records)
+        self.assertEqual(1, emitter.dropped)
+
+    def test_emitter_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Emitter()
+
+    def test_unknown_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            AsyncEmitter(overflow='Unknown')
+
+
+class TestBatchEmitter(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._acquired = []
+
+        test = self
+
+        class CustomHandler(logging.Handler):
+            def acquire(self):
+                test._acquired.append(threading.current_thread())
+                super().acquire()
+
+            def emit(self, record):
+                test._records.append(record)
+
+        self._set_up_logger('batch', handler=CustomHandler())
+        self._logger_helper.call_log_format = '{args}'
+        self._logger_helper.argument_format = '{value}'
+        self._logger_helper.return_log_format = 'return'
+
+    def test_messages_are_logged_in_batches(self):
+        emitter = BatchEmitter(batch_size=3, interval=None)
+        self._logger_helper.emitter = emitter
+        self.addCleanup(emitter.close)
+
+        wrapped = self._logger_helper.func(basic_function)
+        wrapped(1, 2, 3)
+        self.assertEqual([], self._records)
+
+        wrapped(4, 5, 6)
+        self.assertEqual(3, len(self._records))
+        self.assertEqual(1, len(self._acquired))
+
+        self.assertTrue(emitter.flush())
+        self.assertEqual(
+            ['1, 2, 3, 1, 2', 'return', '4, 5, 6, 1, 2', 'return'],
+            [record.getMessage() for record in self._records])
+        self.assertEqual(
+            [0, 1, 2, 3], [record.seq for record in self._records])
+
+    def test_handlers_can_call_wrapped_callables(self):
+        emitter = BatchEmitter(batch_size=1, interval=None)
+        self._logger_helper.emitter = emitter
+        self.addCleanup(emitter.close)
+
+        wrapped = self._logger_helper.func(basic_function)
+        handler = self._logger.handlers[0]
+        emit = handler.emit
+
+        def emit_and_call(record):
+            emit(record)
+            if len(self._records) == 1:
+                wrapped(4, 5, 6)
+        handler.emit = emit_and_call
+
+        thread = threading.Thread(
+            target=wrapped, args=(1, 2, 3), daemon=True)
+        thread.start()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(
+            ['1, 2, 3, 1, 2', '4, 5, 6, 1, 2', 'return', 'return'],
+            [record.getMessage() for record in self._records])
+
+    def test_batches_are_flushed_on_an_interval(self):
+        emitter = BatchEmitter(batch_size=100, interval=0.01)
+        self._logger_helper.emitter = emitter
+
+        thread = threading.Thread(
+            target=self._logger_helper.func(basic_function), args=(1, 2, 3))
+        thread.start()
+        thread.join()
+
+        for _ in range(100):
+            if len(self._records) == 2:
+                break
+            threading.Event().wait(0.01)
+        emitter.close()
+
+        self.assertEqual(2, len(self._records))
+        self.assertEqual(thread.ident, self._records[0].thread)
+
+
+class TestChromeTraceEmitter(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('trace')
+
+        self._file = io.StringIO()
+        self._logger_helper.emitter = ChromeTraceEmitter(self._file)
+
+    def test_nested_calls_are_written_as_begin_and_end_events(self):
+        helper = self._logger_helper
+        inner = helper.func(basic_function)
+
+        @helper.func
+        def outer(a):
+            inner(a, 2, 3)
+            raise ValueError('Outer')
+
+        with self.assertRaises(ValueError):
+            outer(1)
+        helper.emitter.close()
+
+        events = json.loads(self._file.getvalue())
+
+        self.assertEqual(
+            ['M', 'B', 'B', 'E', 'E'], [event['ph'] for event in events])
+        self.assertEqual('MainThread', events[0]['args']['name'])
+        self.assertEqual(
+            {'a': '1', 'b': '2', 'c': '3', 'd': '1', 'e': '2'},
+            events[2]['args'])
+        self.assertEqual('tests.basic_function', events[3]['name'])
+        self.assertEqual({'return': "'Test'"}, events[3]['args'])
+        self.assertEqual('ValueError', events[4]['args']['exception'])
+        self.assertEqual(
+            sorted(event['ts'] for event in events[1:]),
+            [event['ts'] for event in events[1:]])
+
+    def test_empty_trace_is_valid(self):
+        self._logger_helper.emitter.close()
+
+        self.assertEqual([], json.loads(self._file.getvalue()))
+
+
+class TestFlightRecorder(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('recorder')
+        self._logger_helper.call_log_format = '{args}'
+        self._logger_helper.argument_format = '{value}'
+        self._logger_helper.return_log_format = 'return'
+        self._logger_helper.exception_log_format = '{name}'
+        self._logger_helper.emitter = FlightRecorder(size=3)
+
+    def _messages(self):
+        return [record.getMessage() for record in self._records]
+
+    def test_messages_are_only_logged_on_exception(self):
+        wrapped = self._logger_helper.func(basic_function)
+        for value in range(3):
+            wrapped(value, 2, 3)
+
+        self.assertEqual([], self._records)
+
+        with self.assertRaises(Exception):
+            self._logger_helper.func(exception_function)()
+
+        self.assertEqual(
+            ['2, 2, 3, 1, 2', 'return', '', 'Exception'], self._messages())
+        self.assertLessEqual(
+            self._records[0].created, self._records[-1].created)
+
+    def test_dump_logs_and_empties_the_buffer(self):
+        wrapped = self._logger_helper.func(basic_function)
+        wrapped(1, 2, 3)
+
+        recorder = self._logger_helper.emitter
+        self.assertEqual(2, recorder.dump())
+        self.assertEqual(0, recorder.dump(all_threads=True))
+        self.assertEqual(['1, 2, 3, 1, 2', 'return'], self._messages())
+
+    def test_dump_all_threads(self):
+        wrapped = self._logger_helper.func(basic_function)
+        thread = threading.Thread(
+            target=wrapped, args=(1, 2, 3), daemon=True)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(0, self._logger_helper.emitter.dump())
+        self.assertEqual(
+            2, self._logger_helper.emitter.dump(all_threads=True))
+        self.assertEqual(thread.ident, self._records[0].thread)
+
+
+class TestSampling(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._logs = []
+        self._set_up_logger(
+            'sampling', lambda record: self._logs.append(record.msg))
+        self._logger_helper.call_log_format = '{args}'
+        self._logger_helper.argument_format = '{value}'
+        self._logger_helper.return_log_format = 'return'
+        self._logger_helper.exception_log_format = '{name}'
+
+    def test_every_n_samples_one_in_n(self):
+        sampler = EveryN(3)
+
+        self.assertEqual(
+            [True, False, False, True, False],
+            [sampler.sample() for _ in range(5)])
+
+    def test_rate_limit_allows_burst_then_limits(self):
+        sampler = RateLimit(1, burst=2)
+
+        self.assertEqual(
+            [True, True, False], [sampler.sample() for _ in range(3)])
+
+    def test_sampler_skips_formatting_unsampled_calls(self):
+        self._logger_helper.sampler = EveryN(2)
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+
+        with patch('logger_helper.CallPlan.arguments') as mock:
+            mock.return_value = []
+            for i in range(4):
+                wrapped(i, 2, 3)
+
+        self.assertEqual(2, mock.call_count)
+        self.assertEqual(['', 'return', '', 'return'], self._logs)
+
+    def test_samplers_are_per_callable(self):
+        self._logger_helper.sampler = EveryN(1)
+        self._logger_helper.samplers['tests.basic_function'] = EveryN(2)
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+
+        wrapped(1, 2, 3)
+        wrapped(2, 2, 3)
+
+        self.assertEqual(['1, 2, 3, 1, 2', 'return'], self._logs)
+
+    def test_unsampled_exceptions_are_logged(self):
+        self._logger_helper.sampler = EveryN(2)
+        wrapped = self._logger_helper._wrap_callable(exception_function)
+
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                wrapped()
+
+        self.assertEqual(['', 'Exception', 'Exception'], self._logs)
+
+    def test_unsampled_exceptions_can_be_suppressed(self):
+        self._logger_helper.sampler = EveryN(2, log_exceptions=False)
+        wrapped = self._logger_helper._wrap_callable(exception_function)
+
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                wrapped()
+
+        self.assertEqual(['', 'Exception'], self._logs)
+
+    def test_report_suppressed(self):
+        self._logger_helper.sampler = EveryN(3)
+        wrapped = self._logger_helper._wrap_callable(basic_function)
+
+        for i in range(3):
+            wrapped(i, 2, 3)
+        self._logger_helper.report_suppressed()
+
+        self.assertEqual(
+            'Suppressed 2 calls to tests.basic_function', self._logs[-1])
+
+
+class TestReprEngine(LoggerMixin, unittest.TestCase):
+    def test_limits_containers_and_strings(self):
+        engine = ReprEngine(max_string=10, max_items=3)
+
+        self.assertEqual('[0, 1, 2, ...]', engine(list(range(100))))
+        self.assertEqual('\'aa...aaa\'', engine('a' * 100))
+
+    def test_limits_total_length(self):
+        engine = ReprEngine(max_length=10)
+
+        self.assertEqual('[0, 1, ...', engine(list(range(5))))
+
+    def test_registered_formatters_apply_to_subclasses_and_items(self):
+        engine = ReprEngine()
+        engine.register(BasicClass, lambda value: '<basic>')
+
+        class SubClass(BasicClass):
+            pass
+
+        self.assertEqual(
+            '[<basic>, <basic>]', engine([BasicClass(), SubClass()]))
+
+    def test_caches_small_immutable_values(self):
+        engine = ReprEngine()
+
+        engine('Test')
+        engine('Test')
+        engine(['Not', 'Cached'])
+
+        self.assertEqual(1, engine.cache_info().hits)
+        self.assertEqual(1, engine.cache_info().misses)
+
+    def test_used_by_logger_helper(self):
+        logs = []
+        self._set_up_logger('reprs', lambda record: logs.append(record.msg))
+        logger_helper = self._logger_helper
+        logger_helper.value_repr = ReprEngine(max_items=2)
+        logger_helper.return_log_format = '{value}'
+
+        logger_helper._log_return(basic_function, [1, 2, 3])
+
+        self.assertEqual(['[1, 2, ...]'], logs)
+
+
+class TestTiming(LoggerMixin, unittest.TestCase):
+    def test_histogram_buckets_are_within_limits(self):
+        for value in (0, 1, 7, 8, 9, 100, 12345, 10 ** 9):
+            index = LatencyHistogram.bucket(value)
+
+            self.assertLessEqual(value, LatencyHistogram.bucket_limit(index))
+            self.assertGreater(value, LatencyHistogram.bucket_limit(index - 1))
+
+    def test_histogram_percentile(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 101):
+            histogram.add(value * 1000)
+
+        self.assertAlmostEqual(50000, histogram.percentile(50), delta=10000)
+        self.assertAlmostEqual(99000, histogram.percentile(99), delta=20000)
+
+    def test_call_stats_combines_threads(self):
+        stats = CallStats()
+
+        stats.record('callable', 10)
+        thread = threading.Thread(
+            target=stats.record, args=('callable', 30, True))
+        thread.start()
+        thread.join()
+
+        snapshot = stats.snapshot()['callable']
+
+        self.assertEqual(2, snapshot['count'])
+        self.assertEqual(1, snapshot['failures'])
+        self.assertEqual(40, snapshot['total'])
+        self.assertEqual(10, snapshot['min'])
+        self.assertEqual(30, snapshot['max'])
+
+    def test_call_stats_snapshot_resets(self):
+        stats = CallStats()
+        stats.record('callable', 10)
+
+        self.assertIn('callable', stats.snapshot(reset=True))
+        self.assertEqual({}, stats.snapshot())
+
+    def test_logger_helper_records_elapsed_time(self):
+        logs = []
+        self._set_up_logger('timing', lambda record: logs.append(record.msg))
+        logger_helper = self._logger_helper
+        logger_helper.stats = CallStats()
+        logger_helper.return_log_format = '{elapsed:.3f}'
+        logger_helper.exception_log_format = '{elapsed:.3f}'
+
+        logger_helper._wrap_callable(basic_function)(1, 2, 3)
+        with self.assertRaises(Exception):
+            logger_helper._wrap_callable(exception_function)()
+
+        self.assertEqual(['0.000', '0.000'], logs[1::2])
+        self.assertEqual(
+            1, logger_helper.stats.snapshot()['tests.basic_function']['count'])
+        self.assertEqual(
+            1, logger_helper.stats.snapshot()[
+                'tests.exception_function']['failures'])
+
+
+class TestRegistry(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._logs = []
+        self._set_up_logger(
+            'registry', lambda record: self._logs.append(record.msg))
+        self._logger_helper.call_log_format = '{callable}'
+        self._logger_helper.return_log_format = 'return'
+
+    def test_patterns_match_modules_and_globs(self):
+        registry = Registry()
+        for name in ('app.db.query', 'app.db.Model.save', 'app.web.view'):
+            registry.register(name)
+
+        self.assertEqual(
+            ['app.db.Model.save', 'app.db.query'], registry.disable('app.db'))
+        self.assertEqual(['app.db.Model.save'], registry.enable('*.save'))
+        self.assertFalse(registry.is_enabled('app.db.query'))
+        self.assertTrue(registry.is_enabled('app.web.view'))
+        self.assertEqual(['app.web.view'], registry.names('app.web'))
+
+    def test_rules_apply_to_callables_wrapped_later(self):
+        registry = Registry()
+        registry.disable('app')
+        registry.enable('app.web')
+
+        self.assertFalse(registry.register('app.db.query').enabled)
+        self.assertTrue(registry.register('app.web.view').enabled)
+        self.assertTrue(registry.register('other.function').enabled)
+
+    def test_disabled_callables_are_not_logged(self):
+        for compile_wrappers in (False, True):
+            self._logger_helper.compile_wrappers = compile_wrappers
+            wrapped = self._logger_helper.func(basic_function)
+
+            self._logger_helper.registry.disable('tests.basic_function')
+            self.assertEqual('Test', wrapped(1, 2, 3))
+            self.assertEqual([], self._logs)
+
+            self._logger_helper.registry.enable('tests')
+            self.assertEqual('Test', wrapped(1, 2, 3))
+            self.assertEqual(['tests.basic_function', 'return'], self._logs)
+
+            del self._logs[:]
+
+    def test_disabled_coroutines_are_not_logged(self):
+        async def coroutine():
+            return 1
+
+        wrapped = self._logger_helper.func(coroutine)
+        self._logger_helper.registry.disable()
+
+        self.assertEqual(1, run_coroutine(wrapped()))
+        self.assertEqual([], self._logs)
+
+
+class TestImportHook(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._logs = []
+        self._set_up_logger(
+            'hooks', lambda record: self._logs.append(record.msg))
+        self._logger_helper.call_log_format = '{callable}'
+        self._logger_helper.return_log_format = 'return'
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        package = os.path.join(directory.name, 'hooked_package')
+        os.mkdir(package)
+        with open(os.path.join(package, '__init__.py'), 'w') as init:
+            init.write('def function(a):\n    return a\n')
+        with open(os.path.join(package, 'sub.py'), 'w') as sub:
+            sub.write(
+                'from hooked_package import function\n'
+                'class Class:\n'
+                '    def method(self, a):\n'
+                '        return function(a)\n')
+
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(self._unimport)
+
+        self._hook = ImportHook(self._logger_helper, 'hooked_package')
+        self._hook.install()
+        self.addCleanup(self._hook.uninstall)
+
+    @staticmethod
+    def _unimport():
+        for name in ('hooked_package', 'hooked_package.sub'):
+            sys.modules.pop(name, None)
+
+    def test_modules_are_wrapped_lazily(self):
+        import hooked_package.sub  # pylint: disable=import-error
+
+        self.assertEqual([], self._logger_helper.registry.names())
+        self.assertEqual(1, hooked_package.function(1))
+        self.assertEqual(
+            ['hooked_package.function'],
+            self._logger_helper.registry.names())
+
+        self.assertEqual(2, hooked_package.sub.Class().method(2))
+        self.assertEqual(
+            ['hooked_package.function', 'return',
+             'hooked_package.sub.Class.method', 'hooked_package.function',
+             'return', 'return'],
+            self._logs)
+
+    def test_wrap_class_wraps_every_kind_of_method(self):
+        class Class:
+            @staticmethod
+            def static(a):
+                return a
+
+            @classmethod
+            def klass(cls, a):
+                return a
+
+            @property
+            def prop(self):
+                return 1
+
+        self._hook.wrap_class(Class)
+
+        self.assertEqual(1, Class.static(1))
+        self.assertEqual(2, Class.klass(2))
+        self.assertEqual(1, Class().prop)
+        self.assertEqual(
+            ['static', 'return', 'klass', 'return', 'prop', 'return'],
+            [log.rsplit('.', 1)[-1] for log in self._logs])
+
+    def test_unmatched_modules_are_not_wrapped(self):
+        self.assertTrue(self._hook.matches('hooked_package.sub'))
+        self.assertFalse(self._hook.matches('hooked_package_other'))
+        self.assertIsNone(self._hook.find_spec('logging', None))
+
+
+class TestCallGraph(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._logs = []
+        self._set_up_logger(
+            'graph', lambda record: self._logs.append(record.msg))
+        self._logger_helper.exceptions_only = True
+        self._logger_helper.call_graph = CallGraph()
+
+        helper = self._logger_helper
+
+        @helper.func
+        def leaf():
+            pass
+
+        @helper.func
+        def middle():
+            leaf()
+            leaf()
+
+        @helper.func
+        def root():
+            middle()
+            leaf()
+
+        self._root = root
+
+    def test_edges_and_summary(self):
+        self._root()
+        self._root()
+
+        graph = self._logger_helper.call_graph
+        edges = {
+            (caller and caller.rsplit('.', 1)[-1],
+             callee.rsplit('.', 1)[-1]): edge['count']
+            for (caller, callee), edge in graph.edges().items()}
+
+        self.assertEqual([], self._logs)
+        self.assertEqual(
+            {(None, 'root'): 2, ('root', 'middle'): 2, ('middle', 'leaf'): 4,
+             ('root', 'leaf'): 2},
+            edges)
+
+        summary = {
+            name.rsplit('.', 1)[-1]: entry
+            for name, entry in graph.summary().items()}
+        self.assertEqual(6, summary['leaf']['count'])
+        self.assertEqual(
+            summary['root']['inclusive'],
+            sum(entry['exclusive'] for entry in summary.values()))
+
+    def test_folded_stacks(self):
+        self._root()
+
+        lines = [
+            line.rsplit(' ', 1)
+            for line in self._logger_helper.call_graph.folded(
+                'count').splitlines()]
+        stacks = {
+            ';'.join(name.rsplit('.', 1)[-1] for name in stack.split(';')):
+            int(count)
+            for stack, count in lines}
+
+        self.assertEqual(
+            {'root': 1, 'root;middle': 1, 'root;middle;leaf': 2,
+             'root;leaf': 1},
+            stacks)
+
+    def test_interleaved_generators(self):
+        helper = self._logger_helper
+
+        @helper.func
+        def leaf():
+            pass
+
+        @helper.func
+        def first():
+            leaf()
+            yield 1
+            yield 2
+
+        @helper.func
+        def second():
+            yield 3
+            yield 4
+
+        @helper.func
+        async def third():
+            yield 5
+
+        async def consume():
+            async for _ in third():
+                leaf()
+
+        self.assertEqual([(1, 3), (2, 4)], list(zip(first(), second())))
+        run_coroutine(consume())
+        leaf()
+
+        edges = {
+            (caller and caller.rsplit('.', 1)[-1],
+             callee.rsplit('.', 1)[-1]): edge['count']
+            for (caller, callee), edge in helper.call_graph.edges().items()}
+        self.assertEqual(
+            {(None, 'first'): 1, (None, 'second'): 1, (None, 'third'): 1,
+             ('first', 'leaf'): 1, (None, 'leaf'): 2},
+            edges)
+
+    def test_stacks_are_separate_for_each_task(self):
+        helper = self._logger_helper
+
+        @helper.func
+        async def task():
+            await asyncio.sleep(0)
+
+        async def main():
+            await asyncio.gather(task(), task())
+
+        run_coroutine(main())
+
+        tree = helper.call_graph.tree()
+        self.assertEqual(1, len(tree))
+        self.assertEqual(2, tree[0]['count'])
+        self.assertEqual([], tree[0]['children'])
+
+
+class TestCallContext(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('context')
+        self._logger_helper.call_context = True
+        self._logger_helper.call_log_format = '{depth} {callable}'
+        self._logger_helper.return_log_format = '{depth} return'
+
+    def test_nested_calls_have_parent_ids(self):
+        helper = self._logger_helper
+        inner = helper.func(basic_function)
+
+        @helper.func
+        def outer():
+            return inner(1, 2, 3)
+
+        with context.trace('request') as trace_id:
+            outer()
+
+        self.assertEqual('request', trace_id)
+        self.assertIsNone(context.get_trace_id())
+        self.assertIsNone(context.current())
+
+        outer_call, inner_call, inner_return, outer_return = self._records
+
+        self.assertEqual('0', outer_call.getMessage()[0])
+        self.assertEqual('1', inner_call.getMessage()[0])
+        self.assertEqual('1 return', inner_return.getMessage())
+        self.assertIsNone(outer_call.parent_id)
+        self.assertEqual(outer_call.call_id, inner_call.parent_id)
+        self.assertEqual(inner_call.call_id, inner_return.call_id)
+        self.assertEqual(outer_call.call_id, outer_return.call_id)
+        self.assertEqual(
+            ['request'] * 4, [record.trace_id for record in self._records])
+
+    def test_tasks_have_separate_contexts(self):
+        helper = self._logger_helper
+
+        @helper.func
+        async def task(trace_id):
+            context.set_trace_id(trace_id)
+            await asyncio.sleep(0)
+            return await helper.func(asyncio.sleep)(0, trace_id)
+
+        async def main():
+            return await asyncio.gather(task('a'), task('b'))
+
+        self.assertEqual(['a', 'b'], run_coroutine(main()))
+
+        sleeps = [
+            record for record in self._records
+            if record.getMessage().startswith('1 asyncio')]
+        self.assertEqual(
+            ['a', 'b'], sorted(record.trace_id for record in sleeps))
+        self.assertEqual([1, 1], [record.depth for record in sleeps])
+
+    def test_suspended_generators_are_not_parents(self):
+        helper = self._logger_helper
+        inner = helper.func(basic_function)
+
+        @helper.func
+        def generator_function():
+            yield inner(1, 2, 3)
+            yield inner(4, 5, 6)
+
+        async def consume_async(generator):
+            await generator.__anext__()
+            inner(7, 8, 9)
+            await generator.aclose()
+
+        @helper.func
+        async def async_generator_function():
+            yield inner(1, 2, 3)
+
+        generator = generator_function()
+        next(generator)
+        inner(1, 2, 3)
+        self.assertIsNone(context.current())
+        next(generator)
+        generator.close()
+        run_coroutine(consume_async(async_generator_function()))
+
+        calls = [
+            record for record in self._records
+            if record.getMessage().endswith('basic_function')]
+        generators = [
+            record.call_id for record in self._records
+            if record.getMessage().endswith('generator_function')]
+        self.assertEqual(
+            [generators[0], None, generators[0], generators[1], None],
+            [record.parent_id for record in calls])
+        self.assertIsNone(context.current())
+
+    def test_emitted_records_carry_the_context(self):
+        emitter = FlightRecorder()
+        self._logger_helper.emitter = emitter
+        self._logger_helper.func(basic_function)(1, 2, 3)
+        emitter.dump()
+
+        self.assertEqual(
+            self._records[0].call_id, self._records[1].call_id)
+
+
+@unittest.skipUnless(
+    hasattr(sys, 'monitoring'), 'sys.monitoring needs Python 3.12')
+class TestMonitoringEngine(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._logs = []
+        self._set_up_logger(
+            'monitoring',
+            lambda record: self._logs.append(record.getMessage()))
+        self._logger_helper.call_log_format = '{callable}({args})'
+        self._logger_helper.return_log_format = '{value}'
+        self._logger_helper.exception_log_format = '{message}'
+
+        self._engine = MonitoringEngine(self._logger_helper)
+        self._engine.install()
+        self.addCleanup(self._engine.uninstall)
+
+    def test_func_logs_without_wrapping(self):
+        def function(a, *args, b=2, **kwargs):
+            return a + b
+
+        self.assertIs(function, self._engine.func(function))
+        self.assertEqual(4, function(1, 5, b=3, c=4))
+        self.assertEqual(
+            ['{}(a = 1, args = (5,), b = 3, kwargs = {{\'c\': 4}})'.format(
+                get_callable_name(function)), '4'],
+            self._logs)
+
+    def test_cls_keeps_the_class(self):
+        self.assertIs(BasicClass, self._engine.cls(BasicClass))
+
+        instance = BasicClass()
+        self.assertIsInstance(instance, BasicClass)
+        instance.method_1()
+
+        self.assertEqual(
+            ['{}()'.format(get_callable_name(BasicClass.method_1)), 'None'],
+            self._logs)
+
+    def test_exceptions_are_logged(self):
+        self._engine.func(exception_function)
+
+        with self.assertRaises(Exception):
+            exception_function()
+
+        self.assertEqual(
+            ['{}()'.format(get_callable_name(exception_function)),
+             'This is an exception'],
+            self._logs)
+
+    def test_equal_code_objects_are_told_apart(self):
+        self._engine.uninstall()
+        functions = []
+        for _ in range(2):
+            namespace = {}
+            exec('def function():\n    return 1\n', namespace)
+            functions.append(self._engine.func(namespace['function']))
+        self.assertEqual(functions[0].__code__, functions[1].__code__)
+
+        self._engine.install()
+        for function in functions:
+            function()
+
+        self.assertEqual(
+            ['{}()'.format(get_callable_name(functions[0])), '1'] * 2,
+            self._logs)
+
+    def test_closed_generators_are_returns(self):
+        def generator_function():
+            # Python 3.13 closes a generator suspended outside of a `try`
+            # block without raising `GeneratorExit` in it.
+            try:
+                yield 1
+                yield 2
+            finally:
+                pass
+
+        self._engine.func(generator_function)
+        for _ in generator_function():
+            break
+
+        self.assertEqual(
+            ['{}()'.format(get_callable_name(generator_function)), 'None'],
+            self._logs)
+
+    def test_suspended_generators_are_not_current(self):
+        def generator_function():
+            yield 1
+            yield 2
+
+        def leaf():
+            pass
+
+        self._engine.func(generator_function)
+        self._engine.func(leaf)
+        self._logger_helper.call_context = True
+        self._logger_helper.call_log_format = '{depth} {parent_id}'
+
+        generator = generator_function()
+        next(generator)
+        leaf()
+        self.assertEqual([2], list(generator))
+
+        self.assertEqual(['0 None', '0 None', 'None', 'None'], self._logs)
+
+    def test_profilers_can_run_alongside(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        profiler.disable()
+
+    def test_disabled_callables_are_not_logged(self):
+        self._engine.func(basic_function)
+        self._logger_helper.registry.disable(
+            get_callable_name(basic_function))
+
+        self.assertEqual('Test', basic_function(1, 2, 3))
+        self._engine.uninstall()
+        self._logger_helper.registry.enable()
+        self.assertEqual('Test', basic_function(1, 2, 3))
+
+        self.assertEqual([], self._logs)
+
+
+class TestBinaryTraceEmitter(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('binary')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self._directory = directory.name
+
+    def _emitter(self, **kwargs):
+        emitter = BinaryTraceEmitter(self._directory, **kwargs)
+        self.addCleanup(emitter.close)
+        self._logger_helper.emitter = emitter
+
+        return emitter
+
+    def test_events_are_read_back(self):
+        emitter = self._emitter()
+        self._logger_helper.func(basic_function)(1, 2, c=3)
+        with self.assertRaises(Exception):
+            self._logger_helper.func(exception_function)()
+        emitter.close()
+
+        events = list(read_trace(self._directory))
+
+        self.assertEqual([], self._records)
+        self.assertEqual(
+            ['call', 'return', 'call', 'exception'],
+            [event.kind for event in events])
+        self.assertEqual(
+            [get_callable_name(basic_function)] * 2 +
+            [get_callable_name(exception_function)] * 2,
+            [event.name for event in events])
+        self.assertEqual(
+            ['a = 1, b = 2, c = 3, d = 1, e = 2', "'Test'", '',
+             'Exception: This is an exception'],
+            [event.payload for event in events])
+        self.assertEqual(
+            {threading.get_ident()}, {event.thread for event in events})
+        self.assertIsNone(events[0].elapsed)
+        self.assertGreaterEqual(events[1].elapsed, 0)
+        self.assertLessEqual(events[0].time, events[1].time)
+
+    def test_segments_roll_over(self):
+        emitter = self._emitter(segment_size=1024, max_payload=100)
+        wrapped = self._logger_helper.func(basic_function)
+        for value in range(20):
+            wrapped(value, 'x' * 200, 3)
+        emitter.close()
+
+        self.assertGreater(len(segment_paths(self._directory)), 1)
+
+        events = list(read_trace(self._directory))
+        self.assertEqual(40, len(events))
+        self.assertEqual(
+            {get_callable_name(basic_function)},
+            {event.name for event in events})
+        self.assertEqual(
+            ['a = {}'.format(value) for value in range(20)],
+            [event.payload.split(',')[0] for event in events[::2]])
+        self.assertEqual(100, len(events[0].payload))
+
+    def test_events_survive_without_close(self):
+        self._emitter()
+        self._logger_helper.func(basic_function)(1, 2, 3)
+
+        events = list(read_trace(self._directory))
+        self.assertEqual(
+            ['call', 'return'], [event.kind for event in events])
+
+    def test_new_emitters_add_segments(self):
+        self._emitter().close()
+        self._emitter().close()
+
+        self.assertEqual(
+            ['trace-000000.lht', 'trace-000001.lht'],
+            [os.path.basename(path)
+             for path in segment_paths(self._directory)])
+
+
+class TestQuery(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('query')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self._directory = directory.name
+
+        self._logger_helper.return_log_format = (
+            'Returned {value} from {callable} in {elapsed}')
+
+    def _write_calls(self):
+        wrapped = self._logger_helper.func(basic_function)
+        failing = self._logger_helper.func(exception_function)
+        for value in range(5):
+            wrapped(value, 2, 3)
+            with self.assertRaises(Exception):
+                failing()
+
+    def _run(self, *argv):
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertEqual(0, query.main(list(argv)))
+
+        return stdout.getvalue()
+
+    def test_text_log_is_indexed_and_queried(self):
+        path = os.path.join(self._directory, 'trace.log')
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        self._logger.addHandler(handler)
+        self._write_calls()
+        handler.close()
+
+        self.assertEqual('5\n', self._run(
+            path, '--exception', 'Exception', '--count'))
+        self.assertTrue(os.path.exists(path + query.INDEX_SUFFIX))
+
+        lines = self._run(
+            path, '--name', get_callable_name(basic_function), '--kind',
+            'call', '--since', '0').splitlines()
+        self.assertEqual(5, len(lines))
+        self.assertTrue(lines[0].endswith(
+            'call {} a = 0, b = 2, c = 3, d = 1, e = 2'.format(
+                get_callable_name(basic_function))))
+
+        stats = json.loads(self._run(
+            path, '--stats', '--json', '--return-format',
+            self._logger_helper.return_log_format))
+        self.assertEqual(
+            {'calls': 5, 'returns': 5, 'exceptions': 0, 'yields': 0},
+            {key: value
+             for key, value in stats[get_callable_name(basic_function)].items()
+             if not key.startswith('p')})
+        self.assertIsNotNone(stats[get_callable_name(basic_function)]['p99'])
+        self.assertEqual(
+            5, stats[get_callable_name(exception_function)]['exceptions'])
+
+    def test_blocks_are_skipped(self):
+        path = os.path.join(self._directory, 'trace.log')
+        with open(path, 'w') as log:
+            log.write(
+                '2024-01-01 10:00:00,000 Calling a.first()\n'
+                '2024-01-01 11:00:00,000 Calling a.second()\n')
+
+        trace = query.TextTrace(
+            path, 'Calling {callable}({args})', 'Returned {value}',
+            'Yielded {value}', 'Exception {name}', block_lines=1)
+        index = query.build_index(trace)
+        blocks = list(query.read_index(index))
+
+        self.assertEqual([['a.first'], ['a.second']],
+                         [block['names'] for block in blocks])
+
+        since = query._parse_time('2024-01-01 10:30:00')
+        read = []
+        original_read = trace.read
+        trace.read = lambda block: read.append(block) or original_read(block)
+
+        events = list(query.Query(since=since).run(trace, index))
+
+        self.assertEqual(['a.second'], [event.name for event in events])
+        self.assertEqual([blocks[1]], read)
+
+    def test_binary_trace_is_queried(self):
+        emitter = BinaryTraceEmitter(
+            self._directory, segment_size=1024, max_payload=100)
+        self._logger_helper.emitter = emitter
+        self._write_calls()
+        emitter.close()
+
+        self.assertEqual(
+            '5\n',
+            self._run(self._directory, '--exception', 'Exception', '--count'))
+        self.assertEqual(
+            '0\n',
+            self._run(self._directory, '--exception', 'ValueError', '--count'))
+
+        stats = json.loads(self._run(self._directory, '--stats', '--json'))
+        self.assertEqual(
+            5, stats[get_callable_name(basic_function)]['returns'])
+
+    def test_index_is_rebuilt_while_the_trace_is_written(self):
+        emitter = BinaryTraceEmitter(self._directory)
+        self.addCleanup(emitter.close)
+        self._logger_helper.emitter = emitter
+        wrapped = self._logger_helper.func(basic_function)
+
+        wrapped(1, 2, 3)
+        self.assertEqual('1\n', self._run(
+            self._directory, '--kind', 'call', '--count'))
+
+        wrapped(1, 2, 3)
+        self.assertEqual('2\n', self._run(
+            self._directory, '--kind', 'call', '--count'))
+
+    def test_statistics_skip_events_of_other_kinds(self):
+        events = [
+            TraceEvent('call', 'function', 0, 0.0, None, ''),
+            TraceEvent('return', 'function', 0, 0.0, 0.5, ''),
+            TraceEvent('message', 'function', 0, 0.0, None, 'Text'),
+            TraceEvent(None, 'function', 0, 0.0, None, ''),
+            TraceEvent('message', None, 0, 0.0, None, 'Text')]
+
+        summary = query.statistics(events)
+
+        self.assertEqual(['function'], list(summary))
+        self.assertEqual(
+            (1, 1, 0, 0),
+            tuple(summary['function'][key] for key in (
+                'calls', 'returns', 'exceptions', 'yields')))
+
+
+class TestStructuredOutput(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('structured')
+
+    def test_fields_are_added_to_records(self):
+        self._logger_helper.structured_extras = True
+        self._logger_helper.func(basic_function)(1, 'b', c=None)
+        with self.assertRaises(Exception):
+            self._logger_helper.func(exception_function)()
+
+        call, returned, call_2, raised = self._records
+
+        self.assertEqual('call', call.event)
+        self.assertEqual(get_callable_name(basic_function), call.callable)
+        self.assertEqual(
+            {'a': '1', 'b': "'b'", 'c': 'None', 'd': '1', 'e': '2'},
+            call.arguments)
+        self.assertEqual("'Test'", returned.return_value)
+        self.assertGreaterEqual(returned.elapsed, 0)
+        self.assertEqual('Exception', raised.exception)
+        self.assertEqual('This is an exception', raised.exception_message)
+        self.assertTrue(raised.getMessage().startswith('Exception'))
+
+    def test_values_are_only_repred_once(self):
+        reprs = []
+        self._logger_helper.value_repr = lambda value: reprs.append(
+            value) or repr(value)
+        self._logger_helper.structured_extras = True
+        self._logger_helper.func(basic_function)(1, 2, 3)
+
+        call, returned = self._records
+
+        self.assertEqual('3', call.arguments['c'])
+        self.assertIn('c = 3', call.getMessage())
+        self.assertEqual("'Test'", returned.return_value)
+        self.assertIn("'Test'", returned.getMessage())
+        self.assertEqual([1, 2, 3, 1, 2, 'Test'], reprs)
+
+    def test_records_are_made_by_the_record_factory(self):
+        factory = logging.getLogRecordFactory()
+        self.addCleanup(logging.setLogRecordFactory, factory)
+
+        class CustomRecord(logging.LogRecord):
+            custom = True
+
+        logging.setLogRecordFactory(CustomRecord)
+        self._logger_helper.structured_extras = True
+        self._logger_helper.func(basic_function)(1, 2, 3)
+
+        call, returned = self._records
+
+        self.assertIsInstance(call, CustomRecord)
+        self.assertTrue(call.custom)
+        self.assertEqual('call', call.event)
+        self.assertIn("'Test'", returned.getMessage())
+        self.assertEqual(
+            basic_function.__code__.co_filename, call.pathname)
+        self.assertEqual(
+            basic_function.__code__.co_firstlineno, call.lineno)
+        self.assertEqual('basic_function', call.funcName)
+
+    def test_dropped_records_are_not_repred(self):
+        reprs = []
+        self._logger_helper.value_repr = lambda value: reprs.append(
+            value) or repr(value)
+        self._logger_helper.structured_extras = True
+        self._logger_helper.lazy_messages = True
+        self._logger.handlers[0].setLevel(logging.INFO)
+        self._logger_helper.func(basic_function)(1, 2, 3)
+
+        self.assertEqual([], self._records)
+        self.assertEqual([], reprs)
+
+    def test_json_lines_are_written(self):
+        output = io.BytesIO()
+        emitter = JsonLinesEmitter(output, buffer_size=256)
+        self._logger_helper.emitter = emitter
+        self._logger_helper.call_context = True
+
+        wrapped = self._logger_helper.func(basic_function)
+        wrapped('\u00e9', [1, 2], 3)
+        wrapped('x' * 300, 2, 3)
+        emitter.close()
+
+        lines = output.getvalue().decode('ascii').splitlines()
+        events = [json.loads(line) for line in lines]
+
+        self.assertEqual([], self._records)
+        self.assertEqual(
+            ['call', 'return', 'call', 'return'],
+            [event['event'] for event in events])
+        self.assertEqual(
+            {'a': "'\u00e9'", 'b': '[1, 2]', 'c': '3', 'd': '1', 'e': '2'},
+            events[0]['arguments'])
+        self.assertEqual(
+            [self._logger.name, 'DEBUG', threading.get_ident(), 0],
+            [events[0][key] for key in ('logger', 'level', 'thread', 'depth')])
+        self.assertEqual(events[0]['call_id'], events[1]['call_id'])
+        self.assertEqual(302, len(events[2]['arguments']['a']))
+
+    def test_json_lines_are_queried(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'trace.jsonl')
+
+        emitter = JsonLinesEmitter(path)
+        self._logger_helper.emitter = emitter
+        self._logger_helper.func(basic_function)(1, 2, 3)
+        with self.assertRaises(Exception):
+            self._logger_helper.func(exception_function)()
+        emitter.close()
+
+        trace = query.open_trace(path)
+        events = list(query.Query(exceptions=['Exception']).run(
+            trace, query.build_index(trace)))
+
+        self.assertIsInstance(trace, query.JsonLinesTrace)
+        self.assertEqual(
+            [(get_callable_name(exception_function),
+              'Exception: This is an exception')],
+            [(event.name, event.payload) for event in events])
+
+
+class TestGovernor(LoggerMixin, unittest.TestCase):
+    def setUp(self):
+        self._set_up_logger('governor')
+        # Logging each argument takes far longer than the call itself.
+        self._logger_helper.value_repr = (
+            lambda value: time.sleep(0.001) or repr(value))
+        self._governor = Governor(
+            window=0, min_rate=0, sampler=lambda: EveryN(1))
+        self._logger_helper.governor = self._governor
+
+        self._name = get_callable_name(basic_function)
+
+    def _messages(self):
+        return [
+            record.getMessage() for record in self._records
+            if record.getMessage().startswith('Logging of')]
+
+    def test_costly_logging_is_throttled(self):
+        wrapped = self._logger_helper.func(basic_function)
+
+        wrapped(1, 2, 3)
+        self.assertEqual({self._name: 'sampled'}, self._governor.states())
+        self.assertIsInstance(
+            self._logger_helper.samplers[self._name], EveryN)
+
+        wrapped(1, 2, 3)
+        self.assertEqual({self._name: 'silenced'}, self._governor.states())
+        self.assertIsInstance(
+            self._logger_helper.samplers[self._name], Never)
+
+        del self._records[:]
+        wrapped(1, 2, 3)
+        self.assertEqual([], self._records)
+        self.assertEqual({self._name: 'silenced'}, self._governor.states())
+
+    def test_transitions_are_logged(self):
+        wrapped = self._logger_helper.func(basic_function)
+        wrapped(1, 2, 3)
+        wrapped(1, 2, 3)
+
+        messages = self._messages()
+        self.assertEqual(2, len(messages))
+        self.assertTrue(messages[0].startswith(
+            'Logging of {} changed from full to sampled'.format(self._name)))
+        self.assertTrue(messages[1].startswith(
+            'Logging of {} changed from sampled to silenced'.format(
+                self._name)))
+
+    def test_logging_is_restored(self):
+        original = EveryN(1)
+        self._logger_helper.samplers[self._name] = original
+        wrapped = self._logger_helper.func(basic_function)
+        wrapped(1, 2, 3)
+        wrapped(1, 2, 3)
+
+        # The calls are now too infrequent to throttle.
+        self._governor.min_rate = float('inf')
+        wrapped(1, 2, 3)
+        self.assertEqual({self._name: 'sampled'}, self._governor.states())
+
+        wrapped(1, 2, 3)
+        self.assertEqual({}, self._governor.states())
+        self.assertIs(original, self._logger_helper.samplers[self._name])
+        self.assertIn('changed from sampled to full', self._messages()[-1])
+
+    def test_samplers_replaced_while_throttled_are_restored(self):
+        wrapped = self._logger_helper.func(basic_function)
+        wrapped(1, 2, 3)
+        wrapped(1, 2, 3)
+
+        replacement = EveryN(1)
+        self._logger_helper.samplers[self._name] = replacement
+
+        self._governor.min_rate = float('inf')
+        wrapped(1, 2, 3)
+        wrapped(1, 2, 3)
+        self.assertEqual({}, self._governor.states())
+        self.assertIs(replacement, self._logger_helper.samplers[self._name])
+
+    def test_exceptions_are_logged_when_silenced(self):
+        wrapped = self._logger_helper.func(exception_function)
+        self._governor.budget = 0
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                wrapped()
+        self.assertEqual(
+            {get_callable_name(exception_function): 'silenced'},
+            self._governor.states())
+
+        del self._records[:]
+        with self.assertRaises(Exception):
+            wrapped()
+
+        self.assertEqual(1, len(self._records))
+        self.assertTrue(self._records[0].getMessage().startswith('Exception'))